@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_
 from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
 
-from app.db.database import get_db
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from app.db.database import get_async_db
 from app.models.patient import Patient, Appointment
 from app.schemas.patient import (
     AppointmentResponse,
+    AppointmentPage,
     AppointmentCreate,
     AppointmentUpdate
 )
@@ -17,13 +19,13 @@ router = APIRouter()
 
 
 @router.post("/appointments", response_model=AppointmentResponse, status_code=201)
-def create_appointment(
+async def create_appointment(
     appointment: AppointmentCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new appointment for a patient"""
     # Verify patient exists
-    patient = db.query(Patient).filter(Patient.patient_id == appointment.patient_id).first()
+    patient = await db.get(Patient, appointment.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
@@ -44,53 +46,74 @@ def create_appointment(
     )
 
     db.add(new_appointment)
-    db.commit()
-    db.refresh(new_appointment)
+    await db.commit()
+    await db.refresh(new_appointment)
 
     return new_appointment
 
 
-@router.get("/appointments", response_model=List[AppointmentResponse])
-def get_appointments(
+@router.get("/appointments", response_model=AppointmentPage)
+async def get_appointments(
     patient_id: Optional[str] = None,
     status: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get appointments with optional filters"""
-    query = db.query(Appointment)
+    """Get a page of appointments with optional filters, ordered by (appointment_date_time, appointment_id)"""
+    query = select(Appointment)
 
     # Filter by patient_id if provided
     if patient_id:
-        query = query.filter(Appointment.patient_id == patient_id)
+        query = query.where(Appointment.patient_id == patient_id)
 
     # Filter by status if provided
     if status:
-        query = query.filter(Appointment.appointment_status == status)
+        query = query.where(Appointment.appointment_status == status)
 
     # Filter by date range if provided
     if start_date:
-        query = query.filter(Appointment.appointment_date_time >= start_date)
+        query = query.where(Appointment.appointment_date_time >= start_date)
     if end_date:
-        query = query.filter(Appointment.appointment_date_time <= end_date)
+        query = query.where(Appointment.appointment_date_time <= end_date)
+
+    # Resume after the last row of the previous page
+    if cursor:
+        after_date_time, after_appointment_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Appointment.appointment_date_time > after_date_time,
+                and_(
+                    Appointment.appointment_date_time == after_date_time,
+                    Appointment.appointment_id > after_appointment_id
+                )
+            )
+        )
 
-    # Order by appointment date/time
-    query = query.order_by(Appointment.appointment_date_time.asc())
+    # Order by appointment date/time, fetching one extra row to detect another page
+    query = query.order_by(Appointment.appointment_date_time.asc(), Appointment.appointment_id.asc())
 
-    appointments = query.all()
-    return appointments
+    appointments = (await db.scalars(query.limit(limit + 1))).all()
+    has_more = len(appointments) > limit
+    appointments = appointments[:limit]
+
+    next_cursor = None
+    if has_more:
+        last_appointment = appointments[-1]
+        next_cursor = encode_cursor(last_appointment.appointment_date_time, last_appointment.appointment_id)
+
+    return {"items": appointments, "next_cursor": next_cursor}
 
 
 @router.get("/appointments/{appointment_id}", response_model=AppointmentResponse)
-def get_appointment(
+async def get_appointment(
     appointment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific appointment by ID"""
-    appointment = db.query(Appointment).filter(
-        Appointment.appointment_id == appointment_id
-    ).first()
+    appointment = await db.get(Appointment, appointment_id)
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -99,28 +122,28 @@ def get_appointment(
 
 
 @router.get("/patients/{patient_id}/appointments", response_model=List[AppointmentResponse])
-def get_patient_appointments(
+async def get_patient_appointments(
     patient_id: str,
     status: Optional[str] = None,
     upcoming_only: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all appointments for a specific patient"""
     # Verify patient exists
-    patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+    patient = await db.get(Patient, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    query = db.query(Appointment).filter(Appointment.patient_id == patient_id)
+    query = select(Appointment).where(Appointment.patient_id == patient_id)
 
     # Filter by status if provided
     if status:
-        query = query.filter(Appointment.appointment_status == status)
+        query = query.where(Appointment.appointment_status == status)
 
     # Filter to upcoming appointments only
     if upcoming_only:
         now = datetime.now(timezone.utc)
-        query = query.filter(
+        query = query.where(
             and_(
                 Appointment.appointment_date_time >= now,
                 Appointment.appointment_status == "scheduled"
@@ -130,19 +153,19 @@ def get_patient_appointments(
     # Order by appointment date/time
     query = query.order_by(Appointment.appointment_date_time.asc())
 
-    appointments = query.all()
+    appointments = (await db.scalars(query)).all()
     return appointments
 
 
 @router.get("/appointments/next/upcoming", response_model=Optional[AppointmentResponse])
-def get_next_upcoming_appointment(
+async def get_next_upcoming_appointment(
     patient_id: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get the next upcoming appointment (optionally for a specific patient)"""
     now = datetime.now(timezone.utc)
 
-    query = db.query(Appointment).filter(
+    query = select(Appointment).where(
         and_(
             Appointment.appointment_date_time >= now,
             Appointment.appointment_status == "scheduled"
@@ -151,24 +174,24 @@ def get_next_upcoming_appointment(
 
     # Filter by patient if provided
     if patient_id:
-        query = query.filter(Appointment.patient_id == patient_id)
+        query = query.where(Appointment.patient_id == patient_id)
 
     # Get the earliest upcoming appointment
-    appointment = query.order_by(Appointment.appointment_date_time.asc()).first()
+    appointment = (await db.scalars(
+        query.order_by(Appointment.appointment_date_time.asc()).limit(1)
+    )).first()
 
     return appointment
 
 
 @router.put("/appointments/{appointment_id}", response_model=AppointmentResponse)
-def update_appointment(
+async def update_appointment(
     appointment_id: str,
     appointment_update: AppointmentUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing appointment"""
-    appointment = db.query(Appointment).filter(
-        Appointment.appointment_id == appointment_id
-    ).first()
+    appointment = await db.get(Appointment, appointment_id)
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -178,27 +201,25 @@ def update_appointment(
     for field, value in update_data.items():
         setattr(appointment, field, value)
 
-    db.commit()
-    db.refresh(appointment)
+    await db.commit()
+    await db.refresh(appointment)
 
     return appointment
 
 
 @router.delete("/appointments/{appointment_id}", status_code=204)
-def delete_appointment(
+async def delete_appointment(
     appointment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete an appointment"""
-    appointment = db.query(Appointment).filter(
-        Appointment.appointment_id == appointment_id
-    ).first()
+    appointment = await db.get(Appointment, appointment_id)
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
-    db.delete(appointment)
-    db.commit()
+    await db.delete(appointment)
+    await db.commit()
 
     return None
 
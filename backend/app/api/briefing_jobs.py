@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+from app.core.config import settings
+from app.core.sse import format_sse
+from app.db.database import get_async_db, AsyncSessionLocal
+from app.models.patient import BriefingJob
+from app.schemas.patient import BriefingJobResponse
+
+router = APIRouter()
+
+
+@router.get("/briefing-jobs/{job_id}", response_model=BriefingJobResponse)
+async def get_briefing_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get the status of a background briefing synthesis job"""
+    job = await db.get(BriefingJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Briefing job not found")
+
+    return job
+
+
+async def job_events(job_id: str):
+    """Poll a job, yielding ("status", job) whenever it changes, then ("ready", job) or ("failed", job)
+    once it finishes, and (None, None) before waiting for the next poll. A job deleted while being
+    watched (e.g. by reset_briefings.py) ends the stream with a `failed` event."""
+    last_status = None
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(BriefingJob, job_id)
+            if job is None:
+                yield "failed", {"job_id": job_id, "status": "deleted", "last_error": "Briefing job no longer exists"}
+                return
+            payload = BriefingJobResponse.model_validate(job).model_dump(mode="json")
+
+        if job.status != last_status:
+            last_status = job.status
+            yield "status", payload
+
+        if job.status == "succeeded":
+            yield "ready", payload
+            return
+        if job.status == "failed":
+            yield "failed", payload
+            return
+
+        yield None, None
+        await asyncio.sleep(settings.BRIEFING_JOB_POLL_INTERVAL)
+
+
+async def stream_job_events(job_id: str):
+    """Emit a `status` event whenever the job changes, then `ready` or `failed` once it finishes"""
+    async for event, payload in job_events(job_id):
+        if event:
+            yield format_sse(event, payload)
+        else:
+            # Comment line keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+
+
+@router.get("/briefing-jobs/{job_id}/events")
+async def briefing_job_events(job_id: str):
+    """Push notification (Server-Sent Events) for when a job's ClinicalBriefing is ready"""
+    # A session of its own: a dependency's would keep its connection until the stream ends
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BriefingJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Briefing job not found")
+
+    return StreamingResponse(
+        stream_job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
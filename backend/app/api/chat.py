@@ -1,19 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from app.db.database import get_async_db, AsyncSessionLocal
 from app.models.patient import Patient, EHRHistory, ChatConversation, ClinicalBriefing
 from app.schemas.patient import (
     ChatStartRequest, ChatStartResponse, ChatContinueRequest,
-    ChatContinueResponse, ChatMessage
+    ChatContinueResponse, ChatMessage, PartialBriefingResponse, SummarySections,
+    SummaryFromDraftSections, InsightSections, EquitySections, EquityUpdateSections,
+    EquityDimensionSections, EquityDimensionUpdateSections
 )
+from app.core.history import history_window, refresh_conversation_summary
+from app.core.jobs import enqueue_briefing_job
+from app.core.routing import choose_chat_route, record_route, route_params, ROUTE_DELIBERATE, EMPOWERMENT_QUESTION_PHRASE
+from app.core.llm import record_usage
+from app.core.scheduler import llm_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from app.core.sse import format_sse
 from app.core.config import settings
-from anthropic import Anthropic
+from app.core.cache import chat_sessions
+from app.core.conversations import load_messages, append_messages, commit_messages, ai_message_record
+from app.core.idempotency import run_idempotent
+from app.core.recording import register_static_prompts
+from app.core.equity_knowledge import load_catalogue, format_catalogue, splice_recommendations, record_pending_dimensions
+from app.core.structured import generate_briefing_content
+from app.core.symptoms import draft_to_reported_symptoms, format_symptom_draft, update_symptom_draft
+from app.core.synthesis import SynthesisSection, run_sections
+import asyncio
+import hashlib
 import json
+import time
 from datetime import datetime
 import uuid
+from typing import Optional
 
 router = APIRouter()
 
+INTAKE_COMPLETE_MARKER = "<<INTAKE_COMPLETE>>"
+
+# Bump when the prompt text changes so usage and cache stats can be compared per version
+CHAT_PROMPT_VERSION = "chat-v2"
+CONVERSATION_SYNTHESIS_PROMPT_VERSION = "conversation-synthesis-v6"
+
 
 def calculate_age(date_of_birth):
     """Calculate age from date of birth"""
@@ -23,29 +51,12 @@ def calculate_age(date_of_birth):
     )
 
 
-def build_conversational_prompt(patient: Patient, ehr: EHRHistory, messages: list) -> str:
-    """Build the conversational prompt for ongoing chat with advanced clinical framework"""
-
-    age = calculate_age(patient.date_of_birth)
-
-    # Format problem list
-    problems = ", ".join([p['condition'] for p in ehr.problem_list])
-    # Format medications (handle both old string format and new dict format)
-    if ehr.medication_list and isinstance(ehr.medication_list[0], dict):
-        medications = ", ".join([f"{m['name']} {m.get('dosage', '')}" for m in ehr.medication_list])
-    else:
-        medications = ", ".join(ehr.medication_list)
-
-    system_context = f"""You are "Amani," a highly skilled, patient-centered AI intake specialist. You are speaking with {patient.full_name}, a {age}-year-old {patient.gender_identity} patient.
+# Static part of the chat system prompt (cached); patient context is appended per conversation
+CHAT_SYSTEM_INSTRUCTIONS = """You are "Amani," a highly skilled, patient-centered AI intake specialist.
 
 ### YOUR PRIMARY GOAL
 Your goal is to gently guide the patient to describe their reason for visit, gathering key clinical details in a warm, natural conversation. You are building the foundation for their doctor's visit.
 
-### PATIENT'S CONFIDENTIAL BACKGROUND
-- **Known Conditions:** {problems}
-- **Current Medications:** {medications}
-- **(Use this context to understand the patient, but do not state it back to them unless they mention it first.)**
-
 ### YOUR INTERVIEW TOOLKIT (Ask these things conversationally, not like a checklist)
 1. **Chief Complaint:** What is the main reason for their visit?
 2. **Onset:** When did it start?
@@ -62,41 +73,99 @@ Your goal is to gently guide the patient to describe their reason for visit, gat
   **"Thank you, that's very clear. Lastly, and this is just as important, is there anything about your personal beliefs, cultural background, or past experiences with healthcare that you would like your doctor to be aware of when considering your care?"**
 - **Conclusion:** Once they answer the Empowerment Question, or if they decline, your FINAL message MUST thank them and end with the special completion signal. For example: "Thank you for sharing. I've noted that for your doctor. This has been very helpful. A clinician will review this before your visit. <<INTAKE_COMPLETE>>"
 
-Remember: You're gathering comprehensive information for the clinician, not providing medical advice."""
+Remember: You're gathering comprehensive information for the clinician, not providing medical advice.
 
-    return system_context
+The patient you are speaking with, and their confidential background, follow below."""
 
 
-def get_ai_response(patient: Patient, ehr: EHRHistory, messages: list) -> tuple[str, bool, list]:
-    """Get AI response and determine if conversation is complete. Returns (message, is_complete, thinking_steps)"""
+def build_conversational_prompt(patient: Patient, ehr: EHRHistory, messages: list) -> list:
+    """Build the conversational system prompt as a static cached block followed by the patient's context"""
+
+    age = calculate_age(patient.date_of_birth)
+
+    # Format problem list
+    problems = ", ".join([p['condition'] for p in ehr.problem_list])
+    # Format medications (handle both old string format and new dict format)
+    if ehr.medication_list and isinstance(ehr.medication_list[0], dict):
+        medications = ", ".join([f"{m['name']} {m.get('dosage', '')}" for m in ehr.medication_list])
+    else:
+        medications = ", ".join(ehr.medication_list)
+
+    patient_context = f"""### THE PATIENT
+You are speaking with {patient.full_name}, a {age}-year-old {patient.gender_identity} patient.
+
+### PATIENT'S CONFIDENTIAL BACKGROUND
+- **Known Conditions:** {problems}
+- **Current Medications:** {medications}
+- **(Use this context to understand the patient, but do not state it back to them unless they mention it first.)**"""
+
+    # Both blocks are cache breakpoints: the instructions are shared by every intake,
+    # and instructions + patient context are identical on every turn of a conversation
+    return [
+        {"type": "text", "text": CHAT_SYSTEM_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": patient_context, "cache_control": {"type": "ephemeral"}}
+    ]
+
+
+def build_api_messages(messages: list) -> list:
+    """Format stored {role, content} messages for the Claude API.
+
+    The newest message carries a cache breakpoint so the next turn reads the whole
+    conversation so far from the prompt cache instead of reprocessing it."""
+    api_messages = []
+    for msg in messages:
+        api_messages.append({
+            "role": "assistant" if msg["role"] == "ai" else "user",
+            "content": msg["content"]
+        })
+
+    if api_messages:
+        api_messages[-1]["content"] = [
+            {"type": "text", "text": api_messages[-1]["content"], "cache_control": {"type": "ephemeral"}}
+        ]
+    return api_messages
+
+
+def build_chat_request(
+    system_prompt: list,
+    messages: list,
+    history_summary: str = None,
+    summarized_count: int = 0,
+    route: str = ROUTE_DELIBERATE
+) -> dict:
+    """Build the Messages API parameters for a chat turn (shared by the blocking and streaming paths).
+
+    `system_prompt` is build_conversational_prompt's output, usually from the session cache.
+    Messages already folded into the rolling summary are replaced by the summary, so input
+    tokens per turn stay bounded however long the intake runs. `route` selects the model and
+    thinking budget (see app.core.routing)."""
+    system = list(system_prompt)
+    if history_summary and summarized_count:
+        system.append({"type": "text", "text": f"### EARLIER IN THIS CONVERSATION (summary)\n{history_summary}"})
+
+    return {
+        **route_params(route),
+        "system": system,
+        "messages": build_api_messages(history_window(messages, summarized_count))
+    }
+
+
+async def get_ai_response(
+    system_prompt: list,
+    messages: list,
+    history_summary: str = None,
+    summarized_count: int = 0
+) -> tuple[str, bool, list, object]:
+    """Get AI response and determine if conversation is complete. Returns (message, is_complete, thinking_steps, usage)"""
 
     try:
-        client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-
-        # Build the conversation context
-        system_prompt = build_conversational_prompt(patient, ehr, messages)
-
-        # Format messages for Claude API
-        api_messages = []
-        for msg in messages:
-            api_messages.append({
-                "role": "assistant" if msg["role"] == "ai" else "user",
-                "content": msg["content"]
-            })
-
-        # Get AI response with Extended Thinking enabled
-        response = client.messages.create(
-            model="claude-3-7-sonnet-20250219",  # Extended Thinking requires Sonnet
-            max_tokens=4096,
-            temperature=1,  # Must be 1 when thinking is enabled
-            timeout=60.0,  # Increased timeout for thinking
-            thinking={
-                "type": "enabled",
-                "budget_tokens": 2048
-            },
-            system=system_prompt,
-            messages=api_messages
-        )
+        # Routine follow-ups go to the fast model; safety-relevant and pivotal turns get Extended Thinking
+        route, reason = choose_chat_route(messages)
+        params = build_chat_request(system_prompt, messages, history_summary, summarized_count, route)
+        started = time.perf_counter()
+        response = await llm_scheduler.create("chat_turn", PRIORITY_INTERACTIVE, CHAT_PROMPT_VERSION, **params)
+        record_usage("chat_turn", CHAT_PROMPT_VERSION, response.usage)
+        record_route(route, reason, params["model"], time.perf_counter() - started, response.usage)
 
         # Extract thinking blocks and text response
         thinking_steps = []
@@ -109,13 +178,15 @@ def get_ai_response(patient: Patient, ehr: EHRHistory, messages: list) -> tuple[
                 ai_message = block.text
 
         # Check if conversation is complete
-        is_complete = "<<INTAKE_COMPLETE>>" in ai_message
+        is_complete = INTAKE_COMPLETE_MARKER in ai_message
 
         # Remove the completion marker from the message
-        ai_message = ai_message.replace("<<INTAKE_COMPLETE>>", "").strip()
+        ai_message = ai_message.replace(INTAKE_COMPLETE_MARKER, "").strip()
 
-        return ai_message, is_complete, thinking_steps
+        return ai_message, is_complete, thinking_steps, response.usage
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"AI conversation error: {str(e)}")
         import traceback
@@ -126,65 +197,53 @@ def get_ai_response(patient: Patient, ehr: EHRHistory, messages: list) -> tuple[
         )
 
 
-def synthesize_from_conversation(
-    db: Session,
-    patient: Patient,
-    ehr: EHRHistory,
-    conversation: ChatConversation
-) -> ClinicalBriefing:
-    """Synthesize clinical briefing from completed conversation"""
+class CompletionMarkerFilter:
+    """Strips the completion marker from streamed text, even when it arrives split across chunks"""
 
-    # Build narrative from conversation
-    narrative_parts = []
-    for msg in conversation.messages:
-        if msg["role"] == "user":
-            narrative_parts.append(msg["content"])
+    def __init__(self, marker: str = INTAKE_COMPLETE_MARKER):
+        self.marker = marker
+        self.buffer = ""
+        self.found = False
 
-    narrative = "\n\n".join(narrative_parts)
+    def feed(self, chunk: str) -> str:
+        """Add a chunk and return the text that is safe to emit"""
+        self.buffer += chunk
+        if self.marker in self.buffer:
+            self.found = True
+            self.buffer = self.buffer.replace(self.marker, "")
 
-    age = calculate_age(patient.date_of_birth)
+        # Hold back any suffix that could be the start of the marker
+        held = 0
+        for size in range(min(len(self.marker) - 1, len(self.buffer)), 0, -1):
+            if self.marker.startswith(self.buffer[-size:]):
+                held = size
+                break
 
-    # Format EHR data
-    problems = "\n".join([f"- {p['condition']} (ICD-10: {p['icd10']})" for p in ehr.problem_list])
-    # Format medications (handle both old string format and new dict format)
-    if ehr.medication_list and isinstance(ehr.medication_list[0], dict):
-        medications = "\n".join([f"- {m['name']} {m.get('dosage', '')}" for m in ehr.medication_list])
-    else:
-        medications = "\n".join([f"- {med}" for med in ehr.medication_list])
-    labs = "\n".join([f"- {lab['test']}: {lab['value']} (Date: {lab['date']})" for lab in ehr.recent_labs])
+        emit = self.buffer[:len(self.buffer) - held]
+        self.buffer = self.buffer[len(self.buffer) - held:]
+        return emit
 
-    synthesis_prompt = f"""You are an expert AI clinical synthesis engine with a focus on health equity.
+    def flush(self) -> str:
+        """Return whatever is still held back once the stream has ended"""
+        emit, self.buffer = self.buffer, ""
+        return emit
 
-### PATIENT INFORMATION
-- **Name:** {patient.full_name}
-- **Age:** {age} years old
-- **Gender Identity:** {patient.gender_identity}
-- **Race/Ethnicity:** {patient.race}
 
-### ELECTRONIC HEALTH RECORD (EHR)
-**Problem List:**
-{problems}
-
-**Current Medications:**
-{medications}
-
-**Recent Lab Results:**
-{labs if labs else "No recent labs on file"}
-
-### PATIENT INTAKE CONVERSATION TRANSCRIPT
-{narrative}
+# Static synthesis instructions and JSON schema (cached); patient data is sent in the user message
+# Conversation synthesis prompt pieces: the full prompt and the per-section prompts share them
+SYNTHESIS_ROLE = """You are an expert AI clinical synthesis engine with a focus on health equity.
 
-### YOUR TASK
+The user message contains the patient's information, their electronic health record (EHR) and the transcript of their intake conversation.
 
-Analyze the data and create a structured clinical briefing. Provide output as a SINGLE, VALID JSON object with NO additional text.
+"""
 
-**Step 1. Clinical Analysis:**
+CLINICAL_ANALYSIS_STEP = """**Step 1. Clinical Analysis:**
 - Synthesize chief complaint with medical history
 - Look for drug-symptom correlations, condition progression, treatment gaps
 
-**Step 2. Health Equity Analysis - CRITICAL - IDENTIFY → RESEARCH → PROVIDE:**
+"""
 
-**IDENTIFY:** Read the patient's ENTIRE response to the empowerment question. Identify ALL dimensions mentioned:
+EQUITY_IDENTIFY_STEP = """**IDENTIFY:** Read the patient's ENTIRE response to the empowerment question. Identify ALL dimensions mentioned:
 - Religion/spirituality (Muslim, Christian, Jewish, Hindu, Buddhist, etc.)
 - Cultural/ethnic background (be specific)
 - LGBTQ+ identity
@@ -196,7 +255,11 @@ Analyze the data and create a structured clinical briefing. Provide output as a
 
 **Capture everything - don't collapse multiple dimensions into one.**
 
-**RESEARCH:** For EACH dimension identified, conduct SPECIFIC research. Include:
+"""
+
+EQUITY_ANALYSIS_STEP = """**Step 2. Health Equity Analysis - CRITICAL - IDENTIFY → RESEARCH → PROVIDE:**
+
+""" + EQUITY_IDENTIFY_STEP + """**RESEARCH:** For EACH dimension identified, conduct SPECIFIC research. Include:
 - For religion: Prayer times, fasting (dates/meal names), dietary laws (specific ingredients), modesty needs, traditional healing, family decision-making
 - For race/ethnicity + presenting condition: Specific disparity statistics, implicit bias research, prevalence rates, social determinants, historical trauma, validated tools
 - For traditional medicine: Name (native & English), use, safety, drug interactions
@@ -211,13 +274,13 @@ Analyze the data and create a structured clinical briefing. Provide output as a
 
 **Required recommendation fields:**
 
-- **background**: Comprehensive researched info about this specific group. Include: practices (native terms), statistics (actual numbers), historical context, traditional medicine details, cultural norms.
+- **background_context**: Comprehensive researched info about this specific group. Include: practices (native terms), statistics (actual numbers), historical context, traditional medicine details, cultural norms.
 
 - **approach**: 2-3 exact opening phrases the doctor can use. Acknowledge patient's specific preferences, use appropriate terminology, demonstrate respect.
 
-- **explore**: Array of 4-6 specific questions with [context about why it matters and expected answers]. Use appropriate terminology, show respect.
+- **explore_questions**: Array of 4-6 specific questions with [context about why it matters and expected answers]. Use appropriate terminology, show respect.
 
-- **integrate**: Array of 5-8 concrete actions: scheduling accommodations, medication review, traditional medicine integration, validated tools, bias-interruption techniques, resources.
+- **integrate_actions**: Array of 5-8 concrete actions: scheduling accommodations, medication review, traditional medicine integration, validated tools, bias-interruption techniques, resources.
 
 - **avoid**: Array of 4-6 specific mistakes/biases: stereotypes, scheduling errors, medication errors, communication mistakes, documented biases.
 
@@ -230,35 +293,37 @@ Analyze the data and create a structured clinical briefing. Provide output as a
 
 **Multiple Dimensions = Multiple Separate Flags.** If patient mentions 3 things, create 3 flags.
 
-### REQUIRED JSON OUTPUT SCHEMA
+"""
+
+SYNTHESIS_OUTPUT_SCHEMA = """### REQUIRED JSON OUTPUT SCHEMA
 
-{{
+{
   "ai_summary": "A concise 2-3 sentence clinical summary synthesizing the patient's chief complaints with their medical history.",
 
   "key_insights_flags": [
-    {{
+    {
       "type": "Medication Side Effect" | "Condition Progression" | "Treatment Efficacy" | "Risk" | "Alert",
       "flag": "Brief title of the clinical insight (e.g., 'Cough may be linked to Lisinopril').",
       "reasoning": "Detailed explanation of the clinical connection, citing specific evidence from the EHR and conversation.",
       "severity": "Low" | "Medium" | "High"
-    }}
+    }
   ],
 
   "equity_and_context_flags": [
-    {{
+    {
       "type": "Bias Interruption" | "Population Health" | "Cultural Context",
       "flag": "Brief title of the equity-related insight (e.g., 'Buddhist Patient - Spiritual and Cultural Considerations').",
       "reasoning": "Explain WHY this is relevant for this specific patient. What did they mention in the conversation? What disparities or considerations apply?",
-      "recommendation": {{
-        "background": "Comprehensive researched information about this specific cultural/religious/demographic group based on what the patient mentioned. Include: specific practices with native terms, statistics with actual numbers, historical context, traditional medicine details, cultural norms. Be thorough and specific, not generic.",
+      "recommendation": {
+        "background_context": "Comprehensive researched information about this specific cultural/religious/demographic group based on what the patient mentioned. Include: specific practices with native terms, statistics with actual numbers, historical context, traditional medicine details, cultural norms. Be thorough and specific, not generic.",
         "approach": "Exact phrases the doctor can use to open the conversation respectfully. Should acknowledge patient's specific preferences mentioned, use appropriate terminology, demonstrate respect and cultural humility. Provide 2-3 concrete opening statements.",
-        "explore": [
+        "explore_questions": [
           "First specific question using appropriate terminology? [Why this matters based on research and what answers to expect]",
           "Second specific question? [Context and expected responses]",
           "Third specific question? [Context and expected responses]",
           "Fourth specific question? [Context and expected responses]"
         ],
-        "integrate": [
+        "integrate_actions": [
           "First concrete actionable step specific to this patient's context",
           "Second concrete action",
           "Third concrete action",
@@ -271,46 +336,46 @@ Analyze the data and create a structured clinical briefing. Provide output as a
           "Third specific mistake",
           "Fourth specific mistake"
         ]
-      }}
-    }}
+      }
+    }
   ],
 
   "reported_symptoms_structured": [
-    {{
+    {
       "symptom": "The symptom name.",
       "quality": "Description of presentation (e.g., 'sharp', 'throbbing').",
       "location": "Where it occurs.",
       "timing": "When it occurs (e.g., 'constant', 'worse at night')."
-    }}
+    }
   ],
 
   "relevant_history_surfaced": [
     "A list of specific EHR items (problems, meds, labs) directly relevant to the current presentation, including values and dates."
   ]
-}}
+}
 
 **CRITICAL:**
 1. **IDENTIFY** - Read patient's empowerment question response completely. Capture ALL dimensions mentioned (don't collapse).
 2. **RESEARCH** - For EACH dimension, provide specific facts/statistics/practices (not generic statements).
 3. **PROVIDE** - Create SEPARATE flag for each dimension with complete recommendation object.
-4. **COMPLETE RECOMMENDATION OBJECT** - Every equity_and_context_flag MUST have a full "recommendation" object with all 5 fields: background, approach, explore, integrate, avoid. Never leave recommendation empty or null.
+4. **COMPLETE RECOMMENDATION OBJECT** - Every equity_and_context_flag MUST have a full "recommendation" object with all 5 fields: background_context, approach, explore_questions, integrate_actions, avoid. Never leave recommendation empty or null.
 5. **Output ONLY valid JSON** - No additional text, no markdown formatting.
 
 **EXAMPLE TEMPLATE (adapt this structure to the patient's ACTUAL context from their response):**
-{{
+{
   "type": "Cultural Context" | "Bias Interruption" | "Population Health",
   "flag": "[Specific Identity/Context] - [Brief Description]",
   "reasoning": "Patient mentioned [specific thing they said]. This is relevant because [specific disparities, considerations, or needs for THIS group].",
-  "recommendation": {{
-    "background": "Detailed research about THIS specific group the patient mentioned. Include: relevant statistics with numbers, cultural practices with native terms, historical context, health disparities data, traditional approaches. Must be specific to what the patient actually said, not generic.",
+  "recommendation": {
+    "background_context": "Detailed research about THIS specific group the patient mentioned. Include: relevant statistics with numbers, cultural practices with native terms, historical context, health disparities data, traditional approaches. Must be specific to what the patient actually said, not generic.",
     "approach": "Concrete opening phrases tailored to THIS patient: 1) [First phrase acknowledging their specific identity/concern] 2) [Second phrase showing cultural competence] 3) [Third phrase inviting discussion of their specific needs]",
-    "explore": [
+    "explore_questions": [
       "Specific question relevant to THIS identity/context? [Why this matters for THIS group and what to expect]",
       "Another specific question for THIS patient? [Context for THIS group]",
       "Question about specific practices/concerns for THIS group? [Relevant context]",
       "Question about barriers/experiences relevant to THIS identity? [Why it matters]"
     ],
-    "integrate": [
+    "integrate_actions": [
       "Concrete action specific to THIS patient's context and condition",
       "Specific accommodation or consideration for THIS group",
       "Medication/treatment adjustment relevant to THIS identity",
@@ -323,45 +388,424 @@ Analyze the data and create a structured clinical briefing. Provide output as a
       "Documented bias relevant to THIS identity and presenting condition",
       "Communication error specific to THIS cultural/demographic context"
     ]
-  }}
-}}
+  }
+}
 
 Remember: Replace ALL bracketed placeholders with research-based content specific to what the patient actually mentioned. Do NOT use generic statements."""
 
+CONVERSATION_SYNTHESIS_INSTRUCTIONS = (
+    SYNTHESIS_ROLE
+    + """### YOUR TASK
+
+Analyze the data and create a structured clinical briefing. Provide output as a SINGLE, VALID JSON object with NO additional text.
+
+"""
+    + CLINICAL_ANALYSIS_STEP
+    + EQUITY_ANALYSIS_STEP
+    + SYNTHESIS_OUTPUT_SCHEMA
+)
+
+SUMMARY_SECTION_INSTRUCTIONS = SYNTHESIS_ROLE + """### YOUR TASK
+
+Write the clinical summary part of a structured clinical briefing (clinical insights and equity analysis are written separately):
+- `ai_summary`: a concise 2-3 sentence clinical summary synthesizing the patient's chief complaints with their medical history.
+- `reported_symptoms_structured`: each symptom with its quality, location and timing.
+- `relevant_history_surfaced`: specific EHR items (problems, meds, labs) directly relevant to the current presentation, including values and dates.
+
+Provide output as a SINGLE, VALID JSON object with only these fields and NO additional text.
+
+""" + CLINICAL_ANALYSIS_STEP
+
+INSIGHTS_SECTION_INSTRUCTIONS = SYNTHESIS_ROLE + """### YOUR TASK
+
+Write the clinical insights part of a structured clinical briefing (summary and equity analysis are written separately):
+- `key_insights_flags`: each with `type` ("Medication Side Effect" | "Condition Progression" | "Treatment Efficacy" | "Risk" | "Alert"), `flag` (brief title, e.g. 'Cough may be linked to Lisinopril'), `reasoning` (the clinical connection, citing specific evidence from the EHR and conversation) and `severity` ("Low" | "Medium" | "High").
+
+Provide output as a SINGLE, VALID JSON object with only this field and NO additional text.
+
+""" + CLINICAL_ANALYSIS_STEP
+
+EQUITY_SECTION_INSTRUCTIONS = SYNTHESIS_ROLE + """### YOUR TASK
+
+Write the health equity part of a structured clinical briefing (the clinical analysis is written separately):
+- `equity_and_context_flags`: each with `type` ("Bias Interruption" | "Population Health" | "Cultural Context"), `flag`, `reasoning` and a complete `recommendation` object.
+
+Provide output as a SINGLE, VALID JSON object with only this field and NO additional text.
+
+""" + EQUITY_ANALYSIS_STEP
+
+# Equity prompt when recommendation blocks come from the equity knowledge store; the catalogue of
+# known dimensions follows it as a separate system block
+EQUITY_KNOWLEDGE_SECTION_INSTRUCTIONS = SYNTHESIS_ROLE + """### YOUR TASK
+
+Write the health equity part of a structured clinical briefing (the clinical analysis is written separately).
+Recommendation blocks for recurring dimensions are kept in a reviewed knowledge store and added to the briefing
+for you, so your job is to identify the dimensions and explain why each one matters for THIS patient:
+- `equity_dimensions`: one entry per distinct dimension, each with `dimension_key`, `type` ("Bias Interruption" | "Population Health" | "Cultural Context"), `flag` ("[Specific Identity/Context] - [Brief Description]") and `reasoning`.
+- Only for dimensions WITHOUT approved guidance in the catalogue: also `label` (for new keys) and a complete `recommendation` object.
+
+Provide output as a SINGLE, VALID JSON object with only this field and NO additional text.
+
+**Step 2. Health Equity Analysis - IDENTIFY → MATCH → EXPLAIN:**
+
+""" + EQUITY_IDENTIFY_STEP + """**MATCH:** Use the catalogue key whenever a catalogue dimension fits, even if the patient's wording differs.
+Create a new key only when nothing in the catalogue fits.
+
+**EXPLAIN:** `reasoning` is the patient-specific part: what the patient said, and the disparities, practices or
+risks that apply given THEIR symptoms, medications, conditions and circumstances. Do not restate general background
+about the group; that is in the stored recommendation.
+
+**Recommendations for dimensions without approved guidance** use the fields `background_context` (researched
+practices with native terms, actual statistics, historical context), `approach` (2-3 exact opening phrases),
+`explore_questions` (4-6 questions with [why it matters]), `integrate_actions` (5-8 concrete actions) and `avoid`
+(4-6 specific mistakes or documented biases). Write them for the group, not this patient, so they can be reviewed and
+reused.
+
+**Multiple Dimensions = Multiple Separate Entries.** If patient mentions 3 things, create 3 entries.
+"""
+
+# Appended to the equity prompt when the clinical sections were written speculatively
+EQUITY_UPDATE_NOTE = """The clinical sections above were written before the patient's final message. Also set
+`new_clinical_information` to true if the final message adds symptoms or other clinical facts that they do not reflect."""
+
+register_static_prompts(
+    CHAT_SYSTEM_INSTRUCTIONS=CHAT_SYSTEM_INSTRUCTIONS,
+    CONVERSATION_SYNTHESIS_INSTRUCTIONS=CONVERSATION_SYNTHESIS_INSTRUCTIONS,
+    SUMMARY_SECTION_INSTRUCTIONS=SUMMARY_SECTION_INSTRUCTIONS,
+    INSIGHTS_SECTION_INSTRUCTIONS=INSIGHTS_SECTION_INSTRUCTIONS,
+    EQUITY_SECTION_INSTRUCTIONS=EQUITY_SECTION_INSTRUCTIONS,
+    EQUITY_KNOWLEDGE_SECTION_INSTRUCTIONS=EQUITY_KNOWLEDGE_SECTION_INSTRUCTIONS
+)
+
+# Output budgets and deadlines for the parallel synthesis sections
+SUMMARY_SECTION_MAX_TOKENS = 1500
+INSIGHTS_SECTION_MAX_TOKENS = 2000
+EQUITY_SECTION_MAX_TOKENS = 6000
+CLINICAL_SECTION_TIMEOUT = 60.0
+EQUITY_SECTION_TIMEOUT = 120.0
+
+PARTIAL_SECTION_NAMES = {"insights": "clinical insights", "equity": "equity analysis"}
+
+
+def build_conversation_patient_data(
+    patient: Patient,
+    ehr: EHRHistory,
+    messages: list,
+    symptom_draft: dict = None,
+    draft_message_count: int = 0
+) -> str:
+    """Format patient details, EHR and the patient's side of the transcript for conversation synthesis.
+
+    With a symptom draft, the messages it covers are replaced by the structured draft and only
+    the patient's later messages are included verbatim."""
+
+    # Build narrative from conversation
+    narrative_parts = []
+    for msg in messages[draft_message_count if symptom_draft else 0:]:
+        if msg["role"] == "user":
+            narrative_parts.append(msg["content"])
+
+    narrative = "\n\n".join(narrative_parts)
+    if symptom_draft:
+        narrative = (
+            f"Structured symptom draft extracted turn by turn from the intake so far:\n{format_symptom_draft(symptom_draft)}\n\n"
+            f"Patient messages since the draft:\n{narrative or '(none)'}"
+        )
+
+    age = calculate_age(patient.date_of_birth)
+
+    # Format EHR data
+    problems = "\n".join([f"- {p['condition']} (ICD-10: {p['icd10']})" for p in ehr.problem_list])
+    # Format medications (handle both old string format and new dict format)
+    if ehr.medication_list and isinstance(ehr.medication_list[0], dict):
+        medications = "\n".join([f"- {m['name']} {m.get('dosage', '')}" for m in ehr.medication_list])
+    else:
+        medications = "\n".join([f"- {med}" for med in ehr.medication_list])
+    labs = "\n".join([f"- {lab['test']}: {lab['value']} (Date: {lab['date']})" for lab in ehr.recent_labs])
+
+    return f"""### PATIENT INFORMATION
+- **Name:** {patient.full_name}
+- **Age:** {age} years old
+- **Gender Identity:** {patient.gender_identity}
+- **Race/Ethnicity:** {patient.race}
+
+### ELECTRONIC HEALTH RECORD (EHR)
+**Problem List:**
+{problems}
+
+**Current Medications:**
+{medications}
+
+**Recent Lab Results:**
+{labs if labs else "No recent labs on file"}
+
+### PATIENT INTAKE CONVERSATION TRANSCRIPT
+{narrative}
+"""
+
+
+def build_conversation_synthesis_request(
+    user_content: str,
+    instructions: str = CONVERSATION_SYNTHESIS_INSTRUCTIONS,
+    max_tokens: int = 8192,
+    timeout: float = 120.0
+) -> dict:
+    """Messages API parameters for conversation synthesis (full briefing or one section of it)"""
+    return {
+        "model": "claude-3-7-sonnet-20250219",  # Using Sonnet for comprehensive synthesis
+        "max_tokens": max_tokens,
+        "temperature": 0.3,
+        "timeout": timeout,
+        "system": [
+            {"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}}
+        ],
+        "messages": [{"role": "user", "content": user_content}]
+    }
+
+
+def clinical_sections(patient_data: str, symptoms_from_draft: bool = False) -> list:
+    """Summary and insight sections; the summary is required, insights may be dropped.
+
+    When reported symptoms will be taken from the symptom draft, the summary section skips them."""
+    summary_schema = SummaryFromDraftSections if symptoms_from_draft else SummarySections
+    return [
+        SynthesisSection(
+            "summary",
+            summary_schema,
+            build_conversation_synthesis_request(
+                patient_data, SUMMARY_SECTION_INSTRUCTIONS, SUMMARY_SECTION_MAX_TOKENS, CLINICAL_SECTION_TIMEOUT
+            ),
+            CLINICAL_SECTION_TIMEOUT
+        ),
+        SynthesisSection(
+            "insights",
+            InsightSections,
+            build_conversation_synthesis_request(
+                patient_data, INSIGHTS_SECTION_INSTRUCTIONS, INSIGHTS_SECTION_MAX_TOKENS, CLINICAL_SECTION_TIMEOUT
+            ),
+            CLINICAL_SECTION_TIMEOUT,
+            required=False
+        )
+    ]
+
+
+def symptom_draft_for(conversation: ChatConversation, messages: list) -> tuple:
+    """Return (draft, covered_count, symptoms_complete) for synthesizing from `messages`.
+
+    Symptoms can be taken straight from the draft when it covers every patient message except,
+    at most, the answer to the empowerment question."""
+    draft = conversation.symptom_draft
+    covered = min(conversation.symptom_draft_message_count or 0, len(messages))
+    if not draft or not covered:
+        return None, 0, False
+
+    uncovered_user = [index for index in range(covered, len(messages)) if messages[index]["role"] == "user"]
+    answers_empowerment = (
+        len(uncovered_user) == 1
+        and uncovered_user[0] > 0
+        and EMPOWERMENT_QUESTION_PHRASE in messages[uncovered_user[0] - 1]["content"]
+    )
+    return draft, covered, not uncovered_user or answers_empowerment
+
+
+def equity_section(user_content: str, catalogue: dict = None, after_speculation: bool = False) -> SynthesisSection:
+    """Optional equity section. With a knowledge catalogue the model only names dimensions and writes
+    patient-specific reasoning; splice_equity_dimensions adds the stored recommendation blocks."""
+    if catalogue is None:
+        schema = EquityUpdateSections if after_speculation else EquitySections
+        request_params = build_conversation_synthesis_request(
+            user_content, EQUITY_SECTION_INSTRUCTIONS, EQUITY_SECTION_MAX_TOKENS, EQUITY_SECTION_TIMEOUT
+        )
+    else:
+        schema = EquityDimensionUpdateSections if after_speculation else EquityDimensionSections
+        request_params = build_conversation_synthesis_request(
+            user_content, EQUITY_KNOWLEDGE_SECTION_INSTRUCTIONS, EQUITY_SECTION_MAX_TOKENS, EQUITY_SECTION_TIMEOUT
+        )
+        # The catalogue only changes on review, so it stays inside the cached system prefix
+        request_params["system"] = [
+            {"type": "text", "text": EQUITY_KNOWLEDGE_SECTION_INSTRUCTIONS},
+            {"type": "text", "text": format_catalogue(catalogue), "cache_control": {"type": "ephemeral"}}
+        ]
+    return SynthesisSection("equity", schema, request_params, EQUITY_SECTION_TIMEOUT, required=False)
+
+
+async def equity_catalogue(db: AsyncSession):
+    """Equity knowledge catalogue, or None to have the model write every recommendation itself"""
+    if not settings.EQUITY_KNOWLEDGE_ENABLED:
+        return None
+    try:
+        return await load_catalogue(db)
+    except Exception as e:
+        print(f"Equity knowledge store unavailable, generating recommendations inline: {str(e)}")
+        return None
+
+
+async def splice_equity_dimensions(sections: dict, catalogue: dict) -> dict:
+    """Replace the model's equity_dimensions with equity_and_context_flags carrying stored recommendations"""
+    if "equity_dimensions" not in sections:
+        return sections
+    flags, pending = splice_recommendations(sections.pop("equity_dimensions"), catalogue)
+    sections["equity_and_context_flags"] = flags
+    if pending:
+        await record_pending_dimensions(pending)
+    return sections
+
+
+def fill_missing_sections(briefing_data: dict, failed: list) -> dict:
+    """Give failed optional sections empty values and flag the briefing as partial for the clinician"""
+    briefing_data.setdefault("key_insights_flags", [])
+    briefing_data.setdefault("equity_and_context_flags", [])
+    if failed:
+        missing = " and ".join(PARTIAL_SECTION_NAMES.get(name, name) for name in failed)
+        briefing_data["key_insights_flags"].append({
+            "type": "Alert",
+            "flag": f"Briefing incomplete: {missing} unavailable",
+            "reasoning": f"The {missing} could not be generated in time. Regenerate the briefing to fill this in.",
+            "severity": "Low"
+        })
+    return briefing_data
+
+
+def speculative_input_hash(patient_data: str) -> str:
+    return hashlib.sha256(f"{CONVERSATION_SYNTHESIS_PROMPT_VERSION}\n{patient_data}".encode()).hexdigest()
+
+
+async def speculate_clinical_synthesis(conversation_id: str):
+    """Synthesize the clinical sections as soon as the empowerment question has been asked.
+
+    The clinical content is settled at that point, so only the equity analysis is left for
+    when the patient answers. Runs after the turn's response has been sent; on failure the
+    final synthesis simply does the full briefing."""
+    try:
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(ChatConversation, conversation_id)
+            if not conversation or conversation.is_complete:
+                return
+
+            messages = await load_messages(db, conversation)
+            if not messages:
+                return
+            last = messages[-1]
+            if last["role"] != "ai" or EMPOWERMENT_QUESTION_PHRASE not in last["content"]:
+                return
+            if conversation.speculative_message_count == len(messages):
+                return
+
+            patient = await db.get(Patient, conversation.patient_id)
+            ehr = (await db.scalars(
+                select(EHRHistory).where(EHRHistory.patient_id == conversation.patient_id).limit(1)
+            )).first()
+
+            print(f"Conversation {conversation_id}: empowerment question asked, starting speculative clinical synthesis")
+            patient_data = build_conversation_patient_data(patient, ehr, messages)
+            draft, covered, symptoms_from_draft = symptom_draft_for(conversation, messages)
+            clinical, failed = await run_sections(
+                "speculative_clinical_synthesis",
+                CONVERSATION_SYNTHESIS_PROMPT_VERSION,
+                PRIORITY_BACKGROUND,
+                clinical_sections(
+                    build_conversation_patient_data(patient, ehr, messages, draft, covered), symptoms_from_draft
+                )
+            )
+            if failed:
+                # Keep speculation all-or-nothing; the final synthesis will retry every section
+                return
+            if symptoms_from_draft:
+                clinical["reported_symptoms_structured"] = draft_to_reported_symptoms(draft)
+
+            await db.execute(
+                update(ChatConversation)
+                .where(ChatConversation.conversation_id == conversation_id)
+                .values(
+                    speculative_briefing=clinical,
+                    speculative_message_count=len(messages),
+                    speculative_input_hash=speculative_input_hash(patient_data)
+                )
+            )
+            await db.commit()
+            print(f"Conversation {conversation_id}: speculative clinical sections stored")
+    except Exception as e:
+        print(f"Speculative synthesis failed for {conversation_id}: {str(e)}")
+
+
+def usable_speculative_sections(patient: Patient, ehr: EHRHistory, conversation: ChatConversation, messages: list):
+    """Return the speculative clinical sections if they still describe this conversation, else None"""
+    count = conversation.speculative_message_count
+    if not conversation.speculative_briefing or not count:
+        return None
+
+    later_user_messages = [msg for msg in messages[count:] if msg["role"] == "user"]
+    if len(later_user_messages) != 1:
+        print(f"Conversation {conversation.conversation_id}: discarding speculative sections, intake continued after the empowerment question")
+        return None
+
+    patient_data = build_conversation_patient_data(patient, ehr, messages[:count])
+    if speculative_input_hash(patient_data) != conversation.speculative_input_hash:
+        print(f"Conversation {conversation.conversation_id}: discarding speculative sections, EHR or prompt changed")
+        return None
+
+    return conversation.speculative_briefing
+
+
+async def synthesize_from_conversation(
+    db: AsyncSession,
+    patient: Patient,
+    ehr: EHRHistory,
+    conversation: ChatConversation
+) -> ClinicalBriefing:
+    """Synthesize clinical briefing from completed conversation"""
+
+    messages = await load_messages(db, conversation)
+    patient_data = build_conversation_patient_data(patient, ehr, messages)
+
     try:
         print(f"Starting briefing synthesis for patient {patient.patient_id}...")
-        client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-
-        message = client.messages.create(
-            model="claude-3-7-sonnet-20250219",  # Using Sonnet for comprehensive synthesis
-            max_tokens=8192,
-            temperature=0.3,
-            timeout=120.0,  # Increased to 120 second timeout for complex synthesis
-            messages=[{"role": "user", "content": synthesis_prompt}]
-        )
 
-        print(f"Received synthesis response, parsing...")
-        response_text = message.content[0].text
-        
-        # Clean up response text (remove any markdown code blocks if present)
-        response_text = response_text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]  # Remove ```json
-        if response_text.startswith("```"):
-            response_text = response_text[3:]  # Remove ```
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]  # Remove trailing ```
-        response_text = response_text.strip()
-        
-        try:
-            briefing_data = json.loads(response_text)
-        except json.JSONDecodeError as json_err:
-            # Log the problematic response for debugging
-            print(f"Failed to parse JSON response: {response_text[:500]}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"AI returned invalid JSON format. Please try again."
+        briefing_data = None
+        catalogue = await equity_catalogue(db)
+        clinical = usable_speculative_sections(patient, ehr, conversation, messages)
+        if clinical:
+            # Clinical half was done while the patient answered the empowerment question
+            equity, failed = await run_sections(
+                "conversation_equity_synthesis",
+                CONVERSATION_SYNTHESIS_PROMPT_VERSION,
+                PRIORITY_BACKGROUND,
+                [equity_section(
+                    f"{patient_data}\n### CLINICAL SECTIONS ALREADY WRITTEN\n{json.dumps(clinical)}\n\n{EQUITY_UPDATE_NOTE}",
+                    catalogue,
+                    after_speculation=True
+                )]
+            )
+            equity = await splice_equity_dimensions(equity, catalogue)
+            if equity.get("new_clinical_information"):
+                print(f"Conversation {conversation.conversation_id}: final answer added clinical information, discarding speculative sections")
+            else:
+                briefing_data = fill_missing_sections({**clinical, **equity}, failed)
+
+        if briefing_data is None and settings.SYNTHESIS_PARALLEL_SECTIONS:
+            # Output tokens are generated serially, so independent sections run as concurrent calls.
+            # Clinical sections read the per-turn symptom draft instead of the raw transcript.
+            draft, covered, symptoms_from_draft = symptom_draft_for(conversation, messages)
+            clinical_data = build_conversation_patient_data(patient, ehr, messages, draft, covered)
+            sections, failed = await run_sections(
+                "conversation_synthesis",
+                CONVERSATION_SYNTHESIS_PROMPT_VERSION,
+                PRIORITY_BACKGROUND,
+                clinical_sections(clinical_data, symptoms_from_draft) + [equity_section(patient_data, catalogue)]
             )
+            sections = await splice_equity_dimensions(sections, catalogue)
+            if symptoms_from_draft:
+                sections["reported_symptoms_structured"] = draft_to_reported_symptoms(draft)
+            briefing_data = fill_missing_sections(sections, failed)
+
+        if briefing_data is None:
+            briefing_data = await generate_briefing_content(
+                "conversation_synthesis",
+                CONVERSATION_SYNTHESIS_PROMPT_VERSION,
+                PRIORITY_BACKGROUND,
+                build_conversation_synthesis_request(patient_data)
+            )
+        print(f"Received synthesis response")
 
         # Create and save briefing
         briefing_id = f"BRIEF-{uuid.uuid4().hex[:10].upper()}"
@@ -378,8 +822,8 @@ Remember: Replace ALL bracketed placeholders with research-based content specifi
         )
 
         db.add(new_briefing)
-        db.commit()
-        db.refresh(new_briefing)
+        await db.commit()
+        await db.refresh(new_briefing)
 
         print(f"Successfully created briefing {briefing_id}")
         return new_briefing
@@ -398,20 +842,92 @@ Remember: Replace ALL bracketed placeholders with research-based content specifi
         )
 
 
+async def after_chat_turn(conversation_id: str):
+    """Background work once a turn's reply has been sent: fold old history, update the symptom
+    draft, and start the clinical half of the briefing if the empowerment question was just asked"""
+    async def update_draft_then_speculate():
+        # Speculation reads the symptom draft, so let it include this turn first
+        await update_symptom_draft(conversation_id)
+        await speculate_clinical_synthesis(conversation_id)
+
+    await asyncio.gather(refresh_conversation_summary(conversation_id), update_draft_then_speculate())
+
+
+async def load_chat_session(db: AsyncSession, conversation_id: str) -> tuple[ChatConversation, dict]:
+    """The conversation and its session (system prompt and {role, content} messages) for a new turn.
+
+    One query fetches the conversation with its patient's and EHR's updated_at; the session cache
+    supplies the rest unless that state shows it is missing or stale, in which case the patient,
+    EHR and messages are loaded (only the newer messages if another worker took the last turns)."""
+    started = time.perf_counter()
+    row = (await db.execute(
+        select(ChatConversation, Patient.updated_at, EHRHistory.updated_at)
+        .join(Patient, Patient.patient_id == ChatConversation.patient_id)
+        .outerjoin(EHRHistory, EHRHistory.patient_id == ChatConversation.patient_id)
+        .where(ChatConversation.conversation_id == conversation_id)
+        .limit(1)
+    )).first()
+
+    if not row:
+        chat_sessions.discard(conversation_id)
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    conversation, patient_updated_at, ehr_updated_at = row
+    if conversation.is_complete:
+        chat_sessions.discard(conversation_id)
+        raise HTTPException(status_code=400, detail="Conversation already complete")
+
+    stamp = (patient_updated_at, ehr_updated_at)
+    session = chat_sessions.get(conversation_id, conversation.message_count, stamp)
+    if session is None:
+        outcome = "miss"
+        patient = await db.get(Patient, conversation.patient_id)
+        ehr = (await db.scalars(
+            select(EHRHistory).where(EHRHistory.patient_id == conversation.patient_id).limit(1)
+        )).first()
+        messages = await load_messages(db, conversation)
+        session = chat_sessions.put(
+            conversation_id, conversation.patient_id, stamp,
+            build_conversational_prompt(patient, ehr, messages), messages, conversation.message_count
+        )
+    elif session["message_count"] < conversation.message_count:
+        outcome = "partial"
+        newer = await load_messages(db, conversation, start=session["message_count"])
+        session = chat_sessions.put(
+            conversation_id, conversation.patient_id, stamp,
+            session["system_prompt"], session["messages"] + newer, conversation.message_count
+        )
+    else:
+        outcome = "hit"
+
+    chat_sessions.record_load(outcome, time.perf_counter() - started)
+    return conversation, session
+
+
+def remember_turn(conversation: ChatConversation, new_messages: list):
+    """Write a committed turn through to the session cache; finished intakes take no more turns"""
+    if conversation.is_complete:
+        chat_sessions.discard(conversation.conversation_id)
+    else:
+        chat_sessions.appended(conversation.conversation_id, new_messages, conversation.message_count)
+
+
 @router.post("/chat/start", response_model=ChatStartResponse, status_code=201)
-def start_chat(
+async def start_chat(
     request: ChatStartRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Start a new patient intake chat conversation"""
 
     # Fetch patient
-    patient = db.query(Patient).filter(Patient.patient_id == request.patient_id).first()
+    patient = await db.get(Patient, request.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Fetch EHR
-    ehr = db.query(EHRHistory).filter(EHRHistory.patient_id == request.patient_id).first()
+    ehr = (await db.scalars(
+        select(EHRHistory).where(EHRHistory.patient_id == request.patient_id).limit(1)
+    )).first()
     if not ehr:
         raise HTTPException(status_code=404, detail="EHR history not found")
 
@@ -432,12 +948,19 @@ def start_chat(
         conversation_id=conversation_id,
         patient_id=request.patient_id,
         is_complete=False,
-        messages=initial_messages
+        legacy_messages=[],
+        message_count=0
     )
 
     db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
+    await append_messages(db, conversation, initial_messages)
+    await db.commit()
+
+    # The first turn will need this patient's prompt; cache it while patient and EHR are at hand
+    chat_sessions.put(
+        conversation_id, patient.patient_id, (patient.updated_at, ehr.updated_at),
+        build_conversational_prompt(patient, ehr, initial_messages), initial_messages, conversation.message_count
+    )
 
     return ChatStartResponse(
         conversation_id=conversation_id,
@@ -448,64 +971,263 @@ def start_chat(
 
 
 @router.post("/chat/continue", response_model=ChatContinueResponse)
-def continue_chat(
+async def continue_chat(
     request: ChatContinueRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Continue an existing chat conversation"""
-
-    # Fetch conversation
-    conversation = db.query(ChatConversation).filter(
-        ChatConversation.conversation_id == request.conversation_id
-    ).first()
+    """Continue an existing chat conversation.
+
+    Send an `Idempotency-Key` header to make retries safe: a repeated key gets the stored reply
+    back instead of generating and saving the turn again."""
+    return await run_idempotent(
+        "chat/continue",
+        idempotency_key,
+        request.model_dump(mode="json"),
+        lambda: run_chat_turn(request, background_tasks, db),
+        ChatContinueResponse,
+        budget_seconds=settings.llm_call_budget_seconds
+    )
 
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    if conversation.is_complete:
-        raise HTTPException(status_code=400, detail="Conversation already complete")
+async def run_chat_turn(request: ChatContinueRequest, background_tasks: BackgroundTasks, db: AsyncSession) -> ChatContinueResponse:
+    """Generate, save and return one turn of a conversation"""
 
-    # Fetch patient and EHR
-    patient = db.query(Patient).filter(Patient.patient_id == conversation.patient_id).first()
-    ehr = db.query(EHRHistory).filter(EHRHistory.patient_id == conversation.patient_id).first()
+    # Fetch conversation, patient prompt and history (usually from the session cache)
+    conversation, session = await load_chat_session(db, request.conversation_id)
 
     # Add user message to conversation
-    messages = conversation.messages.copy() if conversation.messages else []
-    messages.append({
-        "role": "user",
-        "content": request.user_message
-    })
+    history = session["messages"]
+    user_message = {"role": "user", "content": request.user_message}
+    messages = history + [user_message]
 
     # Get AI response with thinking
-    ai_message, is_complete, thinking_steps = get_ai_response(patient, ehr, messages)
-
-    # Add AI response to conversation
-    messages.append({
-        "role": "ai",
-        "content": ai_message
-    })
+    ai_message, is_complete, thinking_steps, usage = await get_ai_response(
+        session["system_prompt"], messages, conversation.history_summary, conversation.summarized_message_count or 0
+    )
 
-    # Update conversation with new messages array
-    conversation.messages = messages
-    conversation.is_complete = is_complete
+    # Append only this turn's two messages
+    new_messages = [user_message, ai_message_record(ai_message, thinking_steps, usage)]
+    try:
+        await append_messages(db, conversation, new_messages, expected_count=len(history))
+        conversation.is_complete = is_complete
 
-    # Mark the messages column as modified for SQLAlchemy to detect the change
-    from sqlalchemy.orm.attributes import flag_modified
-    flag_modified(conversation, "messages")
+        # If conversation is complete, queue synthesis for a background worker
+        # (committed together with the final turn so the job is never lost)
+        briefing_job_id = None
+        if is_complete:
+            job = await enqueue_briefing_job(db, conversation.patient_id, conversation.conversation_id)
+            briefing_job_id = job.job_id
 
-    db.commit()
-    db.refresh(conversation)
+        await commit_messages(db)
+    except HTTPException:
+        chat_sessions.discard(conversation.conversation_id)
+        raise
+    remember_turn(conversation, new_messages)
 
-    # If conversation is complete, trigger synthesis
-    briefing_id = None
-    if is_complete:
-        briefing = synthesize_from_conversation(db, patient, ehr, conversation)
-        briefing_id = briefing.briefing_id
+    # Summarize old history and speculate on the briefing after the response is sent
+    if not is_complete:
+        background_tasks.add_task(after_chat_turn, conversation.conversation_id)
 
     return ChatContinueResponse(
         conversation_id=conversation.conversation_id,
         ai_message=ChatMessage(role="ai", content=ai_message),
         is_complete=is_complete,
-        briefing_id=briefing_id,
+        briefing_job_id=briefing_job_id,
         thinking=thinking_steps
     )
+
+
+async def persist_streamed_turn(
+    conversation_id: str,
+    new_messages: list,
+    expected_count: int,
+    is_complete: bool
+):
+    """Save a finished streamed turn and queue briefing synthesis if the intake is complete.
+    Returns the briefing_job_id, or None."""
+    async with AsyncSessionLocal() as db:
+        conversation = await db.get(ChatConversation, conversation_id)
+        try:
+            await append_messages(db, conversation, new_messages, expected_count)
+            conversation.is_complete = is_complete
+
+            briefing_job_id = None
+            if is_complete:
+                job = await enqueue_briefing_job(db, conversation.patient_id, conversation_id)
+                briefing_job_id = job.job_id
+
+            await commit_messages(db)
+        except HTTPException:
+            chat_sessions.discard(conversation_id)
+            raise
+        remember_turn(conversation, new_messages)
+        return briefing_job_id
+
+
+async def chat_turn_events(
+    conversation_id: str,
+    system_prompt: list,
+    messages: list,
+    history_summary: str = None,
+    summarized_count: int = 0
+):
+    """Generate a turn's reply as (event, data) pairs: `thinking` and `text` deltas, then `done`
+    once the turn is persisted, or `error`. Shared by the SSE and WebSocket transports."""
+    marker_filter = CompletionMarkerFilter()
+    text_parts = []
+    thinking_parts = []
+    route, reason = choose_chat_route(messages)
+    params = build_chat_request(system_prompt, messages, history_summary, summarized_count, route)
+    started = time.perf_counter()
+    first_token_at = None
+
+    try:
+        async with llm_scheduler.stream("chat_turn", PRIORITY_INTERACTIVE, CHAT_PROMPT_VERSION, **params) as stream:
+            async for event in stream:
+                if event.type != "content_block_delta":
+                    continue
+
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    print(f"Chat stream {conversation_id}: first token after {(first_token_at - started) * 1000:.0f}ms")
+
+                if event.delta.type == "thinking_delta":
+                    thinking_parts.append(event.delta.thinking)
+                    yield "thinking", {"delta": event.delta.thinking}
+                elif event.delta.type == "text_delta":
+                    text = marker_filter.feed(event.delta.text)
+                    if text:
+                        text_parts.append(text)
+                        yield "text", {"delta": text}
+
+            final_message = await stream.get_final_message()
+            record_usage("chat_turn", CHAT_PROMPT_VERSION, final_message.usage)
+            record_route(route, reason, params["model"], time.perf_counter() - started, final_message.usage)
+
+        tail = marker_filter.flush()
+        if tail:
+            text_parts.append(tail)
+            yield "text", {"delta": tail}
+
+    except asyncio.CancelledError:
+        # Client went away mid-generation: closing the stream stops the upstream call,
+        # and nothing is persisted so the patient can resend the same message
+        print(f"Chat stream {conversation_id}: client disconnected, discarding partial response")
+        raise
+    except HTTPException as e:
+        print(f"AI conversation stream unavailable: {e.detail}")
+        yield "error", {"detail": e.detail, "retry_after": (e.headers or {}).get("Retry-After")}
+        return
+    except Exception as e:
+        print(f"AI conversation stream error: {str(e)}")
+        yield "error", {"detail": f"AI conversation failed: {str(e)}"}
+        return
+
+    ai_message = "".join(text_parts).strip()
+    is_complete = marker_filter.found
+    thinking = ["".join(thinking_parts)] if thinking_parts else []
+    new_messages = [messages[-1], ai_message_record(ai_message, thinking, final_message.usage)]
+
+    # Shield persistence so a disconnect after generation still saves the turn
+    try:
+        briefing_job_id = await asyncio.shield(
+            persist_streamed_turn(conversation_id, new_messages, len(messages) - 1, is_complete)
+        )
+    except HTTPException as e:
+        print(f"Chat stream {conversation_id}: turn not saved: {e.detail}")
+        yield "error", {"detail": e.detail}
+        return
+
+    yield "done", {
+        "conversation_id": conversation_id,
+        "seq": len(messages),
+        "ai_message": {"role": "ai", "content": ai_message},
+        "is_complete": is_complete,
+        "briefing_id": None,
+        "briefing_job_id": briefing_job_id,
+        "thinking": thinking,
+        "time_to_first_token_ms": round((first_token_at - started) * 1000) if first_token_at else None
+    }
+
+
+async def stream_chat_events(outcome: dict, *args):
+    """chat_turn_events as Server-Sent Events, noting in `outcome` whether a saved turn left the intake open"""
+    async for event, data in chat_turn_events(*args):
+        if event == "done":
+            outcome["continues"] = not data["is_complete"]
+        yield format_sse(event, data)
+
+
+async def after_streamed_turn(conversation_id: str, outcome: dict):
+    """after_chat_turn for a streamed turn, which only learns how the turn ended once it is sent"""
+    if outcome.get("continues"):
+        await after_chat_turn(conversation_id)
+
+
+@router.post("/chat/continue/stream")
+async def continue_chat_stream(
+    request: ChatContinueRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Continue an existing chat conversation, streaming the reply as Server-Sent Events.
+
+    Events: `thinking` and `text` carry {"delta": str}; `done` carries the same fields as
+    /chat/continue once the turn is saved; `error` carries {"detail": str}."""
+
+    # Fetch conversation, patient prompt and history (usually from the session cache)
+    conversation, session = await load_chat_session(db, request.conversation_id)
+    # The dependency is only torn down once the stream ends; return its connection to the pool
+    # now rather than hold it through generation (the turn is saved on a session of its own)
+    await db.close()
+
+    # Add user message to conversation (a new list: the cached one is shared)
+    messages = session["messages"] + [{
+        "role": "user",
+        "content": request.user_message
+    }]
+
+    # Summarize old history and speculate on the briefing after the stream ends, unless the
+    # turn failed or completed the intake
+    outcome = {}
+    return StreamingResponse(
+        stream_chat_events(
+            outcome,
+            conversation.conversation_id,
+            session["system_prompt"],
+            messages,
+            conversation.history_summary,
+            conversation.summarized_message_count or 0
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(after_streamed_turn, conversation.conversation_id, outcome)
+    )
+
+
+@router.get("/chat/sessions/stats")
+async def get_chat_session_stats():
+    """Hit ratio, load times and database time saved by this worker's chat session cache"""
+    return chat_sessions.stats()
+
+
+@router.get("/chat/{conversation_id}/partial-briefing", response_model=PartialBriefingResponse)
+async def get_partial_briefing(conversation_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Live view of an in-progress intake: the structured symptom draft so far, plus the
+    speculative clinical sections once the empowerment question has been asked"""
+    conversation = await db.get(ChatConversation, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    draft = conversation.symptom_draft or {}
+    return PartialBriefingResponse(
+        conversation_id=conversation.conversation_id,
+        patient_id=conversation.patient_id,
+        is_complete=conversation.is_complete,
+        chief_complaint=draft.get("chief_complaint"),
+        symptoms=draft.get("symptoms", []),
+        messages_covered=conversation.symptom_draft_message_count or 0,
+        total_messages=conversation.message_count or len(await load_messages(db, conversation)),
+        clinical_sections=conversation.speculative_briefing
+    )
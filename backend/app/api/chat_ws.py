@@ -0,0 +1,268 @@
+from collections import defaultdict, deque
+from fastapi import APIRouter, HTTPException, Query, WebSocket
+from sqlalchemy import select
+import asyncio
+import json
+import time
+from app.api.briefing_jobs import job_events
+from app.api.chat import load_chat_session, chat_turn_events, after_chat_turn
+from app.core.config import settings
+from app.core.conversations import load_messages
+from app.db.database import AsyncSessionLocal
+from app.models.patient import ChatConversation, BriefingJob
+
+router = APIRouter()
+
+# Streaming deltas that can be merged while a client is behind
+DELTA_FRAMES = ("thinking", "text")
+
+CLOSE_ORIGIN_NOT_ALLOWED = 1008
+CLOSE_TOO_SLOW = 1013
+CLOSE_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+CLOSE_REPLACED = 4409  # A newer connection to the same conversation took over
+
+# Per worker: the connection each conversation's frames go to, and turns being generated
+live_connections = {}
+turns_in_flight = {}
+background_tasks = set()
+ws_stats = defaultdict(int)
+
+
+class ChatConnection:
+    """One client's WebSocket to a conversation, with a sender task draining its outbound frames.
+
+    Frames are queued rather than sent inline, so generation never waits on the client. While the
+    client is behind, consecutive thinking or text deltas are merged into the frame waiting to go
+    out, so a slow reader gets fewer, larger frames. If other frames still pile up past
+    CHAT_WS_MAX_PENDING_FRAMES the client is dropped; it can reconnect and resume."""
+
+    def __init__(self, websocket: WebSocket, conversation_id: str):
+        self.websocket = websocket
+        self.conversation_id = conversation_id
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.close_code = None
+        self.close_reason = ""
+        self.last_received = time.monotonic()
+        self.watcher = None
+
+    def push(self, frame: dict):
+        if self.close_code is not None:
+            return
+        last = self.pending[-1] if self.pending else None
+        if last and frame["type"] in DELTA_FRAMES and last["type"] == frame["type"]:
+            last["delta"] += frame["delta"]
+            ws_stats["deltas_merged"] += 1
+            return
+        if len(self.pending) >= settings.CHAT_WS_MAX_PENDING_FRAMES:
+            ws_stats["closed_too_slow"] += 1
+            self.close(CLOSE_TOO_SLOW, "Client is not reading fast enough")
+            return
+        self.pending.append(frame)
+        self.wakeup.set()
+
+    def close(self, code: int, reason: str = ""):
+        if self.close_code is None:
+            self.close_code = code
+            self.close_reason = reason
+            self.pending.clear()
+            self.wakeup.set()
+
+    async def send_frames(self):
+        """Deliver queued frames in order until the connection is closed"""
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.pending:
+                await self.websocket.send_text(json.dumps(self.pending.popleft()))
+                ws_stats["frames_sent"] += 1
+            if self.close_code is not None:
+                await self.websocket.close(self.close_code, self.close_reason)
+                return
+
+    async def receive_frames(self):
+        """Handle client frames until the client leaves or stops answering heartbeats"""
+        while True:
+            try:
+                message = await asyncio.wait_for(self.websocket.receive(), timeout=settings.CHAT_WS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if time.monotonic() - self.last_received > settings.CHAT_WS_IDLE_TIMEOUT_SECONDS:
+                    ws_stats["closed_idle"] += 1
+                    self.close(CLOSE_IDLE, "Heartbeat timeout")
+                    return
+                self.push({"type": "ping"})
+                continue
+
+            if message["type"] == "websocket.disconnect":
+                return
+            self.last_received = time.monotonic()
+
+            try:
+                frame = json.loads(message.get("text") or "")
+                kind = frame["type"]
+            except (ValueError, KeyError, TypeError):
+                self.push({"type": "error", "detail": "Frames must be JSON objects with a type"})
+                continue
+
+            if kind == "ping":
+                self.push({"type": "pong"})
+            elif kind == "message":
+                start_turn(self, frame.get("content"))
+            elif kind != "pong":
+                self.push({"type": "error", "detail": f"Unknown frame type: {kind}"})
+
+    def watch_briefing(self, job_id: str):
+        """Push the briefing job's status changes, then `briefing_ready` or `briefing_failed`"""
+        async def watch():
+            async for event, payload in job_events(job_id):
+                if event:
+                    self.push({"type": f"briefing_{event}", **payload})
+
+        if self.watcher is None:
+            self.watcher = asyncio.create_task(watch())
+
+
+def send_to_conversation(conversation_id: str, frame: dict):
+    connection = live_connections.get(conversation_id)
+    if connection:
+        connection.push(frame)
+
+
+def run_in_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def start_turn(connection: ChatConnection, content):
+    conversation_id = connection.conversation_id
+    if not isinstance(content, str) or not content.strip():
+        connection.push({"type": "error", "detail": "Message content must be a non-empty string"})
+        return
+    if conversation_id in turns_in_flight:
+        connection.push({"type": "error", "detail": "A reply is still being generated for this conversation"})
+        return
+
+    task = asyncio.create_task(run_turn(conversation_id, content))
+    turns_in_flight[conversation_id] = task
+    task.add_done_callback(lambda _: turns_in_flight.pop(conversation_id, None))
+
+
+async def run_turn(conversation_id: str, content: str):
+    """Generate and persist one turn, sending its frames to whichever connection is live for the
+    conversation. The turn is not tied to a connection: a reply the client disconnected from is
+    still saved, and reaches the client through replay when it reconnects."""
+    ws_stats["turns"] += 1
+    try:
+        # Only held for the lookup, not while the model generates
+        async with AsyncSessionLocal() as db:
+            conversation, session = await load_chat_session(db, conversation_id)
+    except HTTPException as e:
+        send_to_conversation(conversation_id, {"type": "error", "detail": e.detail})
+        return
+
+    messages = session["messages"] + [{"role": "user", "content": content}]
+    try:
+        async for event, data in chat_turn_events(
+            conversation_id,
+            session["system_prompt"],
+            messages,
+            conversation.history_summary,
+            conversation.summarized_message_count or 0
+        ):
+            send_to_conversation(conversation_id, {"type": event, **data})
+            if event != "done":
+                continue
+            if not data["is_complete"]:
+                run_in_background(after_chat_turn(conversation_id))
+            elif data["briefing_job_id"] and conversation_id in live_connections:
+                live_connections[conversation_id].watch_briefing(data["briefing_job_id"])
+    except Exception as e:
+        # Over SSE the response would just end; a socket stays open, so say the turn failed
+        print(f"Chat socket {conversation_id}: turn failed: {str(e)}")
+        send_to_conversation(conversation_id, {"type": "error", "detail": "The message could not be saved. Please send it again."})
+
+
+@router.websocket("/ws/chat/{conversation_id}")
+async def chat_websocket(websocket: WebSocket, conversation_id: str, last_seq: int = Query(-1, ge=-1)):
+    """Persistent intake session over a WebSocket.
+
+    On connect the server sends `session`, replays every stored message after `last_seq` as
+    `message` frames ({seq, role, content}), then sends `ready`. The client sends
+    {"type": "message", "content": str} for a turn and receives the same `thinking`, `text`,
+    `done` (with the AI message's `seq`) and `error` events as the SSE endpoint. When the intake
+    completes, `briefing_status`, then `briefing_ready` or `briefing_failed`, follow. The client
+    reconnects with ?last_seq= set to the seq of the last message it received, so the replay alone
+    decides what is resent. The server pings idle clients, which answer `pong`."""
+    origin = websocket.headers.get("origin")
+    if origin and origin not in settings.allowed_origins_list:
+        await websocket.close(code=CLOSE_ORIGIN_NOT_ALLOWED)
+        return
+
+    async with AsyncSessionLocal() as db:
+        if not await db.get(ChatConversation, conversation_id):
+            await websocket.close(code=CLOSE_NOT_FOUND)
+            return
+
+    await websocket.accept()
+    connection = ChatConnection(websocket, conversation_id)
+    ws_stats["opened"] += 1
+    ws_stats["resumed"] += last_seq >= 0
+    ws_stats["open"] += 1
+    sender = asyncio.create_task(connection.send_frames())
+    receiver = None
+
+    try:
+        in_flight = turns_in_flight.get(conversation_id)
+        connection.push({"type": "session", "conversation_id": conversation_id, "turn_in_progress": in_flight is not None})
+        if in_flight:
+            # Let the reply the client lost finish, then replay it with everything else it missed
+            await asyncio.wait([in_flight])
+
+        previous = live_connections.get(conversation_id)
+        if previous:
+            previous.close(CLOSE_REPLACED, "Replaced by a newer connection")
+        live_connections[conversation_id] = connection
+
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(ChatConversation, conversation_id)
+            missed = await load_messages(db, conversation, start=last_seq + 1)
+            job = None
+            if conversation.is_complete:
+                job = (await db.scalars(
+                    select(BriefingJob)
+                    .where(BriefingJob.conversation_id == conversation_id)
+                    .order_by(BriefingJob.created_at.desc())
+                    .limit(1)
+                )).first()
+
+        for offset, message in enumerate(missed):
+            connection.push({"type": "message", "seq": last_seq + 1 + offset, **message})
+        ws_stats["messages_replayed"] += len(missed)
+        connection.push({
+            "type": "ready",
+            "message_count": last_seq + 1 + len(missed),
+            "is_complete": conversation.is_complete
+        })
+        if job:
+            connection.watch_briefing(job.job_id)
+
+        receiver = asyncio.create_task(connection.receive_frames())
+        await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_COMPLETED)
+        if connection.close_code is not None and not sender.done():
+            # Timed out: let the sender deliver the close frame
+            await asyncio.wait([sender], timeout=1.0)
+    finally:
+        for task in (sender, receiver, connection.watcher):
+            if task:
+                task.cancel()
+        if live_connections.get(conversation_id) is connection:
+            del live_connections[conversation_id]
+        ws_stats["open"] -= 1
+
+
+@router.get("/chat/ws/stats")
+async def get_chat_ws_stats():
+    """This worker's open intake WebSockets, turns in flight, replays and backpressure counters"""
+    return {"turns_in_flight": len(turns_in_flight), **ws_stats}
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
+from app.core.equity_knowledge import equity_knowledge_metrics
+from app.core.idempotency import idempotency_metrics
+from app.core.llm import usage_totals
+from app.core.routing import route_metrics
+from app.core.scheduler import llm_scheduler
+from app.core.structured import parse_stats
+from app.core.synthesis import section_metrics
+from app.core.telemetry import llm_telemetry, call_metrics, LATENCY_BUCKETS_MS
+
+router = APIRouter()
+
+
+@router.get("/metrics/llm")
+async def get_llm_metrics():
+    """Token usage per call site and prompt version, structured-output parse outcomes per mode,
+    scheduler queue depth, wait times and circuit breaker state, chat route latency and cost,
+    per-section synthesis latency and failures, and equity knowledge store hit counts"""
+    return {
+        "usage": [
+            {"call_site": call_site, "prompt_version": prompt_version, **totals}
+            for (call_site, prompt_version), totals in usage_totals.items()
+        ],
+        "structured_output": [
+            {"call_site": call_site, "mode": mode, **counts}
+            for (call_site, mode), counts in parse_stats.items()
+        ],
+        "scheduler": llm_scheduler.metrics(),
+        "chat_routes": route_metrics(),
+        "synthesis_sections": section_metrics(),
+        "equity_knowledge": equity_knowledge_metrics()
+    }
+
+
+@router.get("/metrics/llm/calls")
+async def get_llm_call_metrics(
+    hours: float = Query(24, gt=0, le=24 * 90),
+    call_site: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Call telemetry from the llm_calls table: outcomes, retries, token spend and latency and
+    time-to-first-token histograms per call site, prompt version and model.
+
+    Histogram counts are cumulative (calls at or under `le` ms); percentiles are the upper bound
+    of the bucket they fall in."""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    return {
+        "since": since.isoformat(),
+        "buckets_ms": LATENCY_BUCKETS_MS,
+        "call_sites": await call_metrics(db, since, call_site),
+        "writer": llm_telemetry.metrics()
+    }
+
+
+@router.get("/metrics/idempotency")
+async def get_idempotency_metrics(db: AsyncSession = Depends(get_async_db)):
+    """Idempotency keys stored for replay, and per-worker replays, waits on in-flight duplicates and conflicts"""
+    return await idempotency_metrics(db)
@@ -1,61 +1,140 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, or_
+from typing import List, Optional
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from app.db.database import get_async_db
 from app.models.patient import Patient, PatientNarrative, ClinicalBriefing, EHRHistory
-from app.schemas.patient import PatientResponse, PatientNarrativeResponse, ClinicalBriefingResponse, EHRHistoryBase
+from app.schemas.patient import PatientPage, PatientResponse, PatientNarrativeResponse, ClinicalBriefingResponse, EHRHistoryBase
 
 router = APIRouter()
 
+BRIEFING_READY = "Briefing Ready"
+PENDING_INTAKE = "Pending Intake"
+
+
+@router.get("/patients", response_model=PatientPage)
+async def get_patients(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    name_prefix: Optional[str] = None,
+    race: Optional[str] = None,
+    zip_code: Optional[str] = None,
+    briefing_status: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of patients with their briefing status, ordered by (created_at, patient_id)"""
+    # Latest briefing per patient, aggregated once instead of a lookup per patient
+    latest_briefings = (
+        select(
+            ClinicalBriefing.patient_id.label("patient_id"),
+            func.max(ClinicalBriefing.created_at).label("latest_briefing_at")
+        )
+        .group_by(ClinicalBriefing.patient_id)
+        .subquery()
+    )
+
+    query = (
+        select(Patient, latest_briefings.c.latest_briefing_at)
+        .outerjoin(latest_briefings, latest_briefings.c.patient_id == Patient.patient_id)
+    )
+
+    # Filter by name prefix (case-insensitive) if provided
+    if name_prefix:
+        query = query.where(Patient.full_name.istartswith(name_prefix, autoescape=True))
+
+    # Filter by race / zip code if provided
+    if race:
+        query = query.where(Patient.race == race)
+    if zip_code:
+        query = query.where(Patient.address_zip_code == zip_code)
+
+    # Filter by briefing status if provided
+    if briefing_status == BRIEFING_READY:
+        query = query.where(latest_briefings.c.latest_briefing_at.isnot(None))
+    elif briefing_status == PENDING_INTAKE:
+        query = query.where(latest_briefings.c.latest_briefing_at.is_(None))
+    elif briefing_status:
+        raise HTTPException(
+            status_code=400,
+            detail=f"briefing_status must be '{BRIEFING_READY}' or '{PENDING_INTAKE}'"
+        )
+
+    # Resume after the last row of the previous page
+    if cursor:
+        after_created_at, after_patient_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Patient.created_at > after_created_at,
+                and_(Patient.created_at == after_created_at, Patient.patient_id > after_patient_id)
+            )
+        )
+
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(Patient.created_at.asc(), Patient.patient_id.asc()).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [patient_item(patient, latest_briefing_at) for patient, latest_briefing_at in rows]
+
+    next_cursor = None
+    if has_more:
+        last_patient = rows[-1][0]
+        next_cursor = encode_cursor(last_patient.created_at, last_patient.patient_id)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def patient_item(patient: Patient, latest_briefing_at) -> dict:
+    return {
+        "patient_id": patient.patient_id,
+        "full_name": patient.full_name,
+        "date_of_birth": patient.date_of_birth,
+        "gender_identity": patient.gender_identity,
+        "race": patient.race,
+        "address_zip_code": patient.address_zip_code,
+        "briefing_status": BRIEFING_READY if latest_briefing_at else PENDING_INTAKE,
+        "latest_briefing_at": latest_briefing_at,
+        "created_at": patient.created_at,
+        "updated_at": patient.updated_at
+    }
+
+
+@router.get("/patients/{patient_id}", response_model=PatientResponse)
+async def get_patient(patient_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get one patient with their briefing status (e.g. to refresh a row without reloading the list)"""
+    patient = await db.get(Patient, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
 
-@router.get("/patients", response_model=List[PatientResponse])
-def get_patients(db: Session = Depends(get_db)):
-    """Get all patients with their briefing status"""
-    patients = db.query(Patient).all()
-
-    result = []
-    for patient in patients:
-        # Check if patient has a briefing
-        has_briefing = db.query(ClinicalBriefing).filter(
-            ClinicalBriefing.patient_id == patient.patient_id
-        ).first() is not None
-
-        result.append({
-            "patient_id": patient.patient_id,
-            "full_name": patient.full_name,
-            "date_of_birth": patient.date_of_birth,
-            "gender_identity": patient.gender_identity,
-            "race": patient.race,
-            "address_zip_code": patient.address_zip_code,
-            "briefing_status": "Briefing Ready" if has_briefing else "Pending Intake",
-            "created_at": patient.created_at,
-            "updated_at": patient.updated_at
-        })
-
-    return result
+    latest_briefing_at = await db.scalar(
+        select(func.max(ClinicalBriefing.created_at)).where(ClinicalBriefing.patient_id == patient_id)
+    )
+    return patient_item(patient, latest_briefing_at)
 
 
 @router.get("/patients/{patient_id}/narratives", response_model=List[PatientNarrativeResponse])
-def get_patient_narratives(patient_id: str, db: Session = Depends(get_db)):
+async def get_patient_narratives(patient_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get all narratives for a specific patient"""
     # Verify patient exists
-    patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+    patient = await db.get(Patient, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    narratives = db.query(PatientNarrative).filter(
-        PatientNarrative.patient_id == patient_id
-    ).all()
+    narratives = (await db.scalars(
+        select(PatientNarrative).where(PatientNarrative.patient_id == patient_id)
+    )).all()
 
     return narratives
 
 
 @router.get("/patients/{patient_id}/briefing", response_model=ClinicalBriefingResponse)
-def get_patient_briefing(patient_id: str, db: Session = Depends(get_db)):
+async def get_patient_briefing(patient_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get the clinical briefing for a specific patient"""
-    briefing = db.query(ClinicalBriefing).filter(
-        ClinicalBriefing.patient_id == patient_id
-    ).first()
+    briefing = (await db.scalars(
+        select(ClinicalBriefing).where(ClinicalBriefing.patient_id == patient_id).limit(1)
+    )).first()
 
     if not briefing:
         raise HTTPException(status_code=404, detail="Briefing not found for this patient")
@@ -64,16 +143,16 @@ def get_patient_briefing(patient_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/patients/{patient_id}/ehr", response_model=EHRHistoryBase)
-def get_patient_ehr(patient_id: str, db: Session = Depends(get_db)):
+async def get_patient_ehr(patient_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get the EHR history for a specific patient"""
     # Verify patient exists
-    patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+    patient = await db.get(Patient, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    ehr = db.query(EHRHistory).filter(
-        EHRHistory.patient_id == patient_id
-    ).first()
+    ehr = (await db.scalars(
+        select(EHRHistory).where(EHRHistory.patient_id == patient_id).limit(1)
+    )).first()
 
     if not ehr:
         raise HTTPException(status_code=404, detail="EHR history not found for this patient")
@@ -1,16 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Header
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.db.database import get_async_db
 from app.models.patient import Patient, EHRHistory, ClinicalBriefing
 from app.schemas.patient import SynthesizeRequest, ClinicalBriefingResponse
+from app.core.cache import synthesis_cache, synthesis_cache_key
 from app.core.config import settings
-from anthropic import Anthropic
-import json
+from app.core.idempotency import run_idempotent
+from app.core.singleflight import synthesis_flights
+from app.core.scheduler import PRIORITY_INTERACTIVE
+from app.core.structured import generate_briefing_content
+from typing import Optional
 from datetime import datetime
 import uuid
 
 router = APIRouter()
 
+SYNTHESIS_MODEL = "claude-3-5-haiku-20241022"
+
+# Part of the response cache key: bump whenever build_synthesis_prompt changes
+NARRATIVE_SYNTHESIS_PROMPT_VERSION = "narrative-synthesis-v2"
+
 
 def build_synthesis_prompt(patient: Patient, ehr: EHRHistory, narrative: str) -> str:
     """Build the detailed prompt for Claude API"""
@@ -104,64 +114,129 @@ IMPORTANT GUIDELINES:
 
 
 @router.post("/synthesize", response_model=ClinicalBriefingResponse, status_code=201)
-def synthesize_clinical_briefing(
+async def synthesize_clinical_briefing(
     request: SynthesizeRequest,
-    db: Session = Depends(get_db)
+    cache_control: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Generate a clinical briefing using Claude AI"""
+    """Generate a clinical briefing using Claude AI.
+
+    Responses are cached on a hash of the patient, EHR, narrative, model and prompt version;
+    send `Cache-Control: no-cache` to force a fresh generation. With an `Idempotency-Key` header
+    a retry returns the briefing the first request saved, even with `no-cache`."""
+    return await run_idempotent(
+        "synthesize",
+        idempotency_key,
+        request.model_dump(mode="json"),
+        lambda: generate_clinical_briefing(request, cache_control, db),
+        ClinicalBriefingResponse,
+        budget_seconds=settings.synthesis_budget_seconds,
+        status_code=201
+    )
+
+
+async def generate_clinical_briefing(request: SynthesizeRequest, cache_control: Optional[str], db: AsyncSession) -> ClinicalBriefing:
+    """Serve the briefing from the response cache, join an identical generation in flight, or
+    generate and save a new one"""
 
     # 1. Fetch patient data
-    patient = db.query(Patient).filter(Patient.patient_id == request.patient_id).first()
+    patient = await db.get(Patient, request.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # 2. Fetch EHR history
-    ehr = db.query(EHRHistory).filter(EHRHistory.patient_id == request.patient_id).first()
+    ehr = (await db.scalars(
+        select(EHRHistory).where(EHRHistory.patient_id == request.patient_id).limit(1)
+    )).first()
     if not ehr:
         raise HTTPException(status_code=404, detail="EHR history not found for patient")
 
-    # 3. Build the prompt
-    prompt = build_synthesis_prompt(patient, ehr, request.narrative)
+    # 3. Serve identical requests from the response cache
+    cache_key = synthesis_cache_key(
+        patient, ehr, request.narrative, SYNTHESIS_MODEL, NARRATIVE_SYNTHESIS_PROMPT_VERSION
+    )
+    if cache_control and "no-cache" in cache_control.lower():
+        synthesis_cache.bypasses += 1
+        return await synthesize_and_save(db, patient, ehr, request, cache_key)
 
-    # 4. Call Claude API
-    try:
-        client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-
-        message = client.messages.create(
-            model="claude-3-5-haiku-20241022",
-            max_tokens=2000,
-            temperature=0.3,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
+    cached = await briefing_from_cache(db, request.patient_id, cache_key)
+    if cached:
+        return cached
 
-        # Extract the response
-        response_text = message.content[0].text
+    # 4. Coalesce with an identical synthesis already running here or in another worker
+    async def lookup():
+        briefing = await briefing_from_cache(db, request.patient_id, cache_key)
+        return briefing.briefing_id if briefing else None
 
-        # Parse the JSON response
-        briefing_data = json.loads(response_text)
+    async def produce():
+        return (await synthesize_and_save(db, patient, ehr, request, cache_key)).briefing_id
 
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to parse AI response as JSON: {str(e)}"
+    briefing_id = await synthesis_flights.run(cache_key, produce, lookup)
+    return await db.get(ClinicalBriefing, briefing_id)
+
+
+async def briefing_from_cache(db: AsyncSession, patient_id: str, cache_key: str) -> Optional[ClinicalBriefing]:
+    """The briefing for a cached response, saving a new one if the original was deleted"""
+    cached = await synthesis_cache.get(db, cache_key)
+    if not cached:
+        return None
+    existing = await db.get(ClinicalBriefing, cached["briefing_id"]) if cached["briefing_id"] else None
+    if existing:
+        return existing
+    return await save_briefing(db, patient_id, cached["response"], cache_key)
+
+
+async def synthesize_and_save(
+    db: AsyncSession,
+    patient: Patient,
+    ehr: EHRHistory,
+    request: SynthesizeRequest,
+    cache_key: str
+) -> ClinicalBriefing:
+    """Call the model for a new briefing and save it"""
+
+    # 1. Build the prompt
+    prompt = build_synthesis_prompt(patient, ehr, request.narrative)
+
+    # 2. Call Claude API
+    try:
+        briefing_data = await generate_briefing_content(
+            "narrative_synthesis",
+            NARRATIVE_SYNTHESIS_PROMPT_VERSION,
+            PRIORITY_INTERACTIVE,
+            {
+                "model": SYNTHESIS_MODEL,
+                "max_tokens": 2000,
+                "temperature": 0.3,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            }
         )
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"AI synthesis failed: {str(e)}"
         )
 
-    # 5. Create and save the briefing
+    # 3. Create and save the briefing
+    return await save_briefing(db, request.patient_id, briefing_data, cache_key)
+
+
+async def save_briefing(db: AsyncSession, patient_id: str, briefing_data: dict, cache_key: str) -> ClinicalBriefing:
+    """Save a briefing from parsed model output and point the cache entry at it"""
     briefing_id = f"BRIEF-{uuid.uuid4().hex[:10].upper()}"
 
     new_briefing = ClinicalBriefing(
         briefing_id=briefing_id,
-        patient_id=request.patient_id,
+        patient_id=patient_id,
         ai_summary=briefing_data["ai_summary"],
         key_insights_flags=briefing_data["key_insights_flags"],
         equity_and_context_flags=briefing_data.get("equity_and_context_flags", []),
@@ -170,7 +245,24 @@ def synthesize_clinical_briefing(
     )
 
     db.add(new_briefing)
-    db.commit()
-    db.refresh(new_briefing)
+    await synthesis_cache.set(
+        db, cache_key, patient_id, SYNTHESIS_MODEL, NARRATIVE_SYNTHESIS_PROMPT_VERSION, briefing_id, briefing_data
+    )
+    await db.commit()
+    await db.refresh(new_briefing)
 
     return new_briefing
+
+
+@router.get("/synthesize/cache/stats")
+async def get_synthesis_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    """Hit ratio and bytes held by the synthesis response cache (per worker for the in-process tier),
+    and how many requests joined an identical generation instead of calling the model (per worker)"""
+    return {**await synthesis_cache.stats(db), "coalescing": synthesis_flights.metrics()}
+
+
+@router.delete("/synthesize/cache/{patient_id}")
+async def invalidate_synthesis_cache(patient_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Drop every cached synthesis response for a patient (call after changing their EHR)"""
+    removed = await synthesis_cache.invalidate(db, patient_id)
+    return {"patient_id": patient_id, "entries_removed": removed}
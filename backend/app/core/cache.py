@@ -0,0 +1,309 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+import hashlib
+import json
+import threading
+import time
+from sqlalchemy import select, delete, func, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.patient import Patient, EHRHistory, SynthesisCacheEntry
+
+
+class TTLCache:
+    """Bounded in-process LRU cache with per-entry expiry and byte accounting"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, size_bytes, value)
+        self._lock = threading.Lock()
+        self.bytes_held = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, size_bytes: int):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size_bytes, value)
+            self.bytes_held += size_bytes
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def discard_where(self, predicate):
+        """Remove every entry whose value matches predicate (a full scan; use discard for one key)"""
+        with self._lock:
+            for key in [k for k, (_, _, value) in self._entries.items() if predicate(value)]:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        _, size_bytes, _ = self._entries.pop(key)
+        self.bytes_held -= size_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def synthesis_cache_key(
+    patient: Patient,
+    ehr: EHRHistory,
+    narrative: str,
+    model: str,
+    prompt_version: str
+) -> str:
+    """Content hash of everything that determines a synthesis response"""
+    ehr_content = {
+        "problem_list": ehr.problem_list,
+        "medication_list": ehr.medication_list,
+        "recent_labs": ehr.recent_labs,
+        "surgical_history": ehr.surgical_history,
+        "allergies": ehr.allergies,
+        "social_history": ehr.social_history,
+        "family_history": ehr.family_history,
+        "vital_signs": ehr.vital_signs
+    }
+    material = {
+        "patient": {
+            "patient_id": patient.patient_id,
+            "full_name": patient.full_name,
+            "date_of_birth": patient.date_of_birth.isoformat(),
+            "gender_identity": patient.gender_identity,
+            "race": patient.race
+        },
+        "ehr_updated_at": ehr.updated_at.isoformat() if ehr.updated_at else None,
+        "ehr": ehr_content,
+        "narrative": narrative,
+        "model": model,
+        "prompt_version": prompt_version
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SynthesisCache:
+    """Two-tier synthesis response cache: in-process LRU in front of the synthesis_cache table"""
+
+    def __init__(self):
+        self.memory = TTLCache(settings.SYNTHESIS_CACHE_MAX_ENTRIES, settings.SYNTHESIS_CACHE_TTL_SECONDS)
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    async def get(self, db: AsyncSession, cache_key: str) -> Optional[dict]:
+        """Return the cached {patient_id, briefing_id, response} for a key, or None"""
+        entry = self.memory.get(cache_key)
+        if entry is not None:
+            self.memory_hits += 1
+            return entry
+
+        row = (await db.scalars(
+            select(SynthesisCacheEntry).where(
+                SynthesisCacheEntry.cache_key == cache_key,
+                SynthesisCacheEntry.expires_at > datetime.now(timezone.utc)
+            )
+        )).first()
+        if row is not None:
+            self.db_hits += 1
+            row.hit_count += 1
+            await db.commit()
+            entry = {"patient_id": row.patient_id, "briefing_id": row.briefing_id, "response": row.response_json}
+            self.memory.set(cache_key, entry, row.size_bytes)
+            return entry
+
+        self.misses += 1
+        return None
+
+    async def set(
+        self,
+        db: AsyncSession,
+        cache_key: str,
+        patient_id: str,
+        model: str,
+        prompt_version: str,
+        briefing_id: str,
+        response: dict
+    ):
+        """Store a response in both tiers (the caller commits)"""
+        size_bytes = len(json.dumps(response).encode())
+        entry = {"patient_id": patient_id, "briefing_id": briefing_id, "response": response}
+        self.memory.set(cache_key, entry, size_bytes)
+
+        await db.merge(SynthesisCacheEntry(
+            cache_key=cache_key,
+            patient_id=patient_id,
+            model=model,
+            prompt_version=prompt_version,
+            briefing_id=briefing_id,
+            response_json=response,
+            size_bytes=size_bytes,
+            hit_count=0,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.SYNTHESIS_CACHE_TTL_SECONDS)
+        ))
+
+    def invalidate_memory(self, patient_id: str):
+        """Drop a patient's in-process entries (e.g. when their EHR changes)"""
+        self.memory.discard_where(lambda entry: entry["patient_id"] == patient_id)
+
+    async def invalidate(self, db: AsyncSession, patient_id: str) -> int:
+        """Drop a patient's entries from both tiers. Returns the number of stored rows removed."""
+        self.invalidate_memory(patient_id)
+        result = await db.execute(delete(SynthesisCacheEntry).where(SynthesisCacheEntry.patient_id == patient_id))
+        await db.commit()
+        return result.rowcount
+
+    async def stats(self, db: AsyncSession) -> dict:
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        db_entries, db_bytes = (await db.execute(
+            select(func.count(), func.coalesce(func.sum(SynthesisCacheEntry.size_bytes), 0))
+        )).one()
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes_held,
+            "db_entries": db_entries,
+            "db_bytes": db_bytes
+        }
+
+
+synthesis_cache = SynthesisCache()
+
+
+class ChatSessionCache:
+    """In-process cache of active intake conversations: the patient's system prompt and the
+    {role, content} history, so a turn needs one state query instead of reloading the
+    conversation, patient, EHR and messages.
+
+    Each worker has its own copy. Every read is checked against the conversation's
+    message_count and the patient's and EHR's updated_at from that state query, so turns
+    taken through another worker, and record changes made anywhere, are picked up instead
+    of served stale. Sessions are immutable dicts; a saved turn replaces its entry."""
+
+    def __init__(self):
+        self.memory = TTLCache(settings.CHAT_SESSION_CACHE_MAX_ENTRIES, settings.CHAT_SESSION_CACHE_TTL_SECONDS)
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.hit_load_seconds = 0.0
+        self.miss_load_seconds = 0.0
+
+    def get(self, conversation_id: str, message_count: int, stamp: tuple) -> Optional[dict]:
+        """The cached session if it is still a prefix of the stored conversation, else None.
+        A session with fewer messages than message_count needs only the newer rows loaded."""
+        session = self.memory.get(conversation_id)
+        if session is None:
+            return None
+        behind = message_count - session["message_count"]
+        # A legacy JSON history (message_count 0) can't be topped up row by row
+        if session["stamp"] != stamp or behind < 0 or (behind and not session["message_count"]):
+            self.stale += 1
+            self.discard(conversation_id)
+            return None
+        return session
+
+    def put(
+        self,
+        conversation_id: str,
+        patient_id: str,
+        stamp: tuple,
+        system_prompt: list,
+        messages: list,
+        message_count: int
+    ) -> dict:
+        session = {
+            "conversation_id": conversation_id,
+            "patient_id": patient_id,
+            "stamp": stamp,
+            "system_prompt": system_prompt,
+            "messages": messages,
+            "message_count": message_count
+        }
+        size_bytes = sum(len(block["text"]) for block in system_prompt) + sum(len(msg["content"]) for msg in messages)
+        self.memory.set(conversation_id, session, size_bytes)
+        return session
+
+    def appended(self, conversation_id: str, new_messages: list, message_count: int):
+        """Write-through after a turn is committed: extend the session, or drop it if it no longer
+        lines up with the stored conversation"""
+        session = self.memory.get(conversation_id)
+        if session is None:
+            return
+        messages = session["messages"] + [{"role": msg["role"], "content": msg["content"]} for msg in new_messages]
+        if len(messages) != message_count:
+            self.discard(conversation_id)
+            return
+        self.put(conversation_id, session["patient_id"], session["stamp"], session["system_prompt"], messages, message_count)
+
+    def discard(self, conversation_id: str):
+        self.memory.discard(conversation_id)
+
+    def invalidate_patient(self, patient_id: str):
+        """Drop a patient's sessions (e.g. when their record or EHR changes)"""
+        self.memory.discard_where(lambda entry: entry["patient_id"] == patient_id)
+
+    def record_load(self, outcome: str, seconds: float):
+        """Count a turn's load (outcome "hit", "partial" or "miss") and the time it spent in the database"""
+        if outcome == "miss":
+            self.misses += 1
+            self.miss_load_seconds += seconds
+        else:
+            self.hits += 1
+            self.partial_hits += outcome == "partial"
+            self.hit_load_seconds += seconds
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        hit_ms = 1000 * self.hit_load_seconds / self.hits if self.hits else None
+        miss_ms = 1000 * self.miss_load_seconds / self.misses if self.misses else None
+        saved_ms = miss_ms - hit_ms if hit_ms is not None and miss_ms is not None else None
+        return {
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "hit_load_ms_avg": round(hit_ms, 2) if hit_ms is not None else None,
+            "miss_load_ms_avg": round(miss_ms, 2) if miss_ms is not None else None,
+            "db_ms_saved_per_hit": round(saved_ms, 2) if saved_ms is not None else None,
+            "db_ms_saved_total": round(saved_ms * self.hits, 1) if saved_ms is not None else None,
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes_held
+        }
+
+
+chat_sessions = ChatSessionCache()
+
+
+@event.listens_for(EHRHistory, "after_update")
+def _invalidate_on_ehr_change(mapper, connection, target):
+    # Stored entries are keyed on EHR content and chat sessions are checked against
+    # updated_at, so neither can be served stale; this just frees the in-process copies right away
+    synthesis_cache.invalidate_memory(target.patient_id)
+    chat_sessions.invalidate_patient(target.patient_id)
+
+
+@event.listens_for(Patient, "after_update")
+def _invalidate_on_patient_change(mapper, connection, target):
+    chat_sessions.invalidate_patient(target.patient_id)
@@ -0,0 +1,85 @@
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.patient import ChatConversation, ConversationMessage
+
+CONFLICT_DETAIL = "This conversation was updated by another request. Please reload it and try again."
+
+# Optional per-message fields stored alongside role and content
+MESSAGE_DETAIL_FIELDS = ("thinking", "input_tokens", "output_tokens", "cache_read_input_tokens")
+
+
+async def _legacy_messages(db: AsyncSession, conversation_id: str) -> list:
+    return await db.scalar(
+        select(ChatConversation.legacy_messages).where(ChatConversation.conversation_id == conversation_id)
+    ) or []
+
+
+async def load_messages(db: AsyncSession, conversation: ChatConversation, start: int = 0) -> list:
+    """The conversation's messages from position `start` as [{role, content}], oldest first.
+
+    Reads only role and content in (conversation_id, seq) order, straight off the primary key."""
+    if not conversation.message_count:
+        # Not migrated to chat_messages yet
+        legacy = await _legacy_messages(db, conversation.conversation_id)
+        return [{"role": msg["role"], "content": msg["content"]} for msg in legacy[start:]]
+
+    rows = await db.execute(
+        select(ConversationMessage.role, ConversationMessage.content)
+        .where(ConversationMessage.conversation_id == conversation.conversation_id, ConversationMessage.seq >= start)
+        .order_by(ConversationMessage.seq)
+    )
+    return [{"role": role, "content": content} for role, content in rows]
+
+
+async def append_messages(db: AsyncSession, conversation: ChatConversation, new_messages: list, expected_count: int = None):
+    """Add messages ({role, content} plus optional thinking and token counts) after the existing ones.
+
+    Only new rows are written; a legacy JSON history is moved into rows first. `expected_count` is
+    the history length the turn was generated from; a mismatch, or another request appending the
+    same positions first (caught by commit_messages), means the turn raced with another one."""
+    start = conversation.message_count
+    if not start:
+        legacy = await _legacy_messages(db, conversation.conversation_id)
+        if legacy:
+            new_messages = [{"role": msg["role"], "content": msg["content"]} for msg in legacy] + new_messages
+            conversation.legacy_messages = []
+        if expected_count is not None:
+            expected_count -= len(legacy)
+
+    if expected_count is not None and expected_count != start:
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+
+    db.add_all([
+        ConversationMessage(
+            conversation_id=conversation.conversation_id,
+            seq=start + offset,
+            role=msg["role"],
+            content=msg["content"],
+            **{field: msg[field] for field in MESSAGE_DETAIL_FIELDS if msg.get(field) is not None}
+        )
+        for offset, msg in enumerate(new_messages)
+    ])
+    conversation.message_count = start + len(new_messages)
+
+
+async def commit_messages(db: AsyncSession):
+    """Commit appended messages; a primary-key clash means a concurrent turn took those positions"""
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+
+
+def ai_message_record(content: str, thinking: list, usage) -> dict:
+    """An AI message with the thinking and token usage of the call that produced it"""
+    return {
+        "role": "ai",
+        "content": content,
+        "thinking": thinking or None,
+        "input_tokens": getattr(usage, "input_tokens", None),
+        "output_tokens": getattr(usage, "output_tokens", None),
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None)
+    }
@@ -0,0 +1,208 @@
+from collections import defaultdict
+import json
+import re
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.recording import register_static_prompts
+from app.core.scheduler import PRIORITY_BACKGROUND
+from app.core.structured import generate_briefing_content
+from app.db.database import AsyncSessionLocal
+from app.models.patient import EquityRecommendation
+from app.schemas.patient import RecommendationDetail
+
+STATUS_DRAFT = "draft"
+STATUS_APPROVED = "approved"
+STATUS_RETIRED = "retired"
+
+# First segment of a dimension key, matching the IDENTIFY list in the synthesis prompt
+DIMENSION_CATEGORIES = [
+    "religion", "culture", "lgbtq", "discrimination", "traditional-medicine", "family", "barrier", "disparity"
+]
+
+EQUITY_KNOWLEDGE_REFRESH_PROMPT_VERSION = "equity-knowledge-refresh-v1"
+
+EQUITY_KNOWLEDGE_REFRESH_INSTRUCTIONS = """You write reusable health equity guidance for clinicians. The guidance is shown in the
+pre-visit briefing of every patient whose intake raises the given dimension, next to patient-specific reasoning that
+is written separately, so it must not refer to any individual patient.
+
+Fill in every field:
+- background_context: practices (with native terms), statistics (with actual numbers and the population they describe),
+  historical context, traditional medicine details and cultural norms relevant to care.
+- approach: 2-3 exact opening phrases a doctor can use.
+- explore_questions: 4-6 specific questions, each followed by [why it matters and what answers to expect].
+- integrate_actions: 5-8 concrete actions: scheduling accommodations, medication review, validated tools, resources.
+- avoid: 4-6 specific mistakes, stereotypes or documented biases.
+
+Be specific, not generic. Leave out anything you are not confident is accurate; a clinical reviewer approves this
+text before it is used."""
+
+register_static_prompts(EQUITY_KNOWLEDGE_REFRESH_INSTRUCTIONS=EQUITY_KNOWLEDGE_REFRESH_INSTRUCTIONS)
+
+knowledge_stats = defaultdict(int)
+
+# One entry: the catalogue of non-retired dimensions, shared by every synthesis in this process
+_catalogue_cache = TTLCache(max_entries=1, ttl_seconds=settings.EQUITY_KNOWLEDGE_TTL_SECONDS)
+
+
+def normalize_dimension_key(key: str) -> str:
+    """Canonical category:specific form, e.g. 'Religion: Islam / Ramadan' becomes 'religion:islam-ramadan'"""
+    parts = [re.sub(r"[^a-z0-9]+", "-", part.lower()).strip("-") for part in key.split(":", 1)]
+    return ":".join(part for part in parts if part)
+
+
+async def load_catalogue(db: AsyncSession) -> dict:
+    """Dimension key -> latest approved entry, or a placeholder for keys that still await review"""
+    catalogue = _catalogue_cache.get("catalogue")
+    if catalogue is not None:
+        return catalogue
+
+    rows = (await db.scalars(
+        select(EquityRecommendation)
+        .where(EquityRecommendation.status != STATUS_RETIRED)
+        .order_by(EquityRecommendation.dimension_key, EquityRecommendation.version)
+    )).all()
+
+    catalogue = {}
+    for row in rows:
+        if row.status == STATUS_APPROVED:
+            catalogue[row.dimension_key] = {
+                "label": row.label,
+                "version": row.version,
+                "recommendation": row.recommendation,
+                "approved": True
+            }
+        elif row.dimension_key not in catalogue:
+            catalogue[row.dimension_key] = {"label": row.label, "version": None, "recommendation": None, "approved": False}
+
+    _catalogue_cache.set("catalogue", catalogue, len(json.dumps(catalogue)))
+    return catalogue
+
+
+def invalidate_catalogue():
+    _catalogue_cache.discard_where(lambda value: True)
+
+
+def format_catalogue(catalogue: dict) -> str:
+    approved = [f"- {key}: {entry['label']}" for key, entry in sorted(catalogue.items()) if entry["approved"]]
+    pending = [f"- {key}: {entry['label']}" for key, entry in sorted(catalogue.items()) if not entry["approved"]]
+    return (
+        "### EQUITY KNOWLEDGE CATALOGUE\n\n"
+        "Dimensions with approved guidance (emit the key only, never a recommendation):\n"
+        + ("\n".join(approved) or "(none yet)")
+        + "\n\nKnown dimensions awaiting guidance (reuse the key and write a recommendation):\n"
+        + ("\n".join(pending) or "(none yet)")
+        + f"\n\nFor anything else, create a new key: one of {', '.join(DIMENSION_CATEGORIES)}, a colon, "
+        "then a short hyphenated specific part (e.g. religion:islam-ramadan-fasting). Give it a label and write a recommendation."
+    )
+
+
+def splice_recommendations(dimensions: list, catalogue: dict) -> tuple[list, list]:
+    """Turn the model's dimension flags into equity_and_context_flags. Returns (flags, pending).
+
+    Approved dimensions get the stored recommendation block; other dimensions keep the model's own
+    recommendation and are returned as pending entries for the review queue."""
+    flags = []
+    pending = {}
+    for dimension in dimensions:
+        key = normalize_dimension_key(dimension["dimension_key"])
+        entry = catalogue.get(key)
+        flag = {
+            "type": dimension["type"],
+            "flag": dimension["flag"],
+            "reasoning": dimension["reasoning"],
+            "dimension_key": key
+        }
+
+        if entry and entry["approved"]:
+            knowledge_stats["spliced"] += 1
+            flag["recommendation"] = entry["recommendation"]
+            flag["recommendation_version"] = entry["version"]
+        else:
+            knowledge_stats["uncatalogued"] += 1
+            if dimension.get("recommendation"):
+                knowledge_stats["generated"] += 1
+                flag["recommendation"] = dimension["recommendation"]
+            pending.setdefault(key, {
+                "dimension_key": key,
+                "label": dimension.get("label") or (entry or {}).get("label") or dimension["flag"],
+                "flag_type": dimension["type"],
+                "recommendation": dimension.get("recommendation")
+            })
+        flags.append(flag)
+
+    return flags, list(pending.values())
+
+
+async def record_pending_dimensions(pending: list):
+    """Queue uncatalogued dimensions for review: new keys become drafts, known drafts count the demand.
+
+    The first generated recommendation for a key is kept as its draft text for the reviewer."""
+    for item in pending:
+        try:
+            async with AsyncSessionLocal() as db:
+                latest = (await db.scalars(
+                    select(EquityRecommendation)
+                    .where(EquityRecommendation.dimension_key == item["dimension_key"])
+                    .order_by(EquityRecommendation.version.desc())
+                    .limit(1)
+                )).first()
+
+                if latest is not None and latest.status == STATUS_APPROVED:
+                    continue  # Approved since the catalogue was cached
+                if latest is not None and latest.status == STATUS_DRAFT:
+                    latest.times_requested += 1
+                    if latest.recommendation is None and item["recommendation"]:
+                        latest.recommendation = item["recommendation"]
+                else:
+                    db.add(EquityRecommendation(
+                        dimension_key=item["dimension_key"],
+                        version=(latest.version + 1) if latest else 1,
+                        label=item["label"],
+                        flag_type=item["flag_type"],
+                        recommendation=item["recommendation"],
+                        status=STATUS_DRAFT,
+                        source="generated",
+                        times_requested=1
+                    ))
+                    invalidate_catalogue()
+                await db.commit()
+        except IntegrityError:
+            pass  # A concurrent synthesis created the draft first
+        except Exception as e:
+            print(f"Failed to queue equity dimension {item['dimension_key']} for review: {str(e)}")
+
+
+async def generate_refreshed_recommendation(dimension_key: str, label: str, current: dict = None) -> dict:
+    """Write a new draft recommendation block for a dimension, revising the current text if given"""
+    content = f"DIMENSION: {dimension_key} ({label})"
+    if current:
+        content += f"\n\nCURRENT VERSION (revise, correct and update it):\n{json.dumps(current, indent=2)}"
+
+    return await generate_briefing_content(
+        "equity_knowledge_refresh",
+        EQUITY_KNOWLEDGE_REFRESH_PROMPT_VERSION,
+        PRIORITY_BACKGROUND,
+        {
+            "model": settings.EQUITY_KNOWLEDGE_MODEL,
+            "max_tokens": 3000,
+            "temperature": 0.3,
+            "timeout": 120.0,
+            "system": EQUITY_KNOWLEDGE_REFRESH_INSTRUCTIONS,
+            "messages": [{"role": "user", "content": content}]
+        },
+        RecommendationDetail,
+        # The prompt leaves the output format to the tool schema, so this never runs in json mode
+        output_mode="tool"
+    )
+
+
+def equity_knowledge_metrics() -> dict:
+    catalogue = _catalogue_cache.get("catalogue") or {}
+    return {
+        **knowledge_stats,
+        "catalogue_approved": sum(1 for entry in catalogue.values() if entry["approved"]),
+        "catalogue_pending": sum(1 for entry in catalogue.values() if not entry["approved"])
+    }
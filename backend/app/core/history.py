@@ -0,0 +1,110 @@
+from sqlalchemy import update
+from app.core.config import settings
+from app.core.conversations import load_messages
+from app.core.llm import record_usage
+from app.core.recording import register_static_prompts
+from app.core.scheduler import llm_scheduler, PRIORITY_BACKGROUND
+from app.db.database import AsyncSessionLocal
+from app.models.patient import ChatConversation
+
+HISTORY_SUMMARY_PROMPT_VERSION = "history-summary-v1"
+
+HISTORY_SUMMARY_INSTRUCTIONS = """You maintain a running clinical summary of a patient intake conversation for the intake assistant.
+Merge the new exchanges into the existing summary. Keep every clinically relevant detail the patient gave
+(chief complaint, onset, quality, severity, timing, associated symptoms, beliefs, cultural context, past
+healthcare experiences), in the patient's own words where they matter, and note which topics the assistant
+has already asked about. Do not add interpretation or advice. Reply with the updated summary only, as
+short bullet points."""
+
+register_static_prompts(HISTORY_SUMMARY_INSTRUCTIONS=HISTORY_SUMMARY_INSTRUCTIONS)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (about 4 characters per token for English prose)"""
+    return len(text) // 4 + 1
+
+
+def history_tokens(messages: list) -> int:
+    return sum(estimate_tokens(msg["content"]) for msg in messages)
+
+
+def fold_boundary(messages: list, summarized_count: int) -> int:
+    """How many leading messages should be covered by the summary.
+
+    Nothing is folded until the unsummarized history exceeds the token budget; then everything
+    except the most recent CHAT_HISTORY_KEEP_MESSAGES is folded in one go, so the summariser
+    runs every few turns rather than every turn. The kept window starts at a patient message,
+    so a patient message and the reply to it are always on the same side."""
+    keep = settings.CHAT_HISTORY_KEEP_MESSAGES
+    unsummarized = messages[summarized_count:]
+    if len(unsummarized) <= keep or history_tokens(unsummarized) <= settings.CHAT_HISTORY_TOKEN_BUDGET:
+        return summarized_count
+    boundary = len(messages) - keep
+    if messages[boundary]["role"] == "ai":
+        boundary -= 1
+    return max(boundary, summarized_count)
+
+
+def history_window(messages: list, summarized_count: int) -> list:
+    """Messages sent verbatim: everything not yet folded into the summary"""
+    return messages[summarized_count:]
+
+
+def format_transcript(messages: list) -> str:
+    return "\n".join(
+        f"{'Assistant' if msg['role'] == 'ai' else 'Patient'}: {msg['content']}" for msg in messages
+    )
+
+
+async def summarize_history(previous_summary: str, new_messages: list) -> str:
+    """Fold new exchanges into the running summary with the cheap model"""
+    message = await llm_scheduler.create(
+        "history_summary",
+        PRIORITY_BACKGROUND,
+        HISTORY_SUMMARY_PROMPT_VERSION,
+        model=settings.CHAT_SUMMARY_MODEL,
+        max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+        temperature=0,
+        system=HISTORY_SUMMARY_INSTRUCTIONS,
+        messages=[{
+            "role": "user",
+            "content": f"EXISTING SUMMARY:\n{previous_summary or '(none yet)'}\n\nNEW EXCHANGES:\n{format_transcript(new_messages)}"
+        }]
+    )
+    record_usage("history_summary", HISTORY_SUMMARY_PROMPT_VERSION, message.usage)
+    return message.content[0].text.strip()
+
+
+async def refresh_conversation_summary(conversation_id: str):
+    """Fold older turns into the conversation's rolling summary once history exceeds the budget.
+
+    Runs after the turn's response has been sent. If it fails or loses a race with another
+    refresh, the next turn simply sends a few more messages verbatim."""
+    try:
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(ChatConversation, conversation_id)
+            if not conversation or conversation.is_complete:
+                return
+
+            messages = await load_messages(db, conversation)
+            summarized_count = conversation.summarized_message_count or 0
+            boundary = fold_boundary(messages, summarized_count)
+            if boundary == summarized_count:
+                return
+
+            summary = await summarize_history(conversation.history_summary, messages[summarized_count:boundary])
+
+            # Only apply if no concurrent refresh moved the boundary while we were summarizing
+            result = await db.execute(
+                update(ChatConversation)
+                .where(
+                    ChatConversation.conversation_id == conversation_id,
+                    ChatConversation.summarized_message_count == summarized_count
+                )
+                .values(history_summary=summary, summarized_message_count=boundary)
+            )
+            await db.commit()
+            if result.rowcount:
+                print(f"Conversation {conversation_id}: folded messages {summarized_count}-{boundary} into summary")
+    except Exception as e:
+        print(f"History summary failed for {conversation_id}: {str(e)}")
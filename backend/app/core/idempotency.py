@@ -0,0 +1,233 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+import asyncio
+import hashlib
+import json
+import time
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.patient import IdempotencyKey
+
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETED = "completed"
+
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# How often a duplicate re-reads the key while the original runs in another worker
+POLL_SECONDS = 0.5
+
+# Per worker: a future for each key this worker is running, so duplicates here wait without polling
+_in_flight = {}
+idempotency_stats = defaultdict(int)
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Hash of a request body; a reused key must come with the same body"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def _claim(
+    endpoint: str, key: str, request_hash: str, lease_seconds: float, wait_seconds: float
+) -> tuple[Optional[datetime], Optional[IdempotencyKey]]:
+    """Claim the key for this request. Returns (locked_at, None) once claimed, where locked_at
+    identifies this claim, or (None, completed row) to replay.
+
+    If another request holds the key, waits for it to finish (on its future when it runs in this
+    worker, otherwise by polling) and replays its response. A claim older than the lease is
+    assumed abandoned by a crashed worker and taken over, as is an expired key."""
+    deadline = time.monotonic() + wait_seconds
+    waited = False
+    while True:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+        async with AsyncSessionLocal() as db:
+            db.add(IdempotencyKey(
+                endpoint=endpoint,
+                key=key,
+                request_hash=request_hash,
+                status=STATUS_IN_PROGRESS,
+                locked_at=now,
+                expires_at=expires_at
+            ))
+            try:
+                await db.commit()
+                idempotency_stats["claimed"] += 1
+                return now, None
+            except IntegrityError:
+                await db.rollback()
+
+            # One UPDATE, so only one of several waiting duplicates takes the key over
+            result = await db.execute(
+                update(IdempotencyKey)
+                .where(
+                    IdempotencyKey.endpoint == endpoint,
+                    IdempotencyKey.key == key,
+                    or_(
+                        IdempotencyKey.expires_at <= now,
+                        and_(
+                            IdempotencyKey.status == STATUS_IN_PROGRESS,
+                            IdempotencyKey.locked_at < now - timedelta(seconds=lease_seconds)
+                        )
+                    )
+                )
+                .values(
+                    request_hash=request_hash,
+                    status=STATUS_IN_PROGRESS,
+                    response_status=None,
+                    response_body=None,
+                    locked_at=now,
+                    expires_at=expires_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if result.rowcount == 1:
+                idempotency_stats["takeovers"] += 1
+                return now, None
+
+            row = await db.get(IdempotencyKey, (endpoint, key))
+
+        if row is None:
+            # Released by a failed request in the meantime; try to claim it again
+            continue
+        if row.request_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="This Idempotency-Key was already used with a different request body"
+            )
+        if row.status == STATUS_COMPLETED:
+            idempotency_stats["replayed"] += 1
+            return None, row
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            idempotency_stats["conflicts"] += 1
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still being processed. Please retry shortly."
+            )
+        if not waited:
+            waited = True
+            idempotency_stats["waited"] += 1
+
+        future = _in_flight.get((endpoint, key))
+        if future:
+            await asyncio.wait([future], timeout=remaining)
+        else:
+            await asyncio.sleep(min(POLL_SECONDS, remaining))
+
+
+def _claimed_by(endpoint: str, key: str, locked_at: datetime):
+    """Filter for the key while it is still held by the claim made at locked_at, and not taken over"""
+    return and_(
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.key == key,
+        IdempotencyKey.status == STATUS_IN_PROGRESS,
+        IdempotencyKey.locked_at == locked_at
+    )
+
+
+async def _complete(endpoint: str, key: str, locked_at: datetime, status_code: int, body: dict):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(IdempotencyKey)
+            .where(_claimed_by(endpoint, key, locked_at))
+            .values(
+                status=STATUS_COMPLETED,
+                response_status=status_code,
+                response_body=body,
+                expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    if result.rowcount == 0:
+        # Another request took the key over after our lease ran out; its response is the one stored
+        idempotency_stats["lost_claims"] += 1
+
+
+async def _release(endpoint: str, key: str, locked_at: datetime):
+    """Forget a failed request's claim so a retry with the same key runs again. A claim that was
+    taken over in the meantime belongs to the new owner and is left alone."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(IdempotencyKey)
+            .where(_claimed_by(endpoint, key, locked_at))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    idempotency_stats["released" if result.rowcount else "lost_claims"] += 1
+
+
+async def run_idempotent(
+    endpoint: str,
+    key: Optional[str],
+    payload: dict,
+    handler: Callable[[], Awaitable],
+    response_model: type[BaseModel],
+    budget_seconds: float,
+    status_code: int = 200
+):
+    """Run `handler` at most once per Idempotency-Key.
+
+    `budget_seconds` is the longest the handler can take; a claim is held, and a duplicate waits,
+    that long unless IDEMPOTENCY_LEASE_SECONDS or IDEMPOTENCY_WAIT_SECONDS is set.
+    Without a key the handler just runs. With one, a repeat of a completed request gets the
+    stored response back (with an Idempotent-Replayed header) until the key expires, and a
+    duplicate that arrives while the original is running waits for it instead of calling the
+    model again. Failed requests are not stored, so they can be retried with the same key."""
+    if key is None:
+        return await handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+    locked_at, stored = await _claim(
+        endpoint,
+        key,
+        request_fingerprint(payload),
+        lease_seconds=settings.IDEMPOTENCY_LEASE_SECONDS or budget_seconds,
+        wait_seconds=settings.IDEMPOTENCY_WAIT_SECONDS or budget_seconds
+    )
+    if stored:
+        return JSONResponse(
+            content=stored.response_body,
+            status_code=stored.response_status,
+            headers={REPLAYED_HEADER: "true"}
+        )
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[(endpoint, key)] = future
+    try:
+        result = await handler()
+        body = response_model.model_validate(result).model_dump(mode="json")
+        # Shielded: a client disconnecting now must not leave the key claimed until the lease runs out
+        await asyncio.shield(_complete(endpoint, key, locked_at, status_code, body))
+        return result
+    except BaseException:
+        await asyncio.shield(_release(endpoint, key, locked_at))
+        raise
+    finally:
+        del _in_flight[(endpoint, key)]
+        future.set_result(None)
+
+
+async def idempotency_metrics(db: AsyncSession) -> dict:
+    """Stored keys by status, and this worker's claim, replay and wait counters"""
+    rows = await db.execute(
+        select(IdempotencyKey.status, func.count())
+        .where(IdempotencyKey.expires_at > datetime.now(timezone.utc))
+        .group_by(IdempotencyKey.status)
+    )
+    return {
+        "stored": {status: count for status, count in rows},
+        "in_flight": len(_in_flight),
+        **idempotency_stats
+    }
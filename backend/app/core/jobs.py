@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Optional
+import asyncio
+import uuid
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.patient import BriefingJob
+
+RETRY_BASE_SECONDS = 15
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker reclaimed it"""
+
+
+async def enqueue_briefing_job(db: AsyncSession, patient_id: str, conversation_id: str) -> BriefingJob:
+    """Add a synthesis job to the session; it becomes visible to workers when the caller commits"""
+    job = BriefingJob(
+        job_id=f"JOB-{uuid.uuid4().hex[:10].upper()}",
+        patient_id=patient_id,
+        conversation_id=conversation_id,
+        status="queued",
+        attempts=0,
+        max_attempts=settings.BRIEFING_JOB_MAX_ATTEMPTS,
+        run_after=datetime.now(timezone.utc)
+    )
+    db.add(job)
+    return job
+
+
+async def claim_next_job(db: AsyncSession, worker_id: str) -> Optional[BriefingJob]:
+    """Lock and claim the oldest runnable job.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never claim the same row.
+    Running jobs whose lease has expired (crashed worker) are picked up again."""
+    now = datetime.now(timezone.utc)
+    lease_expired = now - timedelta(seconds=settings.BRIEFING_JOB_LEASE_SECONDS)
+
+    job = (await db.scalars(
+        select(BriefingJob)
+        .where(
+            or_(
+                and_(BriefingJob.status == "queued", BriefingJob.run_after <= now),
+                and_(BriefingJob.status == "running", BriefingJob.locked_at < lease_expired)
+            )
+        )
+        .order_by(BriefingJob.run_after.asc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )).first()
+
+    if not job:
+        await db.rollback()
+        return None
+
+    job.status = "running"
+    job.locked_by = worker_id
+    job.locked_at = now
+    job.attempts += 1
+    await db.commit()
+    return job
+
+
+def _owned_by(job_id: str, worker_id: str):
+    return and_(BriefingJob.job_id == job_id, BriefingJob.status == "running", BriefingJob.locked_by == worker_id)
+
+
+async def renew_job_lease(job_id: str, worker_id: str) -> bool:
+    """Push back the lease expiry of a job this worker is running. False if it no longer owns it."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(BriefingJob)
+            .where(_owned_by(job_id, worker_id))
+            .values(locked_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+async def run_with_lease(job_id: str, worker_id: str, work: Awaitable):
+    """Run `work`, renewing the job's lease every BRIEFING_JOB_HEARTBEAT_SECONDS so a slow
+    synthesis is not reclaimed by another worker. If the job was reclaimed anyway (e.g. this
+    worker stalled past the lease), `work` is cancelled and LeaseLost raised."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=settings.BRIEFING_JOB_HEARTBEAT_SECONDS)
+            if done:
+                return task.result()
+            try:
+                renewed = await renew_job_lease(job_id, worker_id)
+            except Exception as e:
+                # Keep working; the next heartbeat retries before the lease runs out
+                print(f"⚠️  {worker_id}: could not renew the lease on {job_id}: {str(e)}")
+                continue
+            if not renewed:
+                raise LeaseLost(f"{job_id} was reclaimed by another worker")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def mark_job_succeeded(db: AsyncSession, job: BriefingJob, worker_id: str, briefing_id: str) -> bool:
+    """Record the briefing, if this worker still owns the job. Returns whether it did."""
+    result = await db.execute(
+        update(BriefingJob)
+        .where(_owned_by(job.job_id, worker_id))
+        .values(status="succeeded", briefing_id=briefing_id, locked_by=None, locked_at=None, last_error=None)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def mark_job_failed(db: AsyncSession, job: BriefingJob, worker_id: str, error: str) -> bool:
+    """Requeue with exponential backoff, or give up once max_attempts is reached.
+
+    Does nothing if another worker has reclaimed the job; returns whether it was updated."""
+    values = {"last_error": error[:2000], "locked_by": None, "locked_at": None}
+    if job.attempts < job.max_attempts:
+        values["status"] = "queued"
+        values["run_after"] = datetime.now(timezone.utc) + timedelta(
+            seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+        )
+    else:
+        values["status"] = "failed"
+
+    result = await db.execute(update(BriefingJob).where(_owned_by(job.job_id, worker_id)).values(**values))
+    await db.commit()
+    return result.rowcount == 1
@@ -0,0 +1,77 @@
+from collections import defaultdict
+from typing import Optional
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient, Timeout
+from app.core.config import settings
+
+# Process-wide client so every call reuses the same pooled keep-alive connections
+_client: Optional[AsyncAnthropic] = None
+
+# Running token totals per (call site, prompt version), for comparing prompt-cache effectiveness
+usage_totals = defaultdict(lambda: defaultdict(int))
+
+
+def create_anthropic_client() -> AsyncAnthropic:
+    """Create an AsyncAnthropic client with pooled connections and configured timeouts"""
+    # Limits are the httpx type the SDK is built on (see the anthropic pin in requirements.txt)
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.ANTHROPIC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.ANTHROPIC_KEEPALIVE_EXPIRY
+        )
+    )
+
+    return AsyncAnthropic(
+        api_key=settings.ANTHROPIC_API_KEY,
+        base_url=settings.ANTHROPIC_BASE_URL,
+        timeout=Timeout(settings.ANTHROPIC_TIMEOUT, connect=settings.ANTHROPIC_CONNECT_TIMEOUT),
+        max_retries=settings.ANTHROPIC_MAX_RETRIES,
+        http_client=http_client
+    )
+
+
+async def init_anthropic_client() -> AsyncAnthropic:
+    """Create the shared client (called once from the app lifespan)"""
+    global _client
+    if _client is None:
+        _client = create_anthropic_client()
+    return _client
+
+
+async def close_anthropic_client():
+    """Close the shared client and its connection pool"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_anthropic_client() -> AsyncAnthropic:
+    """Return the shared client, creating it lazily outside the app lifespan (e.g. scripts)"""
+    global _client
+    if _client is None:
+        _client = create_anthropic_client()
+    return _client
+
+
+def record_usage(call_site: str, prompt_version: str, usage) -> dict:
+    """Log one call's token usage, including prompt-cache reads and writes, and add it to the running totals"""
+    counts = {
+        "calls": 1,
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0
+    }
+
+    totals = usage_totals[(call_site, prompt_version)]
+    for key, value in counts.items():
+        totals[key] += value
+
+    print(
+        f"LLM usage [{call_site} {prompt_version}]: input={counts['input_tokens']} "
+        f"cache_read={counts['cache_read_input_tokens']} cache_write={counts['cache_creation_input_tokens']} "
+        f"output={counts['output_tokens']}"
+    )
+    return counts
@@ -0,0 +1,305 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from app.core.config import settings
+
+RECORDING_FORMAT_VERSION = 1
+
+# Words used to replace redacted text; English-like so token counts stay close to the original
+FILLER_WORDS = [
+    "the", "patient", "has", "been", "feeling", "pain", "in", "their", "lower", "back", "since", "last",
+    "week", "and", "it", "gets", "worse", "at", "night", "when", "they", "walk", "for", "a", "while",
+]
+
+# Static prompt blocks carry no patient data. Records reference them by name and sha256, and each
+# distinct text is written once to prompts/<sha256>.txt next to the recordings.
+_static_prompts = {}  # sha256 -> constant name
+_static_prompt_texts = {}  # sha256 -> text
+_current_prompt_digests = {}  # constant name -> sha256 of the text in this build
+
+
+def register_static_prompts(**prompts: str):
+    """Mark prompt constants as safe to record, under their constant names"""
+    for name, text in prompts.items():
+        digest = _digest(text)
+        _static_prompts[digest] = name
+        _static_prompt_texts[digest] = text
+        _current_prompt_digests[name] = digest
+
+
+def current_prompt_text(name: str) -> Optional[str]:
+    digest = _current_prompt_digests.get(name)
+    return _static_prompt_texts[digest] if digest else None
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def filler(text: str) -> str:
+    """Deterministic stand-in of the same length as text, so identical inputs redact identically"""
+    if not text:
+        return text
+    word_rng = random.Random(_digest(text))
+    words = []
+    length = 0
+    while length < len(text):
+        word = word_rng.choice(FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:len(text)]
+
+
+def redact_value(value):
+    """Keep JSON structure, replace every string"""
+    if isinstance(value, str):
+        return filler(value)
+    if isinstance(value, list):
+        return [redact_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: redact_value(item) for key, item in value.items()}
+    return value
+
+
+def redact_content(content) -> list:
+    """Redact a system prompt or message content; registered static prompt blocks are kept by name"""
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+
+    blocks = []
+    for block in content:
+        block = dict(block)
+        if block["type"] == "text":
+            digest = _digest(block["text"])
+            if digest in _static_prompts:
+                del block["text"]
+                block["prompt"] = _static_prompts[digest]
+                block["sha256"] = digest
+            else:
+                block["text"] = filler(block["text"])
+        elif block["type"] == "thinking":
+            block["thinking"] = filler(block["thinking"])
+        elif block["type"] == "tool_use":
+            block["input"] = redact_value(block["input"])
+        elif block["type"] == "tool_result":
+            block["content"] = redact_content(block.get("content") or "")
+        blocks.append(block)
+    return blocks
+
+
+def redact_request(params: dict) -> dict:
+    request = {key: value for key, value in params.items() if key not in ("system", "messages")}
+    if params.get("system"):
+        request["system"] = redact_content(params["system"])
+    request["messages"] = [
+        {"role": message["role"], "content": redact_content(message["content"])} for message in params["messages"]
+    ]
+    return request
+
+
+def expects_json(params: dict) -> bool:
+    if params.get("tools"):
+        return True
+    system = params.get("system") or ""
+    system_text = system if isinstance(system, str) else " ".join(block.get("text", "") for block in system)
+    first = params["messages"][0]["content"] if params.get("messages") else ""
+    first_text = first if isinstance(first, str) else " ".join(block.get("text", "") for block in first)
+    return "JSON" in system_text or "JSON" in first_text
+
+
+def json_validity(params: dict, message) -> Optional[bool]:
+    """Whether a structured-output response is usable: the forced tool call has its required fields,
+    or the text parses as JSON. None for free-text calls such as chat turns."""
+    if not expects_json(params):
+        return None
+
+    if params.get("tools"):
+        required = params["tools"][0].get("input_schema", {}).get("required", [])
+        for block in message.content:
+            if block.type == "tool_use":
+                return isinstance(block.input, dict) and all(key in block.input for key in required)
+        return False
+
+    text = "".join(block.text for block in message.content if block.type == "text").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+def summarize_response(params: dict, message) -> dict:
+    """Response shape without its text: block types and sizes, stop reason, usage and JSON validity"""
+    blocks = []
+    for block in message.content:
+        if block.type == "text":
+            blocks.append({"type": "text", "chars": len(block.text)})
+        elif block.type == "thinking":
+            blocks.append({"type": "thinking", "chars": len(block.thinking)})
+        elif block.type == "tool_use":
+            blocks.append({"type": "tool_use", "name": block.name, "chars": len(json.dumps(block.input))})
+        else:
+            blocks.append({"type": block.type})
+
+    usage = message.usage
+    return {
+        "stop_reason": message.stop_reason,
+        "content": blocks,
+        "usage": {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0
+        },
+        "valid_json": json_validity(params, message)
+    }
+
+
+class TrafficRecorder:
+    """Appends redacted LLM request/response records to a gzip JSONL file per day and process.
+
+    Records are written by a background thread so recording never blocks the event loop."""
+
+    def __init__(self, directory: str, sample_rate: float = 1.0):
+        self.directory = Path(directory) if directory else None
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._written_prompts = set()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def sampled(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def record(
+        self,
+        call_site: str,
+        priority: int,
+        params: dict,
+        started: float,
+        attempt_started: float,
+        finished: float,
+        message=None,
+        error: Exception = None,
+        first_event: float = None
+    ):
+        """Queue one call for writing. Times are time.perf_counter() values. Never raises."""
+        try:
+            entry = self._entry(call_site, priority, params, started, attempt_started, finished, message, error, first_event)
+        except Exception as e:
+            print(f"LLM traffic recording skipped for {call_site}: {str(e)}")
+            return
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _entry(self, call_site, priority, params, started, attempt_started, finished, message, error, first_event) -> dict:
+        return {
+            "v": RECORDING_FORMAT_VERSION,
+            "ts": time.time() - (time.perf_counter() - started),
+            "call_site": call_site,
+            "priority": priority,
+            "stream": first_event is not None,
+            "request": redact_request(params),
+            "queue_ms": round((attempt_started - started) * 1000, 1),
+            "latency_ms": round((finished - attempt_started) * 1000, 1),
+            "first_event_ms": round((first_event - attempt_started) * 1000, 1) if first_event is not None else None,
+            "response": summarize_response(params, message) if message is not None else None,
+            "error": type(error).__name__ if error is not None else None
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._write_loop, name="llm-recorder", daemon=True)
+            self._thread.start()
+
+    def _write_prompts(self, entry: dict):
+        """Store the text of each static prompt the first time a record references it"""
+        blocks = list(entry["request"].get("system") or [])
+        for message in entry["request"]["messages"]:
+            blocks += message["content"]
+        for block in blocks:
+            digest = block.get("sha256")
+            if digest and digest not in self._written_prompts:
+                path = self.directory / "prompts" / f"{digest}.txt"
+                if not path.exists():
+                    path.write_text(_static_prompt_texts[digest], encoding="utf-8")
+                self._written_prompts.add(digest)
+
+    def _write_loop(self):
+        (self.directory / "prompts").mkdir(parents=True, exist_ok=True)
+        current_path, handle = None, None
+        while True:
+            entry = self._queue.get()
+            path = self.directory / f"llm-{datetime.now(timezone.utc):%Y%m%d}-{os.getpid()}.jsonl.gz"
+            try:
+                self._write_prompts(entry)
+                if path != current_path and handle:
+                    handle.close()
+                    handle = None
+                if handle is None:
+                    handle = gzip.open(path, "at", encoding="utf-8")
+                    current_path = path
+                handle.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    # Each batch is a complete gzip member, so files can be read while still being appended to
+                    handle.close()
+                    handle = None
+            except Exception as e:
+                print(f"LLM traffic recording failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued record is on disk (used by scripts before exiting)"""
+        if self._thread is not None:
+            self._queue.join()
+
+
+def read_records(paths: list) -> list:
+    """Load records from recording or replay files (gzip or plain JSONL), oldest first"""
+    records = []
+    for path in paths:
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+            except (EOFError, json.JSONDecodeError):
+                # Tail of a file from a process that was killed mid-write
+                pass
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def load_recorded_prompt(directory: Path, block: dict) -> str:
+    """Text of a static prompt block as it was when recorded"""
+    digest = block["sha256"]
+    if digest not in _static_prompt_texts:
+        path = Path(directory) / "prompts" / f"{digest}.txt"
+        if not path.exists():
+            raise FileNotFoundError(f"Prompt text for {block['prompt']} ({digest[:12]}) not found in {path.parent}")
+        # Known from now on, so a replay records older prompt versions by name too
+        _static_prompts[digest] = block["prompt"]
+        _static_prompt_texts[digest] = path.read_text(encoding="utf-8")
+    return _static_prompt_texts[digest]
+
+
+llm_recorder = TrafficRecorder(settings.LLM_RECORDING_DIR, settings.LLM_RECORDING_SAMPLE_RATE)
@@ -0,0 +1,121 @@
+from collections import defaultdict
+import re
+from app.core.config import settings
+
+ROUTE_FAST = "fast"
+ROUTE_DELIBERATE = "deliberate"
+
+# Phrase from the scripted empowerment question in the chat system prompt
+EMPOWERMENT_QUESTION_PHRASE = "personal beliefs, cultural background"
+
+# Red-flag symptoms and risk statements that always get the thinking model
+SAFETY_PATTERNS = [
+    r"chest (pain|pressure|tight)", r"can'?t breathe", r"short(ness)? of breath", r"trouble breathing",
+    r"faint(ed|ing)?", r"pass(ed)? out", r"seizure", r"numb(ness)?", r"slurred", r"face (is )?droop",
+    r"worst headache", r"vomit(ing)? blood", r"cough(ing)? (up )?blood", r"bleeding (won'?t|wont) stop",
+    r"black stool", r"suicid", r"kill myself", r"end my life", r"self[- ]harm", r"hurt(ing)? myself",
+    r"overdose", r"pregnan", r"abuse", r"not safe at home", r"allergic reaction", r"swollen (throat|tongue)",
+]
+SAFETY_RE = re.compile("|".join(SAFETY_PATTERNS), re.IGNORECASE)
+
+# Replies that leave the next question unclear (hedged, contradictory or very short answers)
+AMBIGUOUS_RE = re.compile(
+    r"\b(i don'?t know|not sure|maybe|kind of|sort of|hard to (say|describe)|i guess|it depends|confus)",
+    re.IGNORECASE
+)
+
+# USD per million tokens: (input, output); cache reads bill at 10% of input, cache writes at 125%
+MODEL_PRICES_PER_MTOK = {
+    "claude-3-7-sonnet-20250219": (3.00, 15.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+}
+
+route_stats = defaultdict(lambda: defaultdict(float))
+
+
+def route_params(route: str) -> dict:
+    """Messages API parameters that differ between routes"""
+    if route == ROUTE_FAST:
+        return {
+            "model": settings.CHAT_FAST_MODEL,
+            "max_tokens": 1024,
+            "temperature": 0.7,
+            "timeout": 30.0,
+        }
+    return {
+        "model": settings.CHAT_DELIBERATE_MODEL,  # Extended Thinking requires Sonnet
+        "max_tokens": 4096,
+        "temperature": 1,  # Must be 1 when thinking is enabled
+        "timeout": 60.0,  # Increased timeout for thinking
+        "thinking": {
+            "type": "enabled",
+            "budget_tokens": settings.CHAT_THINKING_BUDGET
+        },
+    }
+
+
+def choose_chat_route(messages: list) -> tuple[str, str]:
+    """Pick the route for the next assistant turn from the conversation so far. Returns (route, reason).
+
+    Pure function of the messages, so it can be replayed offline against recorded transcripts."""
+    if settings.CHAT_ROUTING_MODE in (ROUTE_FAST, ROUTE_DELIBERATE):
+        return settings.CHAT_ROUTING_MODE, "forced"
+
+    user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
+    ai_messages = [msg["content"] for msg in messages if msg["role"] == "ai"]
+    latest = user_messages[-1] if user_messages else ""
+
+    if SAFETY_RE.search(latest):
+        return ROUTE_DELIBERATE, "safety"
+
+    empowerment_asked = any(EMPOWERMENT_QUESTION_PHRASE in content for content in ai_messages)
+    if ai_messages and EMPOWERMENT_QUESTION_PHRASE in ai_messages[-1]:
+        return ROUTE_DELIBERATE, "empowerment_answer"
+    if not empowerment_asked and len(user_messages) >= settings.CHAT_EMPOWERMENT_AFTER_TURNS:
+        return ROUTE_DELIBERATE, "empowerment_transition"
+
+    if len(user_messages) == 1:
+        return ROUTE_DELIBERATE, "chief_complaint"
+    if AMBIGUOUS_RE.search(latest) or len(latest.split()) <= 2:
+        return ROUTE_DELIBERATE, "ambiguous"
+
+    return ROUTE_FAST, "routine"
+
+
+def estimate_cost(model: str, usage) -> float:
+    input_price, output_price = MODEL_PRICES_PER_MTOK.get(model, MODEL_PRICES_PER_MTOK["claude-3-7-sonnet-20250219"])
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    return (
+        input_tokens * input_price
+        + cache_read * input_price * 0.1
+        + cache_write * input_price * 1.25
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def record_route(route: str, reason: str, model: str, latency_seconds: float, usage):
+    """Accumulate per-route call count, latency and estimated cost"""
+    stats = route_stats[route]
+    stats["calls"] += 1
+    stats["latency_ms_total"] += latency_seconds * 1000
+    stats["latency_ms_max"] = max(stats["latency_ms_max"], latency_seconds * 1000)
+    stats["cost_usd"] += estimate_cost(model, usage)
+    stats[f"reason:{reason}"] += 1
+
+
+def route_metrics() -> dict:
+    metrics = {}
+    for route, stats in route_stats.items():
+        calls = stats["calls"] or 1
+        metrics[route] = {
+            "calls": int(stats["calls"]),
+            "avg_latency_ms": round(stats["latency_ms_total"] / calls, 1),
+            "max_latency_ms": round(stats["latency_ms_max"], 1),
+            "cost_usd": round(stats["cost_usd"], 6),
+            "avg_cost_usd": round(stats["cost_usd"] / calls, 6),
+            "reasons": {key.split(":", 1)[1]: int(value) for key, value in stats.items() if key.startswith("reason:")}
+        }
+    return metrics
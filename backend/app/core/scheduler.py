@@ -0,0 +1,492 @@
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import time
+import anthropic
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.llm import get_anthropic_client
+from app.core.recording import llm_recorder
+from app.core.telemetry import llm_telemetry
+
+# Lower value is dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Upstream failures that mean "try again later" rather than "this request is wrong": rate
+    limits, overload (529, which is not an InternalServerError), other 5xx replies and connection failures"""
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+class TokenBucket:
+    """Refills continuously up to `per_minute`; callers reserve units and are told how long to wait"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (a single request larger than capacity only waits for a full bucket)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60.0 / self.capacity
+
+    def take(self, amount: float):
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+class ModelLimits:
+    """Request, input-token and output-token buckets for one model"""
+
+    def __init__(self, requests_per_minute: int, input_tokens_per_minute: int, output_tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.paused_until = 0.0
+
+    def wait_time(self, input_tokens: int, output_tokens: int) -> float:
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.input_tokens.wait_time(input_tokens),
+            self.output_tokens.wait_time(output_tokens)
+        )
+
+    def take(self, input_tokens: int, output_tokens: int):
+        self.requests.take(1)
+        self.input_tokens.take(input_tokens)
+        self.output_tokens.take(output_tokens)
+
+    def pause(self, seconds: float):
+        """Admit nothing for `seconds` (used when upstream says we are over the limit)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures; after a cool-down lets one probe through (half-open)"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.probe_in_flight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "open" and self.retry_after() == 0:
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+
+def estimate_input_tokens(params: dict) -> int:
+    """Rough input token count (about 4 characters per token) used to charge the token bucket up front"""
+    text = json.dumps(
+        {"system": params.get("system"), "messages": params.get("messages"), "tools": params.get("tools")},
+        default=str
+    )
+    return len(text) // 4 + 1
+
+
+def _call_outcome(error: BaseException, call: dict) -> str:
+    if call.get("outcome"):
+        return call["outcome"]
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(error, HTTPException):
+        return f"http_{error.status_code}"
+    return type(error).__name__
+
+
+class _TimedStream:
+    """Passes a message stream through, noting when the first content delta arrives"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.first_token_at = None
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        async for event in self._stream:
+            if self.first_token_at is None and event.type == "content_block_delta":
+                self.first_token_at = time.perf_counter()
+            yield event
+
+
+def _retry_after_header(error: Exception):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """Single entry point for Anthropic calls.
+
+    Admits requests in priority order under a concurrency cap and per-model request/token
+    budgets, retries retryable failures with jittered exponential backoff (honouring
+    `retry-after`), and fails fast with a 503 while the circuit breaker is open."""
+
+    def __init__(self):
+        self.max_concurrency = settings.LLM_MAX_CONCURRENCY
+        self.max_attempts = settings.LLM_MAX_ATTEMPTS
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURE_THRESHOLD, settings.LLM_BREAKER_RESET_SECONDS)
+        self.limits = {}
+        self.stats = defaultdict(int)
+        self.wait_times = defaultdict(lambda: deque(maxlen=500))
+        self._loop = None
+
+    def _reset_loop_state(self):
+        # Asyncio primitives belong to one event loop; scripts may run several loops in turn
+        self._loop = asyncio.get_running_loop()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._changed = asyncio.Event()
+        self._dispatcher = None
+
+    def _ensure_loop(self):
+        if self._loop is not asyncio.get_running_loop():
+            self._reset_loop_state()
+
+    def limits_for(self, model: str) -> ModelLimits:
+        if model not in self.limits:
+            overrides = settings.LLM_MODEL_RATE_LIMITS.get(model, {})
+            self.limits[model] = ModelLimits(
+                overrides.get("requests_per_minute", settings.LLM_REQUESTS_PER_MINUTE),
+                overrides.get("input_tokens_per_minute", settings.LLM_INPUT_TOKENS_PER_MINUTE),
+                overrides.get("output_tokens_per_minute", settings.LLM_OUTPUT_TOKENS_PER_MINUTE)
+            )
+        return self.limits[model]
+
+    def _fail_fast(self):
+        retry_after = max(1, round(self.breaker.retry_after()))
+        self.stats["rejected_circuit_open"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="AI service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    async def _dispatch(self):
+        """Release waiters head-first while concurrency and the head request's model budget allow"""
+        while self._waiting:
+            _, _, future, model, input_tokens, output_tokens = self._waiting[0]
+            if future.done():
+                heapq.heappop(self._waiting)
+                continue
+
+            delay = None
+            if self._in_flight < self.max_concurrency:
+                limits = self.limits_for(model)
+                wait = limits.wait_time(input_tokens, output_tokens)
+                if wait == 0:
+                    heapq.heappop(self._waiting)
+                    limits.take(input_tokens, output_tokens)
+                    self._in_flight += 1
+                    future.set_result(None)
+                    continue
+                delay = wait
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        self._dispatcher = None
+
+    def _notify(self):
+        self._changed.set()
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _acquire(self, priority: int, model: str, input_tokens: int, output_tokens: int):
+        self._ensure_loop()
+        future = self._loop.create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future, model, input_tokens, output_tokens))
+        queued_at = time.perf_counter()
+        self._notify()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        waited = time.perf_counter() - queued_at
+        self.wait_times[priority].append(waited)
+        return waited
+
+    def _release(self):
+        self._in_flight -= 1
+        self._notify()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+        retry_after = _retry_after_header(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _run(self, call_site: str, priority: int, params: dict, attempt_call, call: dict, record: bool = False):
+        """Admission, retry and breaker bookkeeping shared by `create` and `stream`.
+
+        Queue time, retries and the failure outcome are noted in `call` for telemetry."""
+        started = call["started"]
+        model = params["model"]
+        input_tokens = estimate_input_tokens(params)
+        output_tokens = params.get("max_tokens", 1024)
+
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                call["outcome"] = "circuit_open"
+                self._fail_fast()
+
+            call["queue"] += await self._acquire(priority, model, input_tokens, output_tokens)
+            self.stats["requests"] += 1
+            attempt_started = time.perf_counter()
+            try:
+                result = await attempt_call()
+            except BaseException as e:
+                self._release()
+                if not is_retryable(e):
+                    self.breaker.probe_in_flight = False
+                    raise
+                if record:
+                    llm_recorder.record(call_site, priority, params, started, attempt_started, time.perf_counter(), error=e)
+                self.limits_for(model).output_tokens.refund(output_tokens)
+                self.stats["retryable_errors"] += 1
+                if isinstance(e, anthropic.RateLimitError):
+                    # Our own budget estimate was too generous: pause everyone sending to this model
+                    self.stats["rate_limited"] += 1
+                    self.limits_for(model).pause(_retry_after_header(e) or settings.LLM_BACKOFF_BASE_SECONDS)
+                else:
+                    if isinstance(e, anthropic.APIStatusError) and e.status_code == 529:
+                        self.stats["overloaded"] += 1
+                    self.breaker.record_failure()
+
+                if attempt + 1 >= self.max_attempts or self.breaker.state == "open":
+                    print(f"LLM call {call_site} failed after {attempt + 1} attempts: {str(e)}")
+                    call["outcome"] = "retries_exhausted"
+                    if self.breaker.state == "open":
+                        self._fail_fast()
+                    raise HTTPException(
+                        status_code=503,
+                        detail="AI service is busy. Please try again shortly.",
+                        headers={"Retry-After": str(max(1, round(self._backoff(attempt, e))))}
+                    )
+
+                delay = self._backoff(attempt, e)
+                self.stats["retries"] += 1
+                call["retries"] += 1
+                print(f"LLM call {call_site} attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def create(self, call_site: str, priority: int = PRIORITY_BACKGROUND, prompt_version: str = None, **params):
+        """Scheduled equivalent of `client.messages.create(**params)`"""
+        client = get_anthropic_client().with_options(max_retries=0)
+        record = llm_recorder.sampled()
+        call = {"started": time.perf_counter(), "queue": 0.0, "retries": 0, "streamed": False}
+        started = call["started"]
+
+        async def attempt_call():
+            attempt_started = time.perf_counter()
+            message = await client.messages.create(**params)
+            self._settle(params, message)
+            self._release()
+            if record:
+                llm_recorder.record(call_site, priority, params, started, attempt_started, time.perf_counter(), message)
+            return message
+
+        try:
+            message = await self._run(call_site, priority, params, attempt_call, call, record)
+        except BaseException as e:
+            self._record_call(call_site, prompt_version, priority, params, call, outcome=_call_outcome(e, call))
+            raise
+        self._record_call(call_site, prompt_version, priority, params, call, message)
+        return message
+
+    @asynccontextmanager
+    async def stream(self, call_site: str, priority: int = PRIORITY_INTERACTIVE, prompt_version: str = None, **params):
+        """Scheduled equivalent of `async with client.messages.stream(**params) as stream`.
+
+        Only opening the stream is retried; once events have been yielded a failure propagates."""
+        client = get_anthropic_client().with_options(max_retries=0)
+        record = llm_recorder.sampled()
+        call = {"started": time.perf_counter(), "queue": 0.0, "retries": 0, "streamed": True}
+        started = call["started"]
+        manager = None
+        attempt_started = opened = None
+
+        async def attempt_call():
+            nonlocal manager, attempt_started, opened
+            attempt_started = time.perf_counter()
+            manager = client.messages.stream(**params)
+            opened_stream = await manager.__aenter__()
+            opened = time.perf_counter()
+            return opened_stream
+
+        try:
+            stream = _TimedStream(await self._run(call_site, priority, params, attempt_call, call, record))
+        except BaseException as e:
+            self._record_call(call_site, prompt_version, priority, params, call, outcome=_call_outcome(e, call))
+            raise
+
+        try:
+            yield stream
+        except BaseException as e:
+            self._record_call(
+                call_site, prompt_version, priority, params, call,
+                outcome=_call_outcome(e, call), first_token_at=stream.first_token_at
+            )
+            if record and isinstance(e, anthropic.APIError):
+                llm_recorder.record(
+                    call_site, priority, params, started, attempt_started, time.perf_counter(), error=e,
+                    first_event=stream.first_token_at or opened
+                )
+            await manager.__aexit__(type(e), e, e.__traceback__)
+            raise
+        else:
+            message = await stream.get_final_message()
+            self._settle(params, message)
+            self._record_call(call_site, prompt_version, priority, params, call, message, first_token_at=stream.first_token_at)
+            if record:
+                llm_recorder.record(
+                    call_site, priority, params, started, attempt_started, time.perf_counter(), message,
+                    first_event=stream.first_token_at or opened
+                )
+            await manager.__aexit__(None, None, None)
+        finally:
+            self._release()
+
+    def _record_call(
+        self,
+        call_site: str,
+        prompt_version: str,
+        priority: int,
+        params: dict,
+        call: dict,
+        message=None,
+        outcome: str = "ok",
+        first_token_at: float = None
+    ):
+        """Queue one llm_calls telemetry row"""
+        usage = getattr(message, "usage", None)
+        thinking = sum(len(block.thinking) for block in getattr(message, "content", None) or [] if block.type == "thinking")
+        llm_telemetry.record(
+            call_site=call_site,
+            prompt_version=prompt_version,
+            model=params["model"],
+            priority=priority,
+            streamed=call["streamed"],
+            outcome=outcome,
+            retries=call["retries"],
+            input_tokens=getattr(usage, "input_tokens", None),
+            output_tokens=getattr(usage, "output_tokens", None),
+            thinking_tokens=thinking // 4 if message is not None else None,
+            cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", None),
+            cache_creation_input_tokens=getattr(usage, "cache_creation_input_tokens", None),
+            queue_ms=round(call["queue"] * 1000, 1),
+            ttft_ms=round((first_token_at - call["started"]) * 1000, 1) if first_token_at is not None else None,
+            latency_ms=round((time.perf_counter() - call["started"]) * 1000, 1)
+        )
+
+    def _settle(self, params: dict, message):
+        """Return unused output budget once the real usage is known"""
+        usage = getattr(message, "usage", None)
+        output_tokens = getattr(usage, "output_tokens", None)
+        if output_tokens is not None:
+            reserved = params.get("max_tokens", 1024)
+            self.limits_for(params["model"]).output_tokens.refund(max(0, reserved - output_tokens))
+
+    def metrics(self) -> dict:
+        waiting = defaultdict(int)
+        if self._loop is not None:
+            for priority, _, future, *_ in self._waiting:
+                if not future.done():
+                    waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+
+        wait_ms = {}
+        for priority, samples in self.wait_times.items():
+            ordered = sorted(samples)
+            if ordered:
+                wait_ms[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    "samples": len(ordered),
+                    "p50": round(ordered[len(ordered) // 2] * 1000, 1),
+                    "p95": round(ordered[int(len(ordered) * 0.95)] * 1000, 1),
+                    "max": round(ordered[-1] * 1000, 1)
+                }
+
+        return {
+            "queue_depth": dict(waiting),
+            "in_flight": self._in_flight if self._loop is not None else 0,
+            "max_concurrency": self.max_concurrency,
+            "wait_ms": wait_ms,
+            "circuit_breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "times_opened": self.breaker.times_opened
+            },
+            **self.stats
+        }
+
+
+llm_scheduler = LLMScheduler()
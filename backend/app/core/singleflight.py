@@ -0,0 +1,150 @@
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+import asyncio
+import time
+from sqlalchemy import text
+from app.core.config import settings
+from app.db.database import async_engine
+
+# How often a request waiting on another worker's generation retries the advisory lock
+LOCK_POLL_SECONDS = 0.5
+
+
+def advisory_lock_id(key: str) -> int:
+    """Postgres advisory lock id (signed bigint) for a hex digest key"""
+    return int.from_bytes(bytes.fromhex(key[:16]), "big", signed=True)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical work so it runs once.
+
+    Within a worker, followers await the leader's future. Across workers, the leader holds a
+    Postgres advisory lock on the key while it works; another worker's leader waits for the lock
+    (polling with a short-lived connection) and then reads the stored result instead of redoing
+    the work. If a leader fails, its followers start over and one of them leads.
+
+    Held locks and polls together use at most SYNTHESIS_COALESCE_MAX_CONNECTIONS pooled
+    connections; past that, work runs without cross-worker coalescing rather than drain the pool."""
+
+    def __init__(self, max_connections: int):
+        self._in_flight = {}  # key -> future resolving to the leader's result, or None if it failed
+        self._connection_slots = asyncio.Semaphore(max_connections)
+        self.connections_in_use = 0
+        self.stats = defaultdict(int)
+
+    async def run(self, key: str, produce: Callable[[], Awaitable], lookup: Callable[[], Awaitable[Optional[object]]]):
+        """Return produce()'s result for this key, running it only if no identical call is in flight.
+
+        `lookup` reads a finished result from shared storage; it is called after waiting on
+        another worker, and returns None if that worker did not store one."""
+        while True:
+            future = self._in_flight.get(key)
+            if future is None:
+                break
+            result = await asyncio.shield(future)
+            if result is not None:
+                self.stats["coalesced_local"] += 1
+                return result
+            self.stats["retried_after_leader_failure"] += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        result = None
+        try:
+            async with self._worker_lock(key) as waited:
+                if waited:
+                    result = await lookup()
+                    if result is not None:
+                        self.stats["coalesced_remote"] += 1
+                        return result
+                self.stats["leaders"] += 1
+                result = await produce()
+                return result
+        finally:
+            del self._in_flight[key]
+            future.set_result(result)
+
+    @asynccontextmanager
+    async def _worker_lock(self, key: str):
+        """Hold the key's advisory lock; yields whether another worker held it first.
+
+        Waits at most SYNTHESIS_COALESCE_WAIT_SECONDS, then proceeds unlocked rather than fail.
+        Without Postgres (e.g. SQLite in development) there is one process, so no lock is needed."""
+        if async_engine.dialect.name != "postgresql":
+            yield False
+            return
+
+        lock_id = advisory_lock_id(key)
+        deadline = time.monotonic() + settings.SYNTHESIS_COALESCE_WAIT_SECONDS
+        waited = False
+        while True:
+            if not self._connection_slots.locked():
+                await self._connection_slots.acquire()
+                self.connections_in_use += 1
+                try:
+                    connection = await self._try_lock(lock_id)
+                except BaseException:
+                    self._release_slot()
+                    raise
+                if connection:
+                    break
+                self._release_slot()
+            elif not waited:
+                self.stats["lock_skipped"] += 1
+                yield False
+                return
+            if time.monotonic() >= deadline:
+                self.stats["lock_timeouts"] += 1
+                yield waited
+                return
+            if not waited:
+                waited = True
+                self.stats["lock_waits"] += 1
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+
+        try:
+            yield waited
+        finally:
+            unlocked = False
+            try:
+                unlocked = await connection.scalar(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+            finally:
+                if not unlocked:
+                    # The lock belongs to the database session, which outlives close() on a pooled
+                    # connection; discard the connection so the session ends and takes the lock with it
+                    self.stats["lock_connections_invalidated"] += 1
+                    await connection.invalidate()
+                await connection.close()
+                self._release_slot()
+
+    async def _try_lock(self, lock_id: int):
+        """A connection holding the advisory lock, or None if another session holds it"""
+        # A dedicated autocommit connection: the lock belongs to it, and no transaction stays open
+        connection = await async_engine.connect()
+        try:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            if await connection.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}):
+                return connection
+        except BaseException:
+            await connection.invalidate()
+            await connection.close()
+            raise
+        await connection.close()
+        return None
+
+    def _release_slot(self):
+        self.connections_in_use -= 1
+        self._connection_slots.release()
+
+    def metrics(self) -> dict:
+        coalesced = self.stats["coalesced_local"] + self.stats["coalesced_remote"]
+        return {
+            "in_flight": len(self._in_flight),
+            "lock_connections": self.connections_in_use,
+            "coalesced": coalesced,
+            **self.stats
+        }
+
+
+synthesis_flights = SingleFlight(settings.SYNTHESIS_COALESCE_MAX_CONNECTIONS)
@@ -0,0 +1,225 @@
+from collections import defaultdict
+from functools import lru_cache
+from typing import Type
+import copy
+import json
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+from app.core.llm import record_usage
+from app.core.recording import register_static_prompts
+from app.core.scheduler import llm_scheduler
+from app.schemas.patient import ClinicalBriefingContent
+
+BRIEFING_TOOL_NAME = "record_clinical_briefing"
+
+TOOL_MODE_INSTRUCTIONS = f"""Return the briefing by calling the `{BRIEFING_TOOL_NAME}` tool instead of writing JSON text.
+The tool's input schema is authoritative for field names."""
+
+register_static_prompts(TOOL_MODE_INSTRUCTIONS=TOOL_MODE_INSTRUCTIONS)
+
+# Outcome counters per (call site, output mode), to compare parse-failure rates across modes
+parse_stats = defaultdict(lambda: defaultdict(int))
+
+
+def _inline_refs(schema: dict) -> dict:
+    """Resolve $ref pointers into $defs so the tool schema is self-contained"""
+    definitions = schema.get("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(copy.deepcopy(definitions[node["$ref"].split("/")[-1]]))
+            return {key: resolve(value) for key, value in node.items() if key not in ("$defs", "title")}
+        if isinstance(node, list):
+            return [resolve(item) for item in node]
+        return node
+
+    return resolve(schema)
+
+
+@lru_cache(maxsize=None)
+def input_schema_for(schema: Type[BaseModel]) -> dict:
+    return _inline_refs(schema.model_json_schema())
+
+
+def briefing_tool(schema: Type[BaseModel] = ClinicalBriefingContent, sections: list = None) -> dict:
+    """Tool definition for a briefing schema, or for just the given top-level sections of it"""
+    input_schema = input_schema_for(schema)
+    if sections:
+        input_schema = {
+            "type": "object",
+            "properties": {name: input_schema["properties"][name] for name in sections},
+            "required": sections
+        }
+    return {
+        "name": BRIEFING_TOOL_NAME,
+        "description": "Record the structured clinical briefing for the clinician.",
+        "input_schema": input_schema
+    }
+
+
+def _invalid_sections(error: ValidationError) -> dict:
+    """Map each top-level section that failed validation to its error messages"""
+    sections = defaultdict(list)
+    for item in error.errors():
+        location = ".".join(str(part) for part in item["loc"])
+        sections[str(item["loc"][0])].append(f"{location}: {item['msg']}")
+    return sections
+
+
+def _tool_input(message) -> dict:
+    for block in message.content:
+        if block.type == "tool_use" and block.name == BRIEFING_TOOL_NAME:
+            return block.input
+    raise ValueError("Model did not call the briefing tool")
+
+
+def strip_code_fences(response_text: str) -> str:
+    """Remove markdown code fences the model sometimes wraps around JSON"""
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    return response_text.strip()
+
+
+def tool_request_params(request_params: dict, schema: Type[BaseModel] = ClinicalBriefingContent) -> dict:
+    """request_params with the briefing tool forced and the tool-mode instructions appended to the system prompt"""
+    system = request_params.get("system") or []
+    if isinstance(system, str):
+        system = [{"type": "text", "text": system}]
+    return {
+        **request_params,
+        "system": system + [{"type": "text", "text": TOOL_MODE_INSTRUCTIONS}],
+        "tools": [briefing_tool(schema)],
+        "tool_choice": {"type": "tool", "name": BRIEFING_TOOL_NAME}
+    }
+
+
+def parse_briefing_message(message, output_mode: str, schema: Type[BaseModel] = ClinicalBriefingContent) -> dict:
+    """Validated sections from a finished message (e.g. a batch result), with no repair call.
+    Raises ValueError if the output is missing, not JSON or fails validation."""
+    if output_mode == "tool":
+        data = _tool_input(message)
+    else:
+        text = next((block.text for block in message.content if block.type == "text"), None)
+        if text is None:
+            raise ValueError("Model returned no text")
+        data = json.loads(strip_code_fences(text))
+    return schema.model_validate(data).model_dump(exclude_none=True)
+
+
+def _count_truncation(stats: dict, message):
+    """Note replies cut off at max_tokens, the usual cause of unparseable JSON"""
+    if getattr(message, "stop_reason", None) == "max_tokens":
+        stats["truncated"] += 1
+
+
+async def _generate_json_text(
+    call_site: str, prompt_version: str, priority: int, request_params: dict, schema: Type[BaseModel]
+) -> dict:
+    """Legacy mode: ask for free-text JSON and parse it"""
+    stats = parse_stats[(call_site, "json")]
+    stats["calls"] += 1
+
+    message = await llm_scheduler.create(call_site, priority, prompt_version, **request_params)
+    record_usage(call_site, prompt_version, message.usage)
+    _count_truncation(stats, message)
+
+    try:
+        return parse_briefing_message(message, "json", schema)
+    except ValueError as e:
+        stats["parse_failures"] += 1
+        stats["unrecoverable"] += 1
+        # Log the problematic response for debugging
+        response_text = "".join(getattr(block, "text", "") for block in message.content or [])
+        print(f"Failed to parse JSON response ({str(e)[:200]}): {response_text[:500]}")
+        raise HTTPException(
+            status_code=500,
+            detail="AI returned invalid JSON format. Please try again."
+        )
+
+
+async def _generate_with_tool(
+    call_site: str, prompt_version: str, priority: int, request_params: dict, schema: Type[BaseModel]
+) -> dict:
+    """Schema-driven mode: force a tool call, validate its input and repair only the invalid sections"""
+    stats = parse_stats[(call_site, "tool")]
+    stats["calls"] += 1
+    params = tool_request_params(request_params, schema)
+
+    message = await llm_scheduler.create(call_site, priority, prompt_version, **params)
+    record_usage(call_site, prompt_version, message.usage)
+    _count_truncation(stats, message)
+    try:
+        briefing_data = _tool_input(message)
+    except ValueError:
+        stats["parse_failures"] += 1
+        stats["unrecoverable"] += 1
+        raise HTTPException(
+            status_code=500,
+            detail="AI returned an invalid briefing. Please try again."
+        )
+
+    try:
+        return schema.model_validate(briefing_data).model_dump(exclude_none=True)
+    except ValidationError as e:
+        invalid = _invalid_sections(e)
+        stats["parse_failures"] += 1
+
+    print(f"Repairing invalid briefing sections: {', '.join(invalid)}")
+    errors = "\n".join(f"- {message}" for messages in invalid.values() for message in messages)
+    repair_params = {
+        **params,
+        "tools": [briefing_tool(schema, list(invalid))],
+        "messages": params["messages"] + [
+            {"role": "assistant", "content": [block.model_dump(exclude_none=True) for block in message.content]},
+            {"role": "user", "content": [
+                {
+                    "type": "tool_result",
+                    "tool_use_id": next(block.id for block in message.content if block.type == "tool_use"),
+                    "is_error": True,
+                    "content": f"These sections failed validation:\n{errors}\n"
+                               f"Call the tool again with corrected values for only: {', '.join(invalid)}."
+                }
+            ]}
+        ]
+    }
+
+    repair = await llm_scheduler.create(f"{call_site}_repair", priority, prompt_version, **repair_params)
+    record_usage(f"{call_site}_repair", prompt_version, repair.usage)
+
+    try:
+        merged = {**briefing_data, **{name: _tool_input(repair).get(name) for name in invalid}}
+        result = schema.model_validate(merged).model_dump(exclude_none=True)
+    except (ValidationError, ValueError):
+        stats["unrecoverable"] += 1
+        raise HTTPException(
+            status_code=500,
+            detail="AI returned an invalid briefing. Please try again."
+        )
+
+    stats["repaired"] += 1
+    return result
+
+
+async def generate_briefing_content(
+    call_site: str,
+    prompt_version: str,
+    priority: int,
+    request_params: dict,
+    schema: Type[BaseModel] = ClinicalBriefingContent,
+    output_mode: str = None
+) -> dict:
+    """Run a synthesis request through the LLM scheduler and return validated briefing sections as a dict.
+
+    `schema` is the full briefing by default; pass a narrower model to generate only some sections.
+    `output_mode` overrides SYNTHESIS_OUTPUT_MODE, for prompts that only describe their output
+    through the tool schema."""
+    if (output_mode or settings.SYNTHESIS_OUTPUT_MODE) == "tool":
+        return await _generate_with_tool(call_site, prompt_version, priority, request_params, schema)
+    return await _generate_json_text(call_site, prompt_version, priority, request_params, schema)
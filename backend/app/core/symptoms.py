@@ -0,0 +1,95 @@
+import json
+from sqlalchemy import update
+from app.core.config import settings
+from app.core.conversations import load_messages
+from app.core.history import format_transcript
+from app.core.recording import register_static_prompts
+from app.core.scheduler import PRIORITY_BACKGROUND
+from app.core.structured import generate_briefing_content
+from app.db.database import AsyncSessionLocal
+from app.models.patient import ChatConversation
+from app.schemas.patient import SymptomDraft
+
+SYMPTOM_DRAFT_PROMPT_VERSION = "symptom-draft-v1"
+
+SYMPTOM_DRAFT_INSTRUCTIONS = """You keep a structured draft of the symptoms a patient reports during an intake conversation.
+Update the existing draft with the new exchanges. For each symptom record what the patient said about
+onset, provocation (what makes it better or worse), quality, location, severity, timing and associated
+symptoms, using their own words where possible. Leave fields empty when the patient has not said. Keep
+symptoms from the existing draft unless the patient corrects them. Record only what the patient reports;
+do not infer diagnoses."""
+
+register_static_prompts(SYMPTOM_DRAFT_INSTRUCTIONS=SYMPTOM_DRAFT_INSTRUCTIONS)
+
+
+def draft_to_reported_symptoms(draft: dict) -> list:
+    """Convert the OPQRST draft to the briefing's reported_symptoms_structured format"""
+    symptoms = []
+    for item in draft.get("symptoms", []):
+        timing = "; ".join(filter(None, [
+            f"onset {item['onset']}" if item.get("onset") else None,
+            item.get("timing")
+        ]))
+        symptoms.append({
+            "symptom": item["symptom"],
+            "quality": item.get("quality"),
+            "location": item.get("location"),
+            "timing": timing or None
+        })
+    return symptoms
+
+
+def format_symptom_draft(draft: dict) -> str:
+    return json.dumps(draft, indent=2)
+
+
+async def update_symptom_draft(conversation_id: str):
+    """Fold the turns since the last update into the conversation's symptom draft with the cheap model.
+
+    Runs after the turn's response has been sent; if it fails, the next turn's update or the
+    final synthesis picks up the uncovered messages."""
+    try:
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(ChatConversation, conversation_id)
+            if not conversation or conversation.is_complete:
+                # A finished intake takes no more turns; its synthesis covers anything the draft missed
+                return
+
+            messages = await load_messages(db, conversation)
+            covered = conversation.symptom_draft_message_count or 0
+            new_messages = messages[covered:]
+            if not any(msg["role"] == "user" for msg in new_messages):
+                return
+
+            draft = await generate_briefing_content(
+                "symptom_draft",
+                SYMPTOM_DRAFT_PROMPT_VERSION,
+                PRIORITY_BACKGROUND,
+                {
+                    "model": settings.SYMPTOM_DRAFT_MODEL,
+                    "max_tokens": 1000,
+                    "temperature": 0,
+                    "system": SYMPTOM_DRAFT_INSTRUCTIONS,
+                    "messages": [{
+                        "role": "user",
+                        "content": f"EXISTING DRAFT:\n{format_symptom_draft(conversation.symptom_draft or {'symptoms': []})}\n\n"
+                                   f"NEW EXCHANGES:\n{format_transcript(new_messages)}"
+                    }]
+                },
+                SymptomDraft,
+                # The prompt leaves the output format to the tool schema, so this never runs in json mode
+                output_mode="tool"
+            )
+
+            # Only apply if no concurrent update moved the draft forward meanwhile
+            await db.execute(
+                update(ChatConversation)
+                .where(
+                    ChatConversation.conversation_id == conversation_id,
+                    ChatConversation.symptom_draft_message_count == covered
+                )
+                .values(symptom_draft=draft, symptom_draft_message_count=len(messages))
+            )
+            await db.commit()
+    except Exception as e:
+        print(f"Symptom draft update failed for {conversation_id}: {str(e)}")
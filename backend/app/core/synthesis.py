@@ -0,0 +1,95 @@
+from collections import defaultdict
+from typing import Type
+import asyncio
+import time
+from fastapi import HTTPException
+from pydantic import BaseModel
+from app.core.structured import generate_briefing_content
+
+# Per-section outcome counters and latency, keyed by "<call site>:<section>"
+section_stats = defaultdict(lambda: defaultdict(float))
+
+
+class SynthesisSection:
+    """One independently generated slice of a briefing"""
+
+    def __init__(
+        self,
+        name: str,
+        schema: Type[BaseModel],
+        request_params: dict,
+        timeout: float,
+        required: bool = True
+    ):
+        self.name = name
+        self.schema = schema
+        self.request_params = request_params
+        self.timeout = timeout
+        self.required = required
+
+
+async def _run_section(call_site: str, prompt_version: str, priority: int, section: SynthesisSection):
+    stats = section_stats[f"{call_site}:{section.name}"]
+    stats["calls"] += 1
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(
+            generate_briefing_content(
+                f"{call_site}:{section.name}", prompt_version, priority, section.request_params, section.schema
+            ),
+            timeout=section.timeout
+        )
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        return section, None, f"timed out after {section.timeout:g}s"
+    except HTTPException as e:
+        stats["failures"] += 1
+        return section, None, e.detail
+    except Exception as e:
+        stats["failures"] += 1
+        return section, None, str(e)
+
+    elapsed = time.perf_counter() - started
+    stats["latency_ms_total"] += elapsed * 1000
+    stats["latency_ms_max"] = max(stats["latency_ms_max"], elapsed * 1000)
+    print(f"Synthesis section {call_site}:{section.name} finished in {elapsed:.1f}s")
+    return section, result, None
+
+
+async def run_sections(call_site: str, prompt_version: str, priority: int, sections: list) -> tuple[dict, list]:
+    """Generate all sections concurrently and merge them. Returns (briefing_data, failed_section_names).
+
+    A failed or timed-out optional section is reported in the failed list; a failed required
+    section fails the whole synthesis."""
+    results = await asyncio.gather(*(_run_section(call_site, prompt_version, priority, s) for s in sections))
+
+    briefing_data = {}
+    failed = []
+    for section, result, error in results:
+        if result is not None:
+            briefing_data.update(result)
+            continue
+
+        print(f"Synthesis section {call_site}:{section.name} failed: {error}")
+        if section.required:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Synthesis section '{section.name}' failed: {error}"
+            )
+        failed.append(section.name)
+
+    return briefing_data, failed
+
+
+def section_metrics() -> dict:
+    metrics = {}
+    for key, stats in section_stats.items():
+        succeeded = stats["calls"] - stats["timeouts"] - stats["failures"]
+        metrics[key] = {
+            "calls": int(stats["calls"]),
+            "timeouts": int(stats["timeouts"]),
+            "failures": int(stats["failures"]),
+            "avg_latency_ms": round(stats["latency_ms_total"] / succeeded, 1) if succeeded else None,
+            "max_latency_ms": round(stats["latency_ms_max"], 1)
+        }
+    return metrics
@@ -0,0 +1,159 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+import asyncio
+from sqlalchemy import select, insert, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.patient import LLMCall
+
+# Upper bounds (ms) of the latency histogram buckets; anything slower lands in +Inf
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 5000, 10000, 20000, 60000, 120000]
+
+
+class TelemetryWriter:
+    """Buffers LLM call rows and inserts them in batches.
+
+    A flush runs when LLM_TELEMETRY_BATCH_SIZE rows are waiting or LLM_TELEMETRY_FLUSH_SECONDS
+    after the first buffered row, whichever comes first. Rows that fail to insert are dropped
+    (and counted) rather than retried, so telemetry never holds up or breaks LLM calls."""
+
+    def __init__(self, batch_size: int, flush_seconds: float, max_buffered: int = 10000):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.buffer = []
+        self.stats = defaultdict(int)
+        self._loop = None
+        self._flusher = None
+        self._full = None
+
+    def record(self, **row):
+        if not settings.LLM_TELEMETRY_ENABLED:
+            return
+        if len(self.buffer) >= self.max_buffered:
+            self.stats["dropped"] += 1
+            return
+
+        row["created_at"] = datetime.now(timezone.utc)
+        self.buffer.append(row)
+        self._ensure_flusher()
+        if len(self.buffer) >= self.batch_size:
+            self._full.set()
+
+    def _ensure_flusher(self):
+        # Like the scheduler, follow the running loop: scripts may run several loops in turn
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._flusher = None
+            self._full = asyncio.Event()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while self.buffer:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Insert everything buffered (also called on shutdown)"""
+        while self.buffer:
+            rows, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(LLMCall), rows)
+                    await db.commit()
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+            except Exception as e:
+                self.stats["dropped"] += len(rows)
+                self.stats["failed_batches"] += 1
+                print(f"LLM telemetry write failed, dropped {len(rows)} rows: {str(e)}")
+
+    def metrics(self) -> dict:
+        return {"buffered": len(self.buffer), **self.stats}
+
+
+def _approximate_percentile(cumulative: list, total: int, pct: float, max_ms: float) -> float:
+    """Upper bound of the first histogram bucket holding the pct-th percentile (capped at the maximum)"""
+    if not total:
+        return None
+    for bound, count in zip(LATENCY_BUCKETS_MS, cumulative):
+        if count >= total * pct / 100:
+            return round(min(float(bound), max_ms), 1)
+    return round(max_ms, 1)
+
+
+async def call_metrics(db: AsyncSession, since: datetime, call_site: str = None) -> list:
+    """Per call site, prompt version and model: outcomes, retries, tokens and cumulative latency
+    and time-to-first-token histograms, aggregated in the database"""
+    latency_buckets = [func.sum(case((LLMCall.latency_ms <= bound, 1), else_=0)) for bound in LATENCY_BUCKETS_MS]
+    ttft_buckets = [func.sum(case((LLMCall.ttft_ms <= bound, 1), else_=0)) for bound in LATENCY_BUCKETS_MS]
+    query = select(
+        LLMCall.call_site,
+        LLMCall.prompt_version,
+        LLMCall.model,
+        func.count(),
+        func.sum(case((LLMCall.outcome != "ok", 1), else_=0)),
+        func.sum(LLMCall.retries),
+        func.coalesce(func.sum(LLMCall.input_tokens), 0),
+        func.coalesce(func.sum(LLMCall.output_tokens), 0),
+        func.coalesce(func.sum(LLMCall.thinking_tokens), 0),
+        func.coalesce(func.sum(LLMCall.cache_read_input_tokens), 0),
+        func.coalesce(func.sum(LLMCall.cache_creation_input_tokens), 0),
+        func.avg(LLMCall.queue_ms),
+        func.avg(LLMCall.latency_ms),
+        func.max(LLMCall.latency_ms),
+        func.count(LLMCall.ttft_ms),
+        func.max(LLMCall.ttft_ms),
+        *latency_buckets,
+        *ttft_buckets
+    ).where(LLMCall.created_at >= since).group_by(LLMCall.call_site, LLMCall.prompt_version, LLMCall.model)
+    if call_site:
+        query = query.where(LLMCall.call_site == call_site)
+
+    results = []
+    buckets = len(LATENCY_BUCKETS_MS)
+    for row in (await db.execute(query.order_by(LLMCall.call_site, LLMCall.prompt_version))).all():
+        (site, prompt_version, model, calls, errors, retries, input_tokens, output_tokens, thinking_tokens,
+         cache_read, cache_write, queue_avg, latency_avg, latency_max, ttft_calls, ttft_max) = row[:16]
+        latency_cumulative = [int(count or 0) for count in row[16:16 + buckets]]
+        ttft_cumulative = [int(count or 0) for count in row[16 + buckets:]]
+        results.append({
+            "call_site": site,
+            "prompt_version": prompt_version,
+            "model": model,
+            "calls": calls,
+            "errors": int(errors or 0),
+            "retries": int(retries or 0),
+            "input_tokens": int(input_tokens),
+            "output_tokens": int(output_tokens),
+            "thinking_tokens": int(thinking_tokens),
+            "cache_read_input_tokens": int(cache_read),
+            "cache_creation_input_tokens": int(cache_write),
+            "queue_ms_avg": round(queue_avg or 0, 1),
+            "latency_ms": {
+                "avg": round(latency_avg or 0, 1),
+                "p50": _approximate_percentile(latency_cumulative, calls, 50, latency_max),
+                "p95": _approximate_percentile(latency_cumulative, calls, 95, latency_max),
+                "p99": _approximate_percentile(latency_cumulative, calls, 99, latency_max),
+                "max": round(latency_max or 0, 1),
+                "histogram": [{"le": bound, "count": count} for bound, count in zip(LATENCY_BUCKETS_MS, latency_cumulative)]
+                + [{"le": "+Inf", "count": calls}]
+            },
+            "ttft_ms": {
+                "p50": _approximate_percentile(ttft_cumulative, ttft_calls, 50, ttft_max),
+                "p95": _approximate_percentile(ttft_cumulative, ttft_calls, 95, ttft_max),
+                "histogram": [{"le": bound, "count": count} for bound, count in zip(LATENCY_BUCKETS_MS, ttft_cumulative)]
+                + [{"le": "+Inf", "count": ttft_calls}]
+            } if ttft_calls else None
+        })
+    return results
+
+
+llm_telemetry = TelemetryWriter(settings.LLM_TELEMETRY_BATCH_SIZE, settings.LLM_TELEMETRY_FLUSH_SECONDS)
@@ -1,16 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import patients, synthesize, chat, appointments
-from app.db.database import engine, Base
+from app.api import patients, synthesize, chat, chat_ws, appointments, briefing_jobs, metrics
+from app.core.llm import init_anthropic_client, close_anthropic_client
+from app.core.telemetry import llm_telemetry
+from app.db.database import engine, async_engine, Base
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared Anthropic client, reused by every request
+    await init_anthropic_client()
+    yield
+    # Write buffered telemetry, then close pooled Anthropic and async database connections
+    await llm_telemetry.flush()
+    await close_anthropic_client()
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title="Amani Clinical Intake API",
     description="Virtual Clinic MVP for synthesizing patient narratives with historical data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -26,11 +42,14 @@ app.add_middleware(
 app.include_router(patients.router, prefix="/api", tags=["patients"])
 app.include_router(synthesize.router, prefix="/api", tags=["synthesis"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(chat_ws.router, prefix="/api", tags=["chat"])
 app.include_router(appointments.router, prefix="/api", tags=["appointments"])
+app.include_router(briefing_jobs.router, prefix="/api", tags=["briefing jobs"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Amani Clinical Intake API",
         "version": "1.0.0",
@@ -39,5 +58,5 @@ def read_root():
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy"}
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Date, JSON, ForeignKey, DateTime, Boolean, Integer
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Date, JSON, ForeignKey, DateTime, Boolean, Integer, Float, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -78,18 +78,47 @@ class ChatConversation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, index=True)
     is_complete = Column(Boolean, default=False, nullable=False)
-    messages = Column(JSON, nullable=False, default=list)  # Array of {role, content} objects
+    # Pre-chat_messages history as a JSON array of {role, content}; moved into chat_messages by
+    # migrate_add_chat_messages.py or on the conversation's next turn, then left empty
+    legacy_messages = deferred(Column("messages", JSON, nullable=False, default=list))
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")  # Rows in chat_messages
+    history_summary = Column(String, nullable=True)  # Rolling summary of messages[:summarized_message_count]
+    summarized_message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    symptom_draft = Column(JSON, nullable=True)  # Structured OPQRST symptom draft, updated every turn
+    symptom_draft_message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Clinical briefing sections synthesized speculatively once the empowerment question was asked
+    speculative_briefing = Column(JSON, nullable=True)
+    speculative_message_count = Column(Integer, nullable=True)  # Messages the speculative sections were built from
+    speculative_input_hash = Column(String, nullable=True)  # Hash of the synthesis input, to detect EHR/prompt changes
 
     # Relationships
     patient = relationship("Patient", back_populates="conversations")
     briefing = relationship("ClinicalBriefing", back_populates="conversation", uselist=False)
+    chat_messages = relationship("ConversationMessage", back_populates="conversation", lazy="raise")
+
+
+class ConversationMessage(Base):
+    __tablename__ = "chat_messages"
+
+    # One row per chat message; a turn appends rows instead of rewriting the conversation
+    conversation_id = Column(String, ForeignKey("chat_conversations.conversation_id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)  # Position in the conversation, from 0
+    role = Column(String, nullable=False)  # "ai" or "user"
+    content = Column(String, nullable=False)
+    thinking = Column(JSON, nullable=True)  # Extended Thinking steps behind an AI message
+    input_tokens = Column(Integer, nullable=True)  # Usage of the call that produced an AI message
+    output_tokens = Column(Integer, nullable=True)
+    cache_read_input_tokens = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    conversation = relationship("ChatConversation", back_populates="chat_messages")
 
 
 class ClinicalBriefing(Base):
     __tablename__ = "briefings"
 
     briefing_id = Column(String, primary_key=True, index=True)
-    patient_id = Column(String, ForeignKey("patients.patient_id"), nullable=False)
+    patient_id = Column(String, ForeignKey("patients.patient_id"), nullable=False, index=True)
     conversation_id = Column(String, ForeignKey("chat_conversations.conversation_id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, index=True)
@@ -103,6 +132,11 @@ class ClinicalBriefing(Base):
     patient = relationship("Patient", back_populates="briefings")
     conversation = relationship("ChatConversation", back_populates="briefing")
 
+    # Latest briefing per patient for the roster (also created by migrate_add_briefing_patient_index.py)
+    __table_args__ = (
+        Index("ix_briefings_patient_id_created_at", patient_id, created_at.desc()),
+    )
+
 
 class Appointment(Base):
     __tablename__ = "appointments"
@@ -121,3 +155,93 @@ class Appointment(Base):
 
     # Relationships
     patient = relationship("Patient", back_populates="appointments")
+
+
+class BriefingJob(Base):
+    __tablename__ = "briefing_jobs"
+
+    job_id = Column(String, primary_key=True, index=True)
+    patient_id = Column(String, ForeignKey("patients.patient_id"), nullable=False, index=True)
+    conversation_id = Column(String, ForeignKey("chat_conversations.conversation_id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    locked_by = Column(String, nullable=True)  # Worker that currently holds the job
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+    briefing_id = Column(String, ForeignKey("briefings.briefing_id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, index=True)
+
+
+class SynthesisCacheEntry(Base):
+    __tablename__ = "synthesis_cache"
+
+    cache_key = Column(String, primary_key=True)  # sha256 of patient, EHR, narrative, model and prompt version
+    patient_id = Column(String, ForeignKey("patients.patient_id"), nullable=False, index=True)
+    model = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False)
+    briefing_id = Column(String, nullable=True)  # Briefing created from this response, reused on hits
+    response_json = Column(JSON, nullable=False)  # Parsed model output
+    size_bytes = Column(Integer, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Claimed by the first request carrying an Idempotency-Key, then holding its response for replay
+    endpoint = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)  # sha256 of the request body; a reused key must match it
+    status = Column(String, nullable=False, default="in_progress")  # in_progress, completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(JSON, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=False)  # When the current owner claimed the key
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class EquityRecommendation(Base):
+    __tablename__ = "equity_recommendations"
+
+    # Reusable recommendation block for one equity dimension, spliced into briefings by dimension_key
+    dimension_key = Column(String, primary_key=True)  # Normalised "category:specific", e.g. "religion:islam-ramadan-fasting"
+    version = Column(Integer, primary_key=True)
+    label = Column(String, nullable=False)  # Human-readable name shown to the model and reviewers
+    flag_type = Column(String, nullable=True)  # "Bias Interruption" | "Population Health" | "Cultural Context"
+    recommendation = Column(JSON, nullable=True)  # RecommendationDetail fields; empty until a draft is written
+    status = Column(String, nullable=False, default="draft", index=True)  # draft, approved, retired
+    source = Column(String, nullable=False, default="generated")  # curated, generated (from a synthesis) or refreshed
+    times_requested = Column(Integer, nullable=False, default=1)  # Syntheses that needed this dimension while unapproved
+    reviewed_by = Column(String, nullable=True)
+    reviewed_at = Column(DateTime(timezone=True), nullable=True)
+    review_notes = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class LLMCall(Base):
+    __tablename__ = "llm_calls"
+
+    # Append-only telemetry: one row per scheduled Anthropic call, after retries
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)  # When the call finished
+    call_site = Column(String, nullable=False, index=True)  # e.g. "chat_turn", "conversation_synthesis:summary"
+    prompt_version = Column(String, nullable=True)
+    model = Column(String, nullable=False)
+    priority = Column(Integer, nullable=False)
+    streamed = Column(Boolean, nullable=False, default=False)
+    outcome = Column(String, nullable=False)  # "ok", "circuit_open", "retries_exhausted", "cancelled" or the error class
+    retries = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=True)
+    output_tokens = Column(Integer, nullable=True)  # Includes thinking
+    thinking_tokens = Column(Integer, nullable=True)  # Estimated from the thinking text; the API does not report it separately
+    cache_read_input_tokens = Column(Integer, nullable=True)
+    cache_creation_input_tokens = Column(Integer, nullable=True)
+    queue_ms = Column(Float, nullable=False)  # Waiting for admission, summed over attempts
+    ttft_ms = Column(Float, nullable=True)  # Streams only: first content delta
+    latency_ms = Column(Float, nullable=False)  # Whole call including queueing, retries and backoff
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 from typing import List, Optional, Union
 from datetime import date, datetime
 
@@ -80,6 +80,7 @@ class PatientBase(BaseModel):
 
 class PatientResponse(PatientBase):
     briefing_status: str  # "Pending Intake" or "Briefing Ready"
+    latest_briefing_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -87,6 +88,11 @@ class PatientResponse(PatientBase):
         from_attributes = True
 
 
+class PatientPage(BaseModel):
+    items: List[PatientResponse]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= to fetch the next page
+
+
 class PatientNarrativeBase(BaseModel):
     narrative_id: str
     patient_id: str
@@ -110,10 +116,11 @@ class KeyInsightFlag(BaseModel):
 
 
 class RecommendationDetail(BaseModel):
-    background_context: Optional[str] = None
+    # The short names are what conversation-synthesis-v5 and earlier prompts asked for
+    background_context: Optional[str] = Field(None, validation_alias=AliasChoices("background_context", "background"))
     approach: Optional[str] = None
-    explore_questions: Optional[List[str]] = None
-    integrate_actions: Optional[List[str]] = None
+    explore_questions: Optional[List[str]] = Field(None, validation_alias=AliasChoices("explore_questions", "explore"))
+    integrate_actions: Optional[List[str]] = Field(None, validation_alias=AliasChoices("integrate_actions", "integrate"))
     avoid: Optional[List[str]] = None
 
 
@@ -122,6 +129,18 @@ class EquityContextFlag(BaseModel):
     flag: str
     reasoning: str
     recommendation: Optional[Union[str, RecommendationDetail]] = None
+    dimension_key: Optional[str] = None  # Equity knowledge entry the recommendation was spliced from
+    recommendation_version: Optional[int] = None
+
+
+class EquityDimensionFlag(BaseModel):
+    """Equity flag as emitted by the model when recommendations come from the knowledge store"""
+    dimension_key: str  # Catalogue key, or a new "category:specific" key
+    label: Optional[str] = None  # Required for new keys
+    type: str
+    flag: str
+    reasoning: str  # Patient-specific
+    recommendation: Optional[RecommendationDetail] = None  # Only for dimensions without approved guidance
 
 
 class ReportedSymptom(BaseModel):
@@ -131,16 +150,71 @@ class ReportedSymptom(BaseModel):
     timing: Optional[str] = None
 
 
-class ClinicalBriefingBase(BaseModel):
+class SymptomDraftItem(ReportedSymptom):
+    onset: Optional[str] = None
+    provocation: Optional[str] = None  # What makes it better or worse
+    severity: Optional[str] = None
+    associated_symptoms: Optional[List[str]] = None
+
+
+class SymptomDraft(BaseModel):
+    """Running OPQRST draft of the patient's symptoms, updated after every chat turn"""
+    chief_complaint: Optional[str] = None
+    symptoms: List[SymptomDraftItem]
+
+
+class SummarySections(BaseModel):
+    """Clinical summary, structured symptoms and relevant EHR history"""
+    ai_summary: str
+    reported_symptoms_structured: List[ReportedSymptom]
+    relevant_history_surfaced: List[str]
+
+
+class SummaryFromDraftSections(BaseModel):
+    """Summary sections when reported symptoms come from the per-turn symptom draft"""
+    ai_summary: str
+    relevant_history_surfaced: List[str]
+
+
+class InsightSections(BaseModel):
+    """Clinical insight flags"""
+    key_insights_flags: List[KeyInsightFlag]
+
+
+class ClinicalSections(SummarySections, InsightSections):
+    """Briefing sections that depend only on the clinical part of the intake"""
+
+
+class EquitySections(BaseModel):
+    """Equity analysis of the patient's answer to the empowerment question"""
+    equity_and_context_flags: List[EquityContextFlag]
+
+
+class EquityUpdateSections(EquitySections):
+    """Equity analysis generated after speculative clinical sections were written"""
+    new_clinical_information: bool = False  # Final answer adds clinical facts the clinical sections lack
+
+
+class EquityDimensionSections(BaseModel):
+    """Equity dimensions identified in the intake; the server splices in stored recommendations"""
+    equity_dimensions: List[EquityDimensionFlag]
+
+
+class EquityDimensionUpdateSections(EquityDimensionSections):
+    """Equity dimensions generated after speculative clinical sections were written"""
+    new_clinical_information: bool = False
+
+
+class ClinicalBriefingContent(ClinicalSections):
+    """The model-generated sections of a briefing (also the synthesis tool's input schema)"""
+    equity_and_context_flags: Optional[List[EquityContextFlag]] = None
+
+
+class ClinicalBriefingBase(ClinicalBriefingContent):
     briefing_id: str
     patient_id: str
     created_at: datetime
     updated_at: datetime
-    ai_summary: str
-    key_insights_flags: List[KeyInsightFlag]
-    equity_and_context_flags: Optional[List[EquityContextFlag]] = None
-    reported_symptoms_structured: List[ReportedSymptom]
-    relevant_history_surfaced: List[str]
 
 
 class ClinicalBriefingResponse(ClinicalBriefingBase):
@@ -179,9 +253,38 @@ class ChatContinueResponse(BaseModel):
     ai_message: ChatMessage
     is_complete: bool
     briefing_id: Optional[str] = None  # Populated when conversation completes
+    briefing_job_id: Optional[str] = None  # Background synthesis job, populated when conversation completes
     thinking: Optional[List[str]] = None  # Real-time thinking steps from Claude
 
 
+class PartialBriefingResponse(BaseModel):
+    """What is known about an intake while it is still in progress"""
+    conversation_id: str
+    patient_id: str
+    is_complete: bool
+    chief_complaint: Optional[str] = None
+    symptoms: List[SymptomDraftItem] = []
+    messages_covered: int  # Messages the symptom draft has been updated from
+    total_messages: int
+    clinical_sections: Optional[ClinicalSections] = None  # Speculative clinical sections, once the empowerment question is asked
+
+
+class BriefingJobResponse(BaseModel):
+    job_id: str
+    patient_id: str
+    conversation_id: str
+    status: str  # queued, running, succeeded, failed
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    briefing_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class AppointmentBase(BaseModel):
     appointment_id: str
     patient_id: str
@@ -219,3 +322,8 @@ class AppointmentUpdate(BaseModel):
 class AppointmentResponse(AppointmentBase):
     class Config:
         from_attributes = True
+
+
+class AppointmentPage(BaseModel):
+    items: List[AppointmentResponse]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= to fetch the next page
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for Anthropic client reuse.
+
+Starts a local mock of the Anthropic Messages API and compares calling it with
+a new client per request (the old pattern) against the shared pooled client
+from app.core.llm. The mock serves plain HTTP, so the gap measured here is
+client construction plus TCP setup; against the real API TLS handshakes widen it.
+
+Usage:
+    python benchmark_anthropic_client.py --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+import uvicorn
+from fastapi import FastAPI
+
+MOCK_LATENCY_SECONDS = 0.02
+
+mock_app = FastAPI()
+
+
+@mock_app.post("/v1/messages")
+async def mock_messages(payload: dict):
+    """Return a canned Messages API response after a fixed delay"""
+    await asyncio.sleep(MOCK_LATENCY_SECONDS)
+    return {
+        "id": "msg_mock",
+        "type": "message",
+        "role": "assistant",
+        "model": payload.get("model", "mock"),
+        "content": [{"type": "text", "text": "Thank you for sharing that."}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 10, "output_tokens": 8}
+    }
+
+
+def start_mock_server() -> str:
+    """Run the mock server on a free local port in a background thread"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(mock_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def timed_call(client) -> float:
+    started = time.perf_counter()
+    await client.messages.create(
+        model="claude-3-5-haiku-20241022",
+        max_tokens=64,
+        messages=[{"role": "user", "content": "ping"}]
+    )
+    return time.perf_counter() - started
+
+
+async def run_per_request(total: int, concurrency: int) -> list:
+    """Old pattern: construct a client for every call"""
+    from anthropic import AsyncAnthropic
+    from app.core.config import settings
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY, base_url=settings.ANTHROPIC_BASE_URL)
+            try:
+                await timed_call(client)
+            finally:
+                await client.close()
+            return time.perf_counter() - started
+
+    return await asyncio.gather(*[one() for _ in range(total)])
+
+
+async def run_shared(total: int, concurrency: int) -> list:
+    """New pattern: one pooled client shared by every call"""
+    from app.core.llm import init_anthropic_client, close_anthropic_client
+
+    client = await init_anthropic_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await timed_call(client)
+
+    try:
+        return await asyncio.gather(*[one() for _ in range(total)])
+    finally:
+        await close_anthropic_client()
+
+
+def report(label: str, latencies: list):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1)))]
+    print(f"📊 {label}")
+    print(f"   • p50: {statistics.median(ordered) * 1000:.1f} ms")
+    print(f"   • p95: {p95 * 1000:.1f} ms")
+    print(f"   • mean: {statistics.mean(ordered) * 1000:.1f} ms")
+    print()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare per-request vs shared Anthropic clients")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    base_url = start_mock_server()
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ.setdefault("ANTHROPIC_API_KEY", "mock-key")
+
+    print(f"🚀 Mock Anthropic server at {base_url} "
+          f"({args.requests} requests, concurrency {args.concurrency})")
+    print()
+
+    report("New client per request", await run_per_request(args.requests, args.concurrency))
+    report("Shared pooled client", await run_shared(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
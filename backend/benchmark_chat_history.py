@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Input-token benchmark for chat history management.
+
+Simulates long synthetic intake conversations and compares the input tokens of
+each chat turn when the full history is resent (the old behaviour) against the
+token-budgeted window plus rolling summary from app.core.history. Request
+payloads are built with the real build_chat_request; the summariser is replaced
+by a deterministic stand-in whose output is capped at CHAT_SUMMARY_MAX_TOKENS, so
+no API key is needed. Summariser input tokens are reported separately because
+they are paid on the cheap model.
+
+Usage:
+    python benchmark_chat_history.py --conversations 20 --turns 40
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+from app.api.chat import build_chat_request, build_conversational_prompt
+from app.core.config import settings
+from app.core.history import estimate_tokens, fold_boundary, format_transcript
+
+PATIENT_LINES = [
+    "It started about three weeks ago, mostly in the evenings after I get home from my second job.",
+    "The pain is kind of a dull ache on the left side of my lower back, but sometimes it shoots down my leg.",
+    "On a bad day I'd say it's a seven out of ten and I can't really pick up my daughter.",
+    "I've tried ibuprofen and a heating pad my neighbour lent me, which helps a little for an hour or so.",
+    "My mother had something similar and they told her it was just stress, so I waited before coming in.",
+    "Sometimes I feel a bit dizzy when I stand up too fast, and I've been more tired than usual lately.",
+    "I work nights at a warehouse, so I'm on my feet lifting boxes for most of my shift.",
+    "I don't really sleep well either, maybe four or five hours, because the pain wakes me up.",
+    "Last time I went to a clinic the doctor didn't really listen and I left without any answers.",
+    "I'd prefer to avoid strong medications if possible, my church community has helped me with natural remedies.",
+]
+
+AI_LINES = [
+    "That sounds really tough. Can you tell me more about when you first noticed it?",
+    "Thank you for explaining that. How would you describe how it feels?",
+    "It makes sense that you're concerned. Is it there all the time, or does it come and go?",
+    "I appreciate you sharing that. Have you noticed anything else happening at the same time?",
+    "That's helpful to know. How much is this affecting your day-to-day life?",
+]
+
+
+def synthetic_conversation(turns: int, rng: random.Random) -> list:
+    messages = [{"role": "ai", "content": "Hello! I'm Amani. Can you tell me what brings you in for your visit?"}]
+    for _ in range(turns):
+        # Chatty patients: two or three sentences per reply
+        messages.append({"role": "user", "content": " ".join(rng.sample(PATIENT_LINES, rng.randint(2, 3)))})
+        messages.append({"role": "ai", "content": rng.choice(AI_LINES)})
+    return messages
+
+
+def stand_in_summary(previous_summary: str, new_messages: list) -> str:
+    """Deterministic replacement for the summariser: bullet the patient's words, capped like the real call"""
+    bullets = [f"- {msg['content'].split('.')[0]}" for msg in new_messages if msg["role"] == "user"]
+    summary = "\n".join(filter(None, [previous_summary] + bullets))
+    return summary[-settings.CHAT_SUMMARY_MAX_TOKENS * 4:]
+
+
+def request_tokens(params: dict) -> int:
+    return estimate_tokens(json.dumps({"system": params["system"], "messages": params["messages"]}))
+
+
+def simulate(messages: list, patient, ehr) -> dict:
+    full, managed = [], []
+    summary, summarized_count = None, 0
+    summarizer_calls, summarizer_tokens = 0, 0
+
+    # Each patient message is a turn: the request includes everything up to and including it
+    system_prompt = build_conversational_prompt(patient, ehr, messages)
+    for end in range(2, len(messages) + 1, 2):
+        history = messages[:end]
+        full.append(request_tokens(build_chat_request(system_prompt, history)))
+        managed.append(request_tokens(build_chat_request(system_prompt, history, summary, summarized_count)))
+
+        # After the turn is saved (with the AI reply), the background refresh may fold older turns
+        saved = messages[:end + 1]
+        boundary = fold_boundary(saved, summarized_count)
+        if boundary != summarized_count:
+            folded = saved[summarized_count:boundary]
+            summarizer_calls += 1
+            summarizer_tokens += estimate_tokens((summary or "") + format_transcript(folded))
+            summary = stand_in_summary(summary, folded)
+            summarized_count = boundary
+
+    return {
+        "full": full,
+        "managed": managed,
+        "summarizer_calls": summarizer_calls,
+        "summarizer_tokens": summarizer_tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-turn input tokens with and without history management")
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=40, help="Patient messages per conversation")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patient = SimpleNamespace(full_name="Jordan Rivera", date_of_birth=date(1985, 6, 1), gender_identity="non-binary")
+    ehr = SimpleNamespace(
+        problem_list=[{"condition": "Hypertension"}, {"condition": "Type 2 diabetes"}],
+        medication_list=[{"name": "Lisinopril", "dosage": "10mg"}, {"name": "Metformin", "dosage": "500mg"}]
+    )
+
+    results = [simulate(synthetic_conversation(args.turns, rng), patient, ehr) for _ in range(args.conversations)]
+
+    print(f"Budget {settings.CHAT_HISTORY_TOKEN_BUDGET} tokens, keep {settings.CHAT_HISTORY_KEEP_MESSAGES} messages, "
+          f"{args.conversations} conversations x {args.turns} turns (token counts are estimates)\n")
+    print(f"{'turn':>6} {'full history':>14} {'managed':>10}")
+    for turn in sorted({1, 5, 10, 20, args.turns // 2, args.turns}):
+        if turn > args.turns:
+            continue
+        full = statistics.mean(r["full"][turn - 1] for r in results)
+        managed = statistics.mean(r["managed"][turn - 1] for r in results)
+        print(f"{turn:>6} {full:>14.0f} {managed:>10.0f}")
+
+    full_total = statistics.mean(sum(r["full"]) for r in results)
+    managed_total = statistics.mean(sum(r["managed"]) for r in results)
+    summarizer_total = statistics.mean(r["summarizer_tokens"] for r in results)
+    print(f"\nMax managed input per turn: {max(max(r['managed']) for r in results)} tokens")
+    print(f"Per conversation: full {full_total:.0f} tokens, managed {managed_total:.0f} tokens "
+          f"({(1 - managed_total / full_total) * 100:.0f}% fewer on the chat model)")
+    print(f"Summariser: {statistics.mean(r['summarizer_calls'] for r in results):.1f} calls, "
+          f"{summarizer_total:.0f} input tokens per conversation on {settings.CHAT_SUMMARY_MODEL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the API.
+
+Drives a running server with N concurrent clients (200 by default) for a fixed
+duration and reports requests/sec and latency percentiles per endpoint.
+To compare the sync and async database layers, run it once against a server
+started from each revision and compare the printed numbers.
+
+Usage:
+    uvicorn app.main:app --workers 1 &
+    python benchmark_concurrency.py --base-url http://localhost:8000 --clients 200 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/api/patients?limit=50",
+    "/api/appointments?limit=50",
+    "/health",
+]
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def client_loop(client: httpx.AsyncClient, path: str, deadline: float, latencies: list, errors: list):
+    """Issue requests back-to-back until the deadline"""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+            else:
+                latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+async def run_endpoint(base_url: str, path: str, clients: int, duration: float):
+    """Benchmark a single endpoint and print its throughput and latency"""
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            client_loop(client, path, deadline, latencies, errors) for _ in range(clients)
+        ])
+        elapsed = time.perf_counter() - started
+
+    print(f"📊 {path}")
+    print(f"   • Requests/sec: {len(latencies) / elapsed:.1f}")
+    print(f"   • Completed: {len(latencies)}  Errors: {len(errors)}")
+    if latencies:
+        print(f"   • Latency p50/p95/p99: "
+              f"{percentile(latencies, 50) * 1000:.1f} / "
+              f"{percentile(latencies, 95) * 1000:.1f} / "
+              f"{percentile(latencies, 99) * 1000:.1f} ms "
+              f"(mean {statistics.mean(latencies) * 1000:.1f} ms)")
+    print()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark API throughput under concurrent load")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per endpoint")
+    parser.add_argument("--path", action="append", help="Endpoint path to benchmark (repeatable)")
+    args = parser.parse_args()
+
+    print(f"🚀 Benchmarking {args.base_url} with {args.clients} concurrent clients "
+          f"for {args.duration:.0f}s per endpoint...")
+    print()
+    for path in args.path or DEFAULT_PATHS:
+        await run_endpoint(args.base_url, path, args.clients, args.duration)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark how many open intake sessions one API worker holds over the WebSocket transport.
+
+For each level in --sessions, keeps that many intakes connected to /api/ws/chat/{id} for
+--hold seconds. A share of them (--active-ratio) chat, with --think-time between turns, and
+start a new intake when theirs completes. The rest stay idle and only answer heartbeats, like
+patients reading or typing. Each level reports how long connecting took, turn and first-text
+latency percentiles, errors, and the worker's resident memory and WebSocket counters.
+
+Point the API at fake_anthropic_server.py so no API money is spent. Run a single worker so
+the numbers are per worker, and raise the open-file limit for the larger levels. With
+--spawn the script starts the fake server, one API worker and a briefing worker itself (the
+database must already be seeded with seed.py):
+
+    ulimit -n 65536
+    python benchmark_ws_sessions.py --spawn --sessions 100,500,1000 --hold 60 --fake-args "--latency-ms 400"
+
+Or against servers you started yourself (--api-pid enables the memory figures):
+
+    python fake_anthropic_server.py --port 8090 --latency-ms 400 &
+    ANTHROPIC_BASE_URL=http://localhost:8090 uvicorn app.main:app --port 8000 --workers 1 &
+    python benchmark_ws_sessions.py --sessions 100,500 --api-pid $! --json-out ws_sessions.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+
+from benchmark_concurrency import percentile
+from load_test import Recorder, FALLBACK_ANSWERS, EMPOWERMENT_ANSWERS, MAX_TURNS, spawn_stack
+
+
+def rss_mb(pid: int):
+    """Resident memory of a local process in MB (Linux only)"""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def next_frame(ws, timeout: float) -> dict:
+    """Next frame the benchmark cares about, answering heartbeats on the way"""
+    while True:
+        frame = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+        if frame["type"] == "ping":
+            await ws.send(json.dumps({"type": "pong"}))
+        else:
+            return frame
+
+
+async def run_turn(ws, recorder: Recorder, message: str, timeout: float):
+    """Send one turn; records turn and first-text latency. Returns the done frame, or None"""
+    started = time.perf_counter()
+    first_text = None
+    await ws.send(json.dumps({"type": "message", "content": message}))
+    while True:
+        frame = await next_frame(ws, timeout)
+        if frame["type"] == "text" and first_text is None:
+            first_text = time.perf_counter() - started
+        elif frame["type"] == "error":
+            recorder.error("turn", "error_frame")
+            return None
+        elif frame["type"] == "done":
+            recorder.ok("turn", time.perf_counter() - started)
+            if first_text is not None:
+                recorder.ok("turn (first text)", first_text)
+            return frame
+
+
+async def hold_session(client: httpx.AsyncClient, recorder: Recorder, rng, patients, deadline, active, opened, args):
+    """Keep one intake connected until the deadline, chatting if active"""
+    ws_url = args.base_url.replace("http", "ws", 1)
+    counted = False
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.post("/api/chat/start", json={"patient_id": rng.choice(patients)})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            recorder.error("connect", type(e).__name__)
+            return
+        conversation_id = response.json()["conversation_id"]
+
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(f"{ws_url}/api/ws/chat/{conversation_id}?last_seq=0", max_queue=None) as ws:
+                while (await next_frame(ws, args.request_timeout))["type"] != "ready":
+                    pass
+                recorder.ok("connect", time.perf_counter() - started)
+                if not counted:
+                    counted = True
+                    opened.append(conversation_id)
+
+                if not active:
+                    # Idle patient: stay connected, answering heartbeats
+                    while time.perf_counter() < deadline:
+                        try:
+                            await next_frame(ws, deadline - time.perf_counter())
+                        except asyncio.TimeoutError:
+                            pass
+                    return
+
+                previous_ai = response.json()["initial_message"]["content"]
+                for turn in range(MAX_TURNS):
+                    if time.perf_counter() >= deadline:
+                        return
+                    await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+                    if "personal beliefs, cultural background" in previous_ai:
+                        message = rng.choice(EMPOWERMENT_ANSWERS)
+                    else:
+                        message = FALLBACK_ANSWERS[turn % len(FALLBACK_ANSWERS)]
+                    done = await run_turn(ws, recorder, message, args.request_timeout)
+                    if done is None:
+                        return
+                    previous_ai = done["ai_message"]["content"]
+                    if done["is_complete"]:
+                        break
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+            recorder.error("connect", type(e).__name__)
+            return
+
+
+async def run_level(client, patients, sessions: int, args, api_pid) -> dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed + sessions)
+    opened = []
+    baseline_rss = rss_mb(api_pid) if api_pid else None
+
+    started = time.perf_counter()
+    deadline = started + args.ramp + args.hold
+    tasks = []
+    for index in range(sessions):
+        # Spread connects over the ramp so the level measures holding sessions, not a connect storm
+        delay = started + args.ramp * index / sessions - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        active = index < sessions * args.active_ratio
+        tasks.append(asyncio.create_task(
+            hold_session(client, recorder, random.Random(rng.random()), patients, deadline, active, opened, args)
+        ))
+
+    # Sample memory and server counters while every session is open
+    await asyncio.sleep(max(0.0, started + args.ramp + args.hold / 2 - time.perf_counter()))
+    peak_rss = rss_mb(api_pid) if api_pid else None
+    server = (await client.get("/api/chat/ws/stats")).json()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    endpoints = recorder.summary(elapsed)
+    report = {
+        "sessions": sessions,
+        "connected": len(opened),
+        "open_on_server": server.get("open"),
+        "rss_mb": round(peak_rss, 1) if peak_rss else None,
+        "rss_kb_per_session": round((peak_rss - baseline_rss) * 1024 / len(opened), 1) if peak_rss and baseline_rss and opened else None,
+        "server": server,
+        "endpoints": endpoints
+    }
+    return report
+
+
+async def run(args, api_pid) -> list:
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.request_timeout) as client:
+        response = await client.get("/api/patients", params={"limit": 100})
+        response.raise_for_status()
+        patients = [patient["patient_id"] for patient in response.json()["items"]]
+        if not patients:
+            sys.exit("✗ No patients in the database; run seed.py first")
+
+        reports = []
+        for sessions in args.sessions:
+            print(f"🔌 Holding {sessions} sessions ({args.active_ratio:.0%} active) for {args.hold:.0f}s...")
+            reports.append(await run_level(client, patients, sessions, args, api_pid))
+        return reports
+
+
+def print_report(reports: list):
+    print(f"\n{'sessions':>8} {'connected':>9} {'rss MB':>8} {'KB/sess':>8} {'connect p95':>12} "
+          f"{'turn p50':>9} {'turn p95':>9} {'text p95':>9} {'errors':>7}")
+    for report in reports:
+        endpoints = report["endpoints"]
+        connect = endpoints.get("connect", {})
+        turn = endpoints.get("turn", {})
+        first_text = endpoints.get("turn (first text)", {})
+        errors = sum(stats["errors"] for stats in endpoints.values())
+        print(f"{report['sessions']:>8} {report['connected']:>9} {report['rss_mb'] or '-':>8} "
+              f"{report['rss_kb_per_session'] or '-':>8} {connect.get('p95_ms', '-'):>12} "
+              f"{turn.get('p50_ms', '-'):>9} {turn.get('p95_ms', '-'):>9} {first_text.get('p95_ms', '-'):>9} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent intake WebSocket sessions per worker")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=lambda value: [int(n) for n in value.split(",")], default=[50, 200],
+                        help="Comma-separated session counts to hold, e.g. 100,500,1000")
+    parser.add_argument("--hold", type=float, default=30.0, help="Seconds to hold each level once connected")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which each level connects")
+    parser.add_argument("--active-ratio", type=float, default=0.2, help="Share of sessions that chat; the rest idle")
+    parser.add_argument("--think-time", type=float, default=3.0, help="Mean seconds between an active patient's turns")
+    parser.add_argument("--request-timeout", type=float, default=180.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--api-pid", type=int, help="API worker process to read memory from")
+    parser.add_argument("--json-out", type=Path, help="Also write the report as JSON")
+    parser.add_argument("--max-turn-p95-ms", type=float, help="Fail if any level's turn p95 exceeds this")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake Anthropic API, one API worker and a briefing worker")
+    parser.add_argument("--fake-url", default="http://127.0.0.1:8090", help="Fake Anthropic API for --spawn")
+    parser.add_argument("--fake-args", default="", help="Extra fake_anthropic_server.py arguments for --spawn")
+    args = parser.parse_args()
+
+    processes = spawn_stack(args) if args.spawn else []
+    api_pid = processes[1].pid if processes else args.api_pid
+
+    try:
+        reports = asyncio.run(run(args, api_pid))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    print_report(reports)
+    if args.json_out:
+        args.json_out.write_text(json.dumps(reports, indent=2))
+
+    failures = [
+        f"{report['sessions']} sessions: turn p95 {report['endpoints']['turn']['p95_ms']:.0f} ms"
+        for report in reports
+        if args.max_turn_p95_ms is not None and "turn" in report["endpoints"]
+        and report["endpoints"]["turn"]["p95_ms"] > args.max_turn_p95_ms
+    ]
+    if failures:
+        print("\n✗ Thresholds exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Background worker that synthesizes clinical briefings for completed intakes.
+
+Jobs are queued in the briefing_jobs table by /chat/continue and claimed with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of worker processes can run
+side by side. Failed jobs are retried with exponential backoff.
+
+Usage:
+    python briefing_worker.py                 # one worker process
+    python briefing_worker.py --processes 4   # four worker processes
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import traceback
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.jobs import claim_next_job, run_with_lease, mark_job_succeeded, mark_job_failed, LeaseLost
+from app.core.llm import close_anthropic_client
+from app.core.telemetry import llm_telemetry
+from app.db.database import AsyncSessionLocal, async_engine
+from app.models.patient import Patient, EHRHistory, ChatConversation, ClinicalBriefing
+from app.api.chat import synthesize_from_conversation
+
+
+async def run_job(db, job) -> str:
+    """Synthesize the briefing for a job's conversation. Returns the briefing_id."""
+    # A previous attempt may have saved the briefing before the worker died
+    existing = (await db.scalars(
+        select(ClinicalBriefing).where(ClinicalBriefing.conversation_id == job.conversation_id).limit(1)
+    )).first()
+    if existing:
+        return existing.briefing_id
+
+    conversation = await db.get(ChatConversation, job.conversation_id)
+    patient = await db.get(Patient, job.patient_id)
+    ehr = (await db.scalars(
+        select(EHRHistory).where(EHRHistory.patient_id == job.patient_id).limit(1)
+    )).first()
+
+    briefing = await synthesize_from_conversation(db, patient, ehr, conversation)
+    return briefing.briefing_id
+
+
+async def work_forever(worker_id: str):
+    print(f"👷 Worker {worker_id} started")
+
+    try:
+        while True:
+            async with AsyncSessionLocal() as db:
+                job = await claim_next_job(db, worker_id)
+                if not job:
+                    await asyncio.sleep(settings.BRIEFING_JOB_POLL_INTERVAL)
+                    continue
+
+                print(f"🔄 {worker_id}: running {job.job_id} (attempt {job.attempts}/{job.max_attempts})")
+                try:
+                    briefing_id = await run_with_lease(job.job_id, worker_id, run_job(db, job))
+                except LeaseLost as e:
+                    await db.rollback()
+                    print(f"⚠️  {worker_id}: {e}; dropping it")
+                    continue
+                except Exception as e:
+                    await db.rollback()
+                    detail = getattr(e, "detail", None) or str(e)
+                    traceback.print_exc()
+                    await db.refresh(job)
+                    if await mark_job_failed(db, job, worker_id, detail):
+                        await db.refresh(job)
+                        print(f"❌ {worker_id}: {job.job_id} failed ({job.status}): {detail}")
+                    continue
+
+                if await mark_job_succeeded(db, job, worker_id, briefing_id):
+                    print(f"✅ {worker_id}: {job.job_id} produced {briefing_id}")
+                else:
+                    print(f"⚠️  {worker_id}: {job.job_id} was reclaimed by another worker before it finished")
+    finally:
+        await llm_telemetry.flush()
+        await close_anthropic_client()
+        await async_engine.dispose()
+
+
+def run_process(index: int):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    asyncio.run(work_forever(worker_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run briefing synthesis workers")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        run_process(0)
+        return
+
+    processes = [multiprocessing.Process(target=run_process, args=(i,)) for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
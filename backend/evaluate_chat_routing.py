@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the chat routing policy.
+
+Replays recorded intake transcripts through app.core.routing.choose_chat_route,
+one decision per patient message, without calling the API. Prints the route mix
+and, for messages annotated with "expected_route", any disagreements; exits
+non-zero on a mismatch so the policy can be checked before a deploy.
+
+Transcripts are a JSON list of {"conversation_id", "messages": [{role, content,
+expected_route?}]}, or real conversations can be read from the database.
+
+Usage:
+    python evaluate_chat_routing.py                         # data/recorded_intake_transcripts.json
+    python evaluate_chat_routing.py --transcripts path.json --verbose
+    python evaluate_chat_routing.py --from-db --limit 200
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+os.environ.setdefault("ANTHROPIC_API_KEY", "offline")
+
+from app.core.routing import choose_chat_route, ROUTE_FAST
+
+DEFAULT_TRANSCRIPTS = Path(__file__).parent / "data" / "recorded_intake_transcripts.json"
+
+
+def load_from_db(limit: int) -> list:
+    from sqlalchemy import select
+    from sqlalchemy.orm import undefer
+    from app.db.database import SessionLocal
+    from app.models.patient import ChatConversation, ConversationMessage
+
+    db = SessionLocal()
+    try:
+        conversations = db.scalars(
+            select(ChatConversation)
+            .options(undefer(ChatConversation.legacy_messages))
+            .order_by(ChatConversation.created_at.desc())
+            .limit(limit)
+        ).all()
+
+        messages = {c.conversation_id: [] for c in conversations}
+        rows = db.execute(
+            select(ConversationMessage.conversation_id, ConversationMessage.role, ConversationMessage.content)
+            .where(ConversationMessage.conversation_id.in_(list(messages)))
+            .order_by(ConversationMessage.conversation_id, ConversationMessage.seq)
+        )
+        for conversation_id, role, content in rows:
+            messages[conversation_id].append({"role": role, "content": content})
+
+        return [
+            {"conversation_id": c.conversation_id, "messages": messages[c.conversation_id] or c.legacy_messages or []}
+            for c in conversations
+        ]
+    finally:
+        db.close()
+
+
+def evaluate(transcripts: list, verbose: bool = False) -> int:
+    routes = Counter()
+    reasons = Counter()
+    mismatches = []
+
+    for transcript in transcripts:
+        messages = transcript["messages"]
+        for index, msg in enumerate(messages):
+            if msg["role"] != "user":
+                continue
+
+            route, reason = choose_chat_route(messages[:index + 1])
+            routes[route] += 1
+            reasons[reason] += 1
+
+            expected = msg.get("expected_route")
+            if expected and expected != route:
+                mismatches.append((transcript["conversation_id"], msg["content"], expected, route, reason))
+            if verbose:
+                marker = " (!)" if expected and expected != route else ""
+                print(f"{transcript['conversation_id']:>18} {route:>10} {reason:<24} {msg['content'][:60]}{marker}")
+
+    total = sum(routes.values())
+    if verbose:
+        print()
+    print(f"{len(transcripts)} conversations, {total} patient turns")
+    for route, count in routes.most_common():
+        print(f"  {route:<10} {count:>5} ({count / max(total, 1) * 100:.0f}%)")
+    print("Reasons: " + ", ".join(f"{reason}={count}" for reason, count in reasons.most_common()))
+    print(f"Share of turns on the fast model: {routes[ROUTE_FAST] / max(total, 1) * 100:.0f}%")
+
+    if mismatches:
+        print(f"\n✗ {len(mismatches)} turns routed differently than expected:")
+        for conversation_id, content, expected, route, reason in mismatches:
+            print(f"  {conversation_id}: expected {expected}, got {route} ({reason}): {content[:70]}")
+        return 1
+
+    print("\n✓ All annotated turns routed as expected")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded transcripts through the chat routing policy")
+    parser.add_argument("--transcripts", type=Path, default=DEFAULT_TRANSCRIPTS)
+    parser.add_argument("--from-db", action="store_true", help="Use stored conversations instead of a transcript file")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--verbose", action="store_true", help="Print every routing decision")
+    args = parser.parse_args()
+
+    if args.from_db:
+        transcripts = load_from_db(args.limit)
+    else:
+        with open(args.transcripts) as f:
+            transcripts = json.load(f)
+
+    sys.exit(evaluate(transcripts, args.verbose))
+
+
+if __name__ == "__main__":
+    main()
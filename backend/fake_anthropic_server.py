@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic API, for exercising LLM pipelines offline.
+
+Implements the Messages endpoint (blocking and streaming, with thinking blocks
+and forced tool calls) and the Message Batches endpoints (create, retrieve,
+results), so /chat/start, /chat/continue, /synthesize, the briefing worker and
+pregenerate_briefings.py can all run without spending API money.
+
+Responses are deterministic for a given request:
+- intake chat turns follow a scripted interview (follow-up questions, then the
+  empowerment question, then the completion signal)
+- briefings, sections and symptom drafts are built from data/narratives.json,
+  matched on the narrative text found in the request, and shaped to the
+  requested tool's input schema
+- history summaries are short bullet lists of the patient's words
+
+Latency is a lognormal time to first token (--latency-ms median, --latency-sigma
+spread) plus output pacing (--tokens-per-second). A share of requests can be
+answered with 429 rate_limit_error (with retry-after) or 529 overloaded_error.
+GET /fake/stats reports request and injected-error counts.
+
+Usage:
+    python fake_anthropic_server.py --port 8090 --batch-seconds 5
+    python fake_anthropic_server.py --latency-ms 800 --tokens-per-second 60 --rate-limit-rate 0.02
+    ANTHROPIC_BASE_URL=http://localhost:8090 python pregenerate_briefings.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+app = FastAPI(title="Fake Anthropic API")
+
+BATCH_SECONDS = 5.0
+LATENCY_MS = 0.0  # Median time to first token
+LATENCY_SIGMA = 0.5
+TOKENS_PER_SECOND = 0.0  # 0 = output arrives instantly
+RATE_LIMIT_RATE = 0.0
+OVERLOAD_RATE = 0.0
+RETRY_AFTER_SECONDS = 1
+INTAKE_TURNS = 4  # Patient replies before the empowerment question
+
+NARRATIVES_FILE = Path(__file__).parent / "data" / "narratives.json"
+
+# Phrase the chat prompt's empowerment question and routing policy both rely on
+EMPOWERMENT_QUESTION = (
+    "Thank you, that's very clear. Lastly, and this is just as important, is there anything about your "
+    "personal beliefs, cultural background, or past experiences with healthcare that you would like your "
+    "doctor to be aware of when considering your care?"
+)
+CLOSING_MESSAGE = (
+    "Thank you for sharing. I've noted that for your doctor. This has been very helpful. "
+    "A clinician will review this before your visit. <<INTAKE_COMPLETE>>"
+)
+FOLLOW_UPS = [
+    "That sounds really uncomfortable. When did you first notice it?",
+    "Thank you for explaining. How would you describe what it feels like?",
+    "It makes sense that you're concerned. Is it there all the time, or does it come and go?",
+    "I appreciate you sharing that. Have you noticed anything else happening at the same time?",
+    "That's helpful to know. How much is this affecting your day-to-day life?",
+]
+
+rng = random.Random(0)
+stats = Counter()
+
+# batch_id -> {"created": monotonic time, "created_at": iso str, "requests": [...]}
+batches = {}
+
+# Hashes of cached system prefixes seen so far, to report prompt cache reads and writes
+cached_prefixes = set()
+
+
+def load_narratives() -> list:
+    try:
+        with open(NARRATIVES_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+NARRATIVES = load_narratives()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def system_text(params: dict) -> str:
+    system = params.get("system") or ""
+    if isinstance(system, str):
+        return system
+    return "\n".join(block.get("text", "") for block in system)
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    parts = []
+    for block in content or []:
+        if block.get("type") == "text":
+            parts.append(block["text"])
+        elif block.get("type") == "tool_result":
+            parts.append(json.dumps(block.get("content")))
+    return "\n".join(parts)
+
+
+def request_text(params: dict) -> str:
+    return "\n".join(message_text(message) for message in params.get("messages", []))
+
+
+def first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+
+
+def pick_narrative(params: dict) -> dict:
+    """The narrative whose opening sentence appears in the request, else one chosen by request hash"""
+    if not NARRATIVES:
+        return {"narrative_title": "Fatigue", "narrative_text": "I've been feeling tired lately."}
+    text = request_text(params)
+    for narrative in NARRATIVES:
+        if first_sentence(narrative["narrative_text"])[:60] in text:
+            return narrative
+    index = int(hashlib.sha256(text.encode()).hexdigest(), 16) % len(NARRATIVES)
+    return NARRATIVES[index]
+
+
+def canned_briefing(narrative: dict) -> dict:
+    """Every field a briefing, section or symptom draft tool may ask for, derived from the narrative"""
+    title = narrative["narrative_title"]
+    complaint = first_sentence(narrative["narrative_text"])
+    recommendation = {
+        "background_context": f"Background relevant to patients reporting {title.lower()}.",
+        "approach": "I'd like to understand what matters most to you about your care.",
+        "explore_questions": ["What worries you most about these symptoms? [Surfaces the patient's priorities]"],
+        "integrate_actions": ["Agree a follow-up plan with the patient before they leave"],
+        "avoid": ["Attributing the symptoms to stress before a full assessment"]
+    }
+    return {
+        "ai_summary": f"Patient reports {title.lower()}. In their words: \"{complaint}\"",
+        "key_insights_flags": [{
+            "type": "Condition Progression",
+            "flag": f"{title} may relate to a known condition",
+            "reasoning": "The reported symptoms overlap with conditions on the problem list.",
+            "severity": "Medium"
+        }],
+        "reported_symptoms_structured": [
+            {"symptom": title, "quality": None, "location": None, "timing": "Recent weeks"}
+        ],
+        "relevant_history_surfaced": [f"Problem list and recent labs relevant to {title.lower()}"],
+        "equity_and_context_flags": [{
+            "type": "Bias Interruption",
+            "flag": "Past negative healthcare experiences",
+            "reasoning": "Patient described feeling unheard at previous visits.",
+            "recommendation": recommendation
+        }],
+        "equity_dimensions": [{
+            "dimension_key": "discrimination:past-healthcare-dismissal",
+            "label": "Past negative or dismissive healthcare experiences",
+            "type": "Bias Interruption",
+            "flag": "Past negative healthcare experiences",
+            "reasoning": "Patient described feeling unheard at previous visits."
+        }],
+        "new_clinical_information": False,
+        "chief_complaint": title,
+        "symptoms": [{"symptom": title, "onset": "A few weeks ago", "quality": complaint[:80]}],
+        **recommendation
+    }
+
+
+def value_for_schema(name: str, schema: dict, canned: dict):
+    """Fill a JSON schema node, preferring canned values for known field names"""
+    if name in canned:
+        return canned[name]
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return value_for_schema(name, options[0], canned) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: value_for_schema(key, child, canned) for key, child in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [value_for_schema(name, schema.get("items", {}), canned)]
+    if kind == "boolean":
+        return False
+    if kind in ("integer", "number"):
+        return 0
+    return f"Fake {name.replace('_', ' ')}"
+
+
+def chat_reply(params: dict) -> str:
+    """Scripted intake: follow-up questions, the empowerment question, then the completion signal"""
+    messages = params.get("messages", [])
+    assistant = [message_text(m) for m in messages if m["role"] == "assistant"]
+    user_turns = sum(1 for m in messages if m["role"] == "user")
+    if assistant and "personal beliefs, cultural background" in assistant[-1]:
+        return CLOSING_MESSAGE
+    # Older turns may have been folded into the history summary (one bullet per patient message)
+    summary = system_text(params).split("### EARLIER IN THIS CONVERSATION (summary)", 1)
+    summarized = summary[1].count("\n- ") if len(summary) == 2 else 0
+    if user_turns + summarized >= INTAKE_TURNS:
+        return EMPOWERMENT_QUESTION
+    return FOLLOW_UPS[user_turns % len(FOLLOW_UPS)]
+
+
+def history_summary(params: dict) -> str:
+    transcript = request_text(params)
+    lines = [line.split(":", 1)[1].strip() for line in transcript.splitlines() if line.lower().startswith("patient:")]
+    return "\n".join(f"- {first_sentence(line)}" for line in lines) or "- No new clinical details"
+
+
+def build_content(params: dict) -> tuple[str, list]:
+    """Return (request kind, content blocks) for a Messages API request"""
+    system = system_text(params)
+    tools = params.get("tools")
+    if tools:
+        tool = tools[0]
+        canned = canned_briefing(pick_narrative(params))
+        tool_input = value_for_schema(tool["name"], tool["input_schema"], canned)
+        return "tool", [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": tool["name"], "input": tool_input}]
+
+    if "Amani" in system:
+        kind, text = "chat", chat_reply(params)
+    elif "running clinical summary" in system:
+        kind, text = "summary", history_summary(params)
+    else:
+        briefing = canned_briefing(pick_narrative(params))
+        fields = ["ai_summary", "key_insights_flags", "reported_symptoms_structured", "relevant_history_surfaced", "equity_and_context_flags"]
+        kind, text = "json", json.dumps({key: briefing[key] for key in fields})
+
+    content = []
+    if params.get("thinking"):
+        content.append({
+            "type": "thinking",
+            "thinking": "The patient has answered; consider what the clinician still needs before asking the next question.",
+            "signature": "fake-signature"
+        })
+    content.append({"type": "text", "text": text})
+    return kind, content
+
+
+def usage_for(params: dict, content: list) -> dict:
+    """Token estimates, with cache reads for system prefixes this server has seen before"""
+    system = params.get("system") or ""
+    cached = isinstance(system, list) and any("cache_control" in block for block in system)
+    system_tokens = estimate_tokens(system_text(params))
+    input_tokens = estimate_tokens(json.dumps(params.get("messages", [])) + json.dumps(params.get("tools", [])))
+    output_tokens = sum(estimate_tokens(json.dumps(block)) for block in content)
+
+    usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+             "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+    if not cached:
+        usage["input_tokens"] += system_tokens
+        return usage
+
+    prefix = hashlib.sha256(system_text(params).encode()).hexdigest()
+    if prefix in cached_prefixes:
+        usage["cache_read_input_tokens"] = system_tokens
+    else:
+        cached_prefixes.add(prefix)
+        usage["cache_creation_input_tokens"] = system_tokens
+    return usage
+
+
+def canned_message(params: dict) -> dict:
+    kind, content = build_content(params)
+    stats[f"messages:{kind}"] += 1
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "fake"),
+        "content": content,
+        "stop_reason": "tool_use" if kind == "tool" else "end_turn",
+        "stop_sequence": None,
+        "usage": usage_for(params, content)
+    }
+
+
+def first_token_delay() -> float:
+    if LATENCY_MS <= 0:
+        return 0.0
+    return rng.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MS / 1000
+
+
+def output_delay(tokens: int) -> float:
+    return tokens / TOKENS_PER_SECOND if TOKENS_PER_SECOND > 0 else 0.0
+
+
+def injected_error():
+    """Rate-limit or overload response for a configured share of requests, else None"""
+    roll = rng.random()
+    if roll < RATE_LIMIT_RATE:
+        stats["injected:429"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(RETRY_AFTER_SECONDS)},
+            content={"type": "error", "error": {"type": "rate_limit_error", "message": "Fake rate limit"}}
+        )
+    if roll < RATE_LIMIT_RATE + OVERLOAD_RATE:
+        stats["injected:529"] += 1
+        return JSONResponse(
+            status_code=529,
+            content={"type": "error", "error": {"type": "overloaded_error", "message": "Fake overload"}}
+        )
+    return None
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def chunks(text: str, words: int = 4) -> list:
+    parts = re.findall(r"\S+\s*", text)
+    return ["".join(parts[i:i + words]) for i in range(0, len(parts), words)] or [text]
+
+
+async def stream_message(message: dict):
+    """Replay a finished message as Messages API stream events, paced at TOKENS_PER_SECOND"""
+    usage = message["usage"]
+    yield sse("message_start", {
+        "type": "message_start",
+        "message": {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1}}
+    })
+
+    for index, block in enumerate(message["content"]):
+        if block["type"] == "thinking":
+            yield sse("content_block_start", {"type": "content_block_start", "index": index,
+                                              "content_block": {"type": "thinking", "thinking": "", "signature": ""}})
+            for piece in chunks(block["thinking"]):
+                await asyncio.sleep(output_delay(estimate_tokens(piece)))
+                yield sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                  "delta": {"type": "thinking_delta", "thinking": piece}})
+            yield sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                              "delta": {"type": "signature_delta", "signature": block["signature"]}})
+        elif block["type"] == "text":
+            yield sse("content_block_start", {"type": "content_block_start", "index": index,
+                                              "content_block": {"type": "text", "text": ""}})
+            for piece in chunks(block["text"]):
+                await asyncio.sleep(output_delay(estimate_tokens(piece)))
+                yield sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                  "delta": {"type": "text_delta", "text": piece}})
+        else:
+            yield sse("content_block_start", {"type": "content_block_start", "index": index,
+                                              "content_block": {**block, "input": {}}})
+            yield sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                              "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}})
+        yield sse("content_block_stop", {"type": "content_block_stop", "index": index})
+
+    yield sse("message_delta", {"type": "message_delta",
+                                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+    yield sse("message_stop", {"type": "message_stop"})
+
+
+@app.post("/v1/messages")
+async def create_message(params: dict):
+    stats["requests"] += 1
+    await asyncio.sleep(first_token_delay())
+
+    error = injected_error()
+    if error is not None:
+        return error
+
+    message = canned_message(params)
+    if params.get("stream"):
+        stats["streams"] += 1
+        return StreamingResponse(stream_message(message), media_type="text/event-stream")
+
+    await asyncio.sleep(output_delay(message["usage"]["output_tokens"]))
+    return message
+
+
+@app.get("/fake/stats")
+async def fake_stats():
+    return dict(stats)
+
+
+def batch_object(batch_id: str, request: Request) -> dict:
+    batch = batches[batch_id]
+    ended = time.monotonic() - batch["created"] >= BATCH_SECONDS
+    total = len(batch["requests"])
+    created_at = datetime.fromisoformat(batch["created_at"])
+    return {
+        "id": batch_id,
+        "type": "message_batch",
+        "processing_status": "ended" if ended else "in_progress",
+        "request_counts": {
+            "processing": 0 if ended else total,
+            "succeeded": total if ended else 0,
+            "errored": 0,
+            "canceled": 0,
+            "expired": 0
+        },
+        "created_at": batch["created_at"],
+        "expires_at": (created_at + timedelta(hours=24)).isoformat(),
+        "ended_at": datetime.now(timezone.utc).isoformat() if ended else None,
+        "archived_at": None,
+        "cancel_initiated_at": None,
+        "results_url": str(request.url_for("batch_results", batch_id=batch_id)) if ended else None
+    }
+
+
+@app.post("/v1/messages/batches")
+async def create_batch(payload: dict, request: Request):
+    batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+    batches[batch_id] = {
+        "created": time.monotonic(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "requests": payload.get("requests", [])
+    }
+    return batch_object(batch_id, request)
+
+
+@app.get("/v1/messages/batches/{batch_id}")
+async def retrieve_batch(batch_id: str, request: Request):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_object(batch_id, request)
+
+
+@app.get("/v1/messages/batches/{batch_id}/results", name="batch_results")
+async def batch_results(batch_id: str):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    lines = []
+    for item in batches[batch_id]["requests"]:
+        lines.append(json.dumps({
+            "custom_id": item["custom_id"],
+            "result": {"type": "succeeded", "message": canned_message(item["params"])}
+        }))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="application/x-jsonl")
+
+
+def main():
+    global BATCH_SECONDS, LATENCY_MS, LATENCY_SIGMA, TOKENS_PER_SECOND
+    global RATE_LIMIT_RATE, OVERLOAD_RATE, RETRY_AFTER_SECONDS, INTAKE_TURNS, rng
+
+    parser = argparse.ArgumentParser(description="Run a local fake Anthropic API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--batch-seconds", type=float, default=BATCH_SECONDS, help="Time until a batch ends")
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS, help="Median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=LATENCY_SIGMA, help="Lognormal spread of the time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=TOKENS_PER_SECOND, help="Output pacing (0 = instant)")
+    parser.add_argument("--rate-limit-rate", type=float, default=RATE_LIMIT_RATE, help="Share of requests answered with 429")
+    parser.add_argument("--overload-rate", type=float, default=OVERLOAD_RATE, help="Share of requests answered with 529")
+    parser.add_argument("--retry-after", type=int, default=RETRY_AFTER_SECONDS, help="retry-after seconds on 429")
+    parser.add_argument("--intake-turns", type=int, default=INTAKE_TURNS, help="Patient replies before the empowerment question")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    BATCH_SECONDS = args.batch_seconds
+    LATENCY_MS = args.latency_ms
+    LATENCY_SIGMA = args.latency_sigma
+    TOKENS_PER_SECOND = args.tokens_per_second
+    RATE_LIMIT_RATE = args.rate_limit_rate
+    OVERLOAD_RATE = args.overload_rate
+    RETRY_AFTER_SECONDS = args.retry_after
+    INTAKE_TURNS = args.intake_turns
+    rng = random.Random(args.seed)
+
+    print(f"🧪 Fake Anthropic API on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the intake and synthesis endpoints.
+
+Each virtual user repeatedly runs a realistic intake: picks a seeded patient,
+starts a chat, answers with sentences from that patient's narratives in
+data/narratives.json (over /chat/continue or the streaming endpoint), answers
+the empowerment question, and optionally posts a narrative to /synthesize and
+waits for the background briefing job. Reports p50/p95/p99 latency, throughput
+and error rate per endpoint, and exits non-zero when --max-error-rate or
+--max-p95-ms is exceeded, so it can gate CI.
+
+Point the API at fake_anthropic_server.py so no API money is spent. With
+--spawn the script starts the fake server, the API and a briefing worker itself
+(the database must already be seeded with seed.py):
+
+    python seed.py
+    python load_test.py --spawn --users 20 --duration 60 --fake-args "--latency-ms 400 --rate-limit-rate 0.02"
+
+Or against servers you started yourself:
+
+    python fake_anthropic_server.py --port 8090 --latency-ms 400 --tokens-per-second 80 &
+    ANTHROPIC_BASE_URL=http://localhost:8090 uvicorn app.main:app --port 8000 &
+    ANTHROPIC_BASE_URL=http://localhost:8090 python briefing_worker.py &
+    python load_test.py --base-url http://localhost:8000 --users 20 --duration 60 --json-out load_test.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shlex
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import httpx
+
+from benchmark_concurrency import percentile
+
+NARRATIVES_FILE = Path(__file__).parent / "data" / "narratives.json"
+
+EMPOWERMENT_ANSWERS = [
+    "No, nothing in particular, thank you.",
+    "I'm Muslim and Ramadan starts soon, so I'll be fasting during the day.",
+    "The last doctor I saw didn't really listen to me, so I'm a bit nervous.",
+    "I'm nonbinary and I use they/them pronouns.",
+    "I prefer to try natural remedies my grandmother taught me before taking strong medication.",
+]
+FALLBACK_ANSWERS = [
+    "It started a few weeks ago.",
+    "It's a dull ache that comes and goes.",
+    "It gets worse in the evening.",
+    "I've also been more tired than usual.",
+]
+MAX_TURNS = 12
+
+
+class Recorder:
+    """Latency samples and outcomes per endpoint label"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+
+    def ok(self, label: str, seconds: float):
+        self.latencies[label].append(seconds)
+        self.outcomes[label]["ok"] += 1
+
+    def error(self, label: str, reason):
+        self.outcomes[label][str(reason)] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        report = {}
+        for label in sorted(self.outcomes):
+            latencies = self.latencies[label]
+            total = sum(self.outcomes[label].values())
+            errors = total - self.outcomes[label]["ok"]
+            report[label] = {
+                "requests": total,
+                "errors": errors,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "throughput_per_s": round(total / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "outcomes": dict(self.outcomes[label])
+            }
+        return report
+
+
+def patient_answers(narratives: list) -> list:
+    sentences = []
+    for narrative in narratives:
+        sentences += [s.strip() for s in re.split(r"(?<=[.!?])\s", narrative["narrative_text"]) if s.strip()]
+    return sentences or FALLBACK_ANSWERS
+
+
+async def timed_post(client: httpx.AsyncClient, recorder: Recorder, label: str, path: str, **kwargs):
+    """POST and record latency; returns the JSON body, or None on failure"""
+    started = time.perf_counter()
+    try:
+        response = await client.post(path, **kwargs)
+    except httpx.HTTPError as e:
+        recorder.error(label, type(e).__name__)
+        return None
+    if response.status_code >= 400:
+        recorder.error(label, response.status_code)
+        return None
+    recorder.ok(label, time.perf_counter() - started)
+    return response.json()
+
+
+async def stream_turn(client: httpx.AsyncClient, recorder: Recorder, payload: dict):
+    """Send a turn over SSE; records time to first text and total time. Returns the done event's data"""
+    started = time.perf_counter()
+    first_text = None
+    event, done = None, None
+    try:
+        async with client.stream("POST", "/api/chat/continue/stream", json=payload) as response:
+            if response.status_code >= 400:
+                recorder.error("POST /chat/continue/stream", response.status_code)
+                return None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line.split(":", 1)[1].strip()
+                elif line.startswith("data:"):
+                    if event == "text" and first_text is None:
+                        first_text = time.perf_counter() - started
+                    elif event == "done":
+                        done = json.loads(line.split(":", 1)[1])
+                    elif event == "error":
+                        recorder.error("POST /chat/continue/stream", "sse_error")
+                        return None
+    except httpx.HTTPError as e:
+        recorder.error("POST /chat/continue/stream", type(e).__name__)
+        return None
+
+    if done is None:
+        recorder.error("POST /chat/continue/stream", "no_done_event")
+        return None
+    recorder.ok("POST /chat/continue/stream", time.perf_counter() - started)
+    if first_text is not None:
+        recorder.ok("POST /chat/continue/stream (first text)", first_text)
+    return done
+
+
+async def wait_for_briefing(client: httpx.AsyncClient, recorder: Recorder, job_id: str, started: float, timeout: float):
+    """Poll the briefing job; records time from intake completion to a stored briefing"""
+    label = "briefing job (end-to-end)"
+    while time.perf_counter() - started < timeout:
+        try:
+            response = await client.get(f"/api/briefing-jobs/{job_id}")
+        except httpx.HTTPError as e:
+            recorder.error(label, type(e).__name__)
+            return
+        status = response.json().get("status") if response.status_code == 200 else None
+        if status == "succeeded":
+            recorder.ok(label, time.perf_counter() - started)
+            return
+        if status == "failed":
+            recorder.error(label, "failed")
+            return
+        await asyncio.sleep(0.5)
+    recorder.error(label, "timeout")
+
+
+async def intake(client, recorder, rng, patient_id, narratives, args):
+    start = await timed_post(client, recorder, "POST /chat/start", "/api/chat/start", json={"patient_id": patient_id})
+    if start is None:
+        return
+
+    answers = patient_answers(narratives)
+    streaming = rng.random() < args.stream_ratio
+    previous_ai = start["initial_message"]["content"]
+    for turn in range(MAX_TURNS):
+        if "personal beliefs, cultural background" in previous_ai:
+            message = rng.choice(EMPOWERMENT_ANSWERS)
+        else:
+            message = answers[turn % len(answers)]
+        payload = {"conversation_id": start["conversation_id"], "user_message": message}
+        if args.think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+
+        if streaming:
+            result = await stream_turn(client, recorder, payload)
+        else:
+            result = await timed_post(client, recorder, "POST /chat/continue", "/api/chat/continue", json=payload)
+        if result is None:
+            return
+
+        previous_ai = result["ai_message"]["content"]
+        if result["is_complete"]:
+            if args.wait_briefings and result.get("briefing_job_id"):
+                await wait_for_briefing(client, recorder, result["briefing_job_id"], time.perf_counter(), args.briefing_timeout)
+            return
+    recorder.error("intake", "did_not_complete")
+
+
+async def virtual_user(client, recorder, rng, patients, narratives_by_patient, deadline, args):
+    while time.perf_counter() < deadline:
+        patient_id = rng.choice(patients)
+        narratives = narratives_by_patient.get(patient_id, [])
+        await intake(client, recorder, rng, patient_id, narratives, args)
+
+        if narratives and rng.random() < args.synthesize_ratio:
+            headers = {} if args.synthesize_cache else {"Cache-Control": "no-cache"}
+            await timed_post(
+                client, recorder, "POST /synthesize", "/api/synthesize",
+                json={"patient_id": patient_id, "narrative": rng.choice(narratives)["narrative_text"]},
+                headers=headers
+            )
+
+
+async def run(args) -> dict:
+    with open(NARRATIVES_FILE) as f:
+        narratives_by_patient = defaultdict(list)
+        for narrative in json.load(f):
+            narratives_by_patient[narrative["patient_id"]].append(narrative)
+
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.request_timeout) as client:
+        response = await client.get("/api/patients", params={"limit": 100})
+        response.raise_for_status()
+        patients = [patient["patient_id"] for patient in response.json()["items"]]
+        if not patients:
+            sys.exit("✗ No patients in the database; run seed.py first")
+
+        recorder = Recorder()
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            virtual_user(client, recorder, random.Random(rng.random()), patients, narratives_by_patient, deadline, args)
+            for _ in range(args.users)
+        ])
+        elapsed = time.perf_counter() - started
+
+        report = {"users": args.users, "duration_s": round(elapsed, 1), "endpoints": recorder.summary(elapsed)}
+        if args.fake_url:
+            try:
+                report["fake_anthropic"] = (await client.get(f"{args.fake_url}/fake/stats")).json()
+            except httpx.HTTPError:
+                pass
+        return report
+
+
+def print_report(report: dict):
+    print(f"\n📊 {report['users']} users for {report['duration_s']}s\n")
+    print(f"{'endpoint':<42} {'reqs':>6} {'req/s':>7} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, stats in report["endpoints"].items():
+        print(f"{label:<42} {stats['requests']:>6} {stats['throughput_per_s']:>7.2f} {stats['error_rate'] * 100:>5.1f}% "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+        errors = {k: v for k, v in stats["outcomes"].items() if k != "ok"}
+        if errors:
+            print(f"{'':<42} errors: " + ", ".join(f"{k}={v}" for k, v in errors.items()))
+    if "fake_anthropic" in report:
+        print("\nFake Anthropic API: " + ", ".join(f"{k}={v}" for k, v in sorted(report["fake_anthropic"].items())))
+
+
+def check_thresholds(report: dict, max_error_rate: float, max_p95_ms: float) -> list:
+    failures = []
+    for label, stats in report["endpoints"].items():
+        if max_error_rate is not None and stats["error_rate"] > max_error_rate:
+            failures.append(f"{label}: error rate {stats['error_rate'] * 100:.1f}% > {max_error_rate * 100:.1f}%")
+        # Briefing jobs measure background work, not a request the user waits on
+        if max_p95_ms is not None and not label.startswith("briefing job") and stats["p95_ms"] > max_p95_ms:
+            failures.append(f"{label}: p95 {stats['p95_ms']:.0f} ms > {max_p95_ms:.0f} ms")
+    return failures
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn_stack(args) -> list:
+    """Start the fake Anthropic API, the API and a briefing worker pointed at it"""
+    backend = Path(__file__).parent
+    env = {
+        **os.environ,
+        "ANTHROPIC_BASE_URL": args.fake_url,
+        "ANTHROPIC_API_KEY": os.environ.get("ANTHROPIC_API_KEY", "load-test"),
+    }
+    fake_port = args.fake_url.rsplit(":", 1)[1]
+    api_port = args.base_url.rsplit(":", 1)[1]
+
+    processes = [subprocess.Popen(
+        [sys.executable, "fake_anthropic_server.py", "--port", fake_port] + shlex.split(args.fake_args),
+        cwd=backend
+    )]
+    wait_until_up(f"{args.fake_url}/fake/stats")
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", api_port, "--log-level", "warning"],
+        cwd=backend, env=env
+    ))
+    processes.append(subprocess.Popen([sys.executable, "briefing_worker.py"], cwd=backend, env=env))
+    wait_until_up(f"{args.base_url}/health")
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test intake chat and synthesis end to end")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual patients")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to keep starting intakes")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="Share of intakes that use the SSE endpoint")
+    parser.add_argument("--synthesize-ratio", type=float, default=0.3, help="Share of intakes followed by /synthesize")
+    parser.add_argument("--synthesize-cache", action="store_true", help="Allow /synthesize cache hits")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds a patient takes to reply")
+    parser.add_argument("--wait-briefings", action="store_true", help="Poll each briefing job until it finishes")
+    parser.add_argument("--briefing-timeout", type=float, default=120.0)
+    parser.add_argument("--request-timeout", type=float, default=180.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json-out", type=Path, help="Also write the report as JSON")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if any endpoint's error rate exceeds this (0-1)")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if any endpoint's p95 latency exceeds this")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake Anthropic API, the API and a worker")
+    parser.add_argument("--fake-url", help="Fake Anthropic API to read stats from (default with --spawn: http://127.0.0.1:8090)")
+    parser.add_argument("--fake-args", default="", help="Extra fake_anthropic_server.py arguments for --spawn")
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        args.fake_url = args.fake_url or "http://127.0.0.1:8090"
+        args.wait_briefings = True
+        processes = spawn_stack(args)
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    print_report(report)
+    if args.json_out:
+        args.json_out.write_text(json.dumps(report, indent=2))
+
+    failures = check_thresholds(report, args.max_error_rate, args.max_p95_ms)
+    if failures:
+        print("\n✗ Thresholds exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\n✓ Within thresholds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Review and refresh workflow for the equity knowledge store.
+
+Conversation synthesis asks the model for equity dimension keys and patient-specific
+reasoning only; the latest approved recommendation block for each key is spliced in
+from the equity_recommendations table. Dimensions without approved guidance are
+queued here as drafts (with the model's first recommendation and a request count),
+and nothing reaches a briefing from the store until a reviewer approves it.
+
+Running servers cache the approved catalogue for EQUITY_KNOWLEDGE_TTL_SECONDS, so
+approvals and retirements take effect within that window.
+
+Usage:
+    python manage_equity_knowledge.py seed                       # data/equity_recommendations.json as drafts
+    python manage_equity_knowledge.py list --status draft        # review queue, most requested first
+    python manage_equity_knowledge.py show religion:islam-ramadan-fasting
+    python manage_equity_knowledge.py approve religion:islam-ramadan-fasting --version 2 --reviewer "Dr. Okafor"
+    python manage_equity_knowledge.py retire religion:islam-ramadan-fasting --reviewer "Dr. Okafor"
+    python manage_equity_knowledge.py propose edited.json        # reviewer-edited text as new draft versions
+    python manage_equity_knowledge.py refresh religion:islam-ramadan-fasting   # model-revised draft
+    python manage_equity_knowledge.py stale --max-age-days 180   # approved entries due for re-review
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app.db.database import engine
+from app.models.patient import EquityRecommendation
+from app.core.equity_knowledge import (
+    normalize_dimension_key, generate_refreshed_recommendation, STATUS_DRAFT, STATUS_APPROVED, STATUS_RETIRED
+)
+
+DEFAULT_SEED_FILE = Path(__file__).parent / "data" / "equity_recommendations.json"
+
+
+def latest_entry(db: Session, dimension_key: str, status: str = None):
+    query = select(EquityRecommendation).where(EquityRecommendation.dimension_key == dimension_key)
+    if status:
+        query = query.where(EquityRecommendation.status == status)
+    return db.scalars(query.order_by(EquityRecommendation.version.desc()).limit(1)).first()
+
+
+def add_draft(db: Session, item: dict, source: str) -> EquityRecommendation:
+    """Store a recommendation block as the next draft version of its dimension"""
+    key = normalize_dimension_key(item["dimension_key"])
+    latest = latest_entry(db, key)
+    entry = EquityRecommendation(
+        dimension_key=key,
+        version=(latest.version + 1) if latest else 1,
+        label=item.get("label") or (latest.label if latest else key),
+        flag_type=item.get("flag_type") or (latest.flag_type if latest else None),
+        recommendation=item["recommendation"],
+        status=STATUS_DRAFT,
+        source=source,
+        times_requested=0
+    )
+    db.add(entry)
+    return entry
+
+
+def seed(db: Session, path: Path):
+    with open(path) as f:
+        items = json.load(f)
+
+    added = 0
+    for item in items:
+        if latest_entry(db, normalize_dimension_key(item["dimension_key"])):
+            continue
+        add_draft(db, item, "curated")
+        added += 1
+    db.commit()
+    print(f"✓ Added {added} curated drafts ({len(items) - added} already present). Approve them after clinical review.")
+
+
+def list_entries(db: Session, status: str = None):
+    query = select(EquityRecommendation)
+    if status:
+        query = query.where(EquityRecommendation.status == status)
+    entries = db.scalars(query.order_by(
+        EquityRecommendation.times_requested.desc(),
+        EquityRecommendation.dimension_key,
+        EquityRecommendation.version
+    )).all()
+
+    print(f"{'dimension':<45} {'ver':>3} {'status':<9} {'source':<10} {'requests':>8} {'text':<5} reviewed")
+    for entry in entries:
+        reviewed = f"{entry.reviewed_at:%Y-%m-%d} by {entry.reviewed_by}" if entry.reviewed_at else "-"
+        print(f"{entry.dimension_key:<45} {entry.version:>3} {entry.status:<9} {entry.source:<10} "
+              f"{entry.times_requested:>8} {'yes' if entry.recommendation else 'no':<5} {reviewed}")
+    print(f"\n{len(entries)} entries")
+
+
+def show(db: Session, dimension_key: str, version: int = None):
+    entry = get_entry(db, dimension_key, version)
+    print(json.dumps({
+        "dimension_key": entry.dimension_key,
+        "version": entry.version,
+        "label": entry.label,
+        "flag_type": entry.flag_type,
+        "status": entry.status,
+        "source": entry.source,
+        "review_notes": entry.review_notes,
+        "recommendation": entry.recommendation
+    }, indent=2))
+
+
+def get_entry(db: Session, dimension_key: str, version: int = None) -> EquityRecommendation:
+    key = normalize_dimension_key(dimension_key)
+    entry = db.get(EquityRecommendation, (key, version)) if version else latest_entry(db, key)
+    if not entry:
+        sys.exit(f"✗ No entry for {key}" + (f" version {version}" if version else ""))
+    return entry
+
+
+def approve(db: Session, dimension_key: str, version: int, reviewer: str, notes: str = None):
+    """Approve one version; any previously approved version of the dimension is retired"""
+    entry = get_entry(db, dimension_key, version)
+    if not entry.recommendation:
+        sys.exit(f"✗ {entry.dimension_key} v{entry.version} has no recommendation text; use propose or refresh first")
+
+    now = datetime.now(timezone.utc)
+    for previous in db.scalars(select(EquityRecommendation).where(
+        EquityRecommendation.dimension_key == entry.dimension_key,
+        EquityRecommendation.status == STATUS_APPROVED,
+        EquityRecommendation.version != entry.version
+    )):
+        previous.status = STATUS_RETIRED
+
+    entry.status = STATUS_APPROVED
+    entry.reviewed_by = reviewer
+    entry.reviewed_at = now
+    entry.review_notes = notes
+    db.commit()
+    print(f"✓ Approved {entry.dimension_key} v{entry.version}")
+
+
+def retire(db: Session, dimension_key: str, reviewer: str, notes: str = None):
+    """Stop splicing a dimension; syntheses fall back to model-written recommendations for it"""
+    key = normalize_dimension_key(dimension_key)
+    entries = db.scalars(select(EquityRecommendation).where(
+        EquityRecommendation.dimension_key == key,
+        EquityRecommendation.status != STATUS_RETIRED
+    )).all()
+    for entry in entries:
+        entry.status = STATUS_RETIRED
+        entry.reviewed_by = reviewer
+        entry.reviewed_at = datetime.now(timezone.utc)
+        entry.review_notes = notes
+    db.commit()
+    print(f"✓ Retired {len(entries)} versions of {key}")
+
+
+def propose(db: Session, path: Path):
+    with open(path) as f:
+        items = json.load(f)
+    if isinstance(items, dict):
+        items = [items]
+    for item in items:
+        entry = add_draft(db, item, "curated")
+        print(f"  • {entry.dimension_key} v{entry.version}")
+    db.commit()
+    print(f"✓ Stored {len(items)} drafts for review")
+
+
+def refresh(db: Session, dimension_key: str):
+    """Have the model revise the current text (or write it from scratch) as a new draft version"""
+    key = normalize_dimension_key(dimension_key)
+    current = latest_entry(db, key, STATUS_APPROVED) or latest_entry(db, key)
+    if not current:
+        sys.exit(f"✗ No entry for {key}")
+
+    print(f"🔄 Refreshing {key} from v{current.version}...")
+    recommendation = asyncio.run(generate_refreshed_recommendation(key, current.label, current.recommendation))
+    entry = add_draft(db, {
+        "dimension_key": key,
+        "label": current.label,
+        "flag_type": current.flag_type,
+        "recommendation": recommendation
+    }, "refreshed")
+    db.commit()
+    print(f"✓ Stored {key} v{entry.version} as a draft; review it with: show {key} --version {entry.version}")
+
+
+def stale(db: Session, max_age_days: int):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    entries = db.scalars(select(EquityRecommendation).where(
+        EquityRecommendation.status == STATUS_APPROVED,
+        func.coalesce(EquityRecommendation.reviewed_at, EquityRecommendation.created_at) < cutoff
+    ).order_by(EquityRecommendation.reviewed_at)).all()
+
+    for entry in entries:
+        print(f"  • {entry.dimension_key} v{entry.version}, last reviewed {entry.reviewed_at:%Y-%m-%d} by {entry.reviewed_by}")
+    print(f"{len(entries)} approved entries not reviewed in {max_age_days} days")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review and refresh equity recommendation blocks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="Load curated entries as drafts")
+    seed_parser.add_argument("--file", type=Path, default=DEFAULT_SEED_FILE)
+
+    list_parser = commands.add_parser("list", help="List entries, most requested first")
+    list_parser.add_argument("--status", choices=[STATUS_DRAFT, STATUS_APPROVED, STATUS_RETIRED])
+
+    show_parser = commands.add_parser("show", help="Print one entry as JSON")
+    show_parser.add_argument("dimension_key")
+    show_parser.add_argument("--version", type=int, help="Default: latest version")
+
+    approve_parser = commands.add_parser("approve", help="Approve a version for use in briefings")
+    approve_parser.add_argument("dimension_key")
+    approve_parser.add_argument("--version", type=int, help="Default: latest version")
+    approve_parser.add_argument("--reviewer", required=True)
+    approve_parser.add_argument("--notes")
+
+    retire_parser = commands.add_parser("retire", help="Stop using a dimension's stored text")
+    retire_parser.add_argument("dimension_key")
+    retire_parser.add_argument("--reviewer", required=True)
+    retire_parser.add_argument("--notes")
+
+    propose_parser = commands.add_parser("propose", help="Store edited entries from a JSON file as drafts")
+    propose_parser.add_argument("file", type=Path)
+
+    refresh_parser = commands.add_parser("refresh", help="Generate a revised draft with the model")
+    refresh_parser.add_argument("dimension_key")
+
+    stale_parser = commands.add_parser("stale", help="List approved entries due for re-review")
+    stale_parser.add_argument("--max-age-days", type=int, default=180)
+
+    args = parser.parse_args()
+
+    with Session(engine) as db:
+        if args.command == "seed":
+            seed(db, args.file)
+        elif args.command == "list":
+            list_entries(db, args.status)
+        elif args.command == "show":
+            show(db, args.dimension_key, args.version)
+        elif args.command == "approve":
+            approve(db, args.dimension_key, args.version, args.reviewer, args.notes)
+        elif args.command == "retire":
+            retire(db, args.dimension_key, args.reviewer, args.notes)
+        elif args.command == "propose":
+            propose(db, args.file)
+        elif args.command == "refresh":
+            refresh(db, args.dimension_key)
+        elif args.command == "stale":
+            stale(db, args.max_age_days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Database migration script to index briefings by patient.
+
+The patient roster aggregates the latest briefing per patient in a single
+grouped query; this index lets Postgres answer that without scanning the
+whole briefings table.
+
+Usage:
+    python migrate_add_briefing_patient_index.py
+"""
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+import sys
+
+
+def migrate():
+    """Create the (patient_id, created_at) index on briefings if it doesn't exist."""
+
+    try:
+        engine = create_engine(settings.DATABASE_URL)
+
+        print("Creating index on briefings(patient_id, created_at)...")
+
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_briefings_patient_id_created_at "
+                    "ON briefings (patient_id, created_at DESC)"
+                ))
+
+        print("✓ Migration complete!")
+        return True
+
+    except Exception as e:
+        print(f"✗ Migration failed: {str(e)}", file=sys.stderr)
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,111 @@
+"""
+Database migration script to move chat histories into the chat_messages table.
+
+Each turn used to rewrite the whole JSON messages array on chat_conversations; it now
+appends rows to chat_messages, keyed by (conversation_id, seq). This adds the
+message_count column and the table, then copies existing JSON histories into rows in
+small batches and empties the JSON column.
+
+The copy is safe to run while the API is serving traffic: each batch locks only the
+conversations it copies (FOR UPDATE SKIP LOCKED), conversations not yet copied are
+still read from JSON, and a conversation that takes a turn first is moved into rows by
+that turn. It can be stopped and re-run at any time.
+
+Older API versions only know the JSON column, so add the schema, deploy, then copy:
+
+Usage:
+    python migrate_add_chat_messages.py --schema-only   # before deploying
+    python migrate_add_chat_messages.py                  # once every API worker and briefing worker runs the new code
+    python migrate_add_chat_messages.py --batch-size 200
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import create_engine, text, select, func
+from sqlalchemy.orm import Session, undefer
+from app.core.config import settings
+from app.models.patient import ChatConversation, ConversationMessage
+
+
+def add_schema(engine):
+    with engine.connect() as connection:
+        with connection.begin():
+            connection.execute(text(
+                "ALTER TABLE chat_conversations "
+                "ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0"
+            ))
+    ConversationMessage.__table__.create(engine, checkfirst=True)
+
+
+def copy_histories(engine, batch_size: int) -> int:
+    """Copy JSON histories into chat_messages, one committed batch at a time"""
+    copied = 0
+    with Session(engine) as db:
+        while True:
+            conversations = db.scalars(
+                select(ChatConversation)
+                .options(undefer(ChatConversation.legacy_messages))
+                .where(
+                    ChatConversation.message_count == 0,
+                    func.json_array_length(ChatConversation.legacy_messages) > 0
+                )
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not conversations:
+                return copied
+
+            for conversation in conversations:
+                db.add_all([
+                    ConversationMessage(
+                        conversation_id=conversation.conversation_id,
+                        seq=seq,
+                        role=msg["role"],
+                        content=msg["content"]
+                    )
+                    for seq, msg in enumerate(conversation.legacy_messages)
+                ])
+                conversation.message_count = len(conversation.legacy_messages)
+                conversation.legacy_messages = []
+            db.commit()
+
+            copied += len(conversations)
+            print(f"  • {copied} conversations copied")
+
+
+def migrate(batch_size: int, schema_only: bool = False):
+    """Add chat_messages and move existing histories into it."""
+
+    try:
+        engine = create_engine(settings.DATABASE_URL)
+
+        print("Adding chat_messages table and chat_conversations.message_count...")
+        add_schema(engine)
+        if schema_only:
+            print("✓ Schema added. Run again without --schema-only after deploying to copy histories.")
+            return True
+
+        print("Copying JSON chat histories into chat_messages...")
+        copied = copy_histories(engine, batch_size)
+
+        print(f"✓ Migration complete! {copied} conversations copied.")
+        return True
+
+    except Exception as e:
+        print(f"✗ Migration failed: {str(e)}", file=sys.stderr)
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move chat histories into the chat_messages table")
+    parser.add_argument("--batch-size", type=int, default=100, help="Conversations per transaction")
+    parser.add_argument("--schema-only", action="store_true", help="Only add the table and column")
+    args = parser.parse_args()
+
+    success = migrate(args.batch_size, args.schema_only)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,46 @@
+"""
+Database migration script to add rolling history summaries to chat conversations.
+
+Long intakes fold older turns into a running summary so each chat turn sends a
+bounded amount of history. The summary covers the first summarized_message_count
+messages of the conversation.
+
+Usage:
+    python migrate_add_conversation_summary.py
+"""
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+import sys
+
+
+def migrate():
+    """Add history_summary and summarized_message_count to chat_conversations if they don't exist."""
+
+    try:
+        engine = create_engine(settings.DATABASE_URL)
+
+        print("Adding history summary columns to chat_conversations...")
+
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS history_summary VARCHAR"
+                ))
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS summarized_message_count INTEGER NOT NULL DEFAULT 0"
+                ))
+
+        print("✓ Migration complete!")
+        return True
+
+    except Exception as e:
+        print(f"✗ Migration failed: {str(e)}", file=sys.stderr)
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate()
+    sys.exit(0 if success else 1)
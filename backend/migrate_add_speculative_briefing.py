@@ -0,0 +1,49 @@
+"""
+Database migration script to store speculative briefing sections on chat conversations.
+
+The clinical half of a briefing is synthesized as soon as the empowerment question
+is asked; the result is kept on the conversation until the intake completes.
+
+Usage:
+    python migrate_add_speculative_briefing.py
+"""
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+import sys
+
+
+def migrate():
+    """Add the speculative briefing columns to chat_conversations if they don't exist."""
+
+    try:
+        engine = create_engine(settings.DATABASE_URL)
+
+        print("Adding speculative briefing columns to chat_conversations...")
+
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS speculative_briefing JSON"
+                ))
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS speculative_message_count INTEGER"
+                ))
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS speculative_input_hash VARCHAR"
+                ))
+
+        print("✓ Migration complete!")
+        return True
+
+    except Exception as e:
+        print(f"✗ Migration failed: {str(e)}", file=sys.stderr)
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate()
+    sys.exit(0 if success else 1)
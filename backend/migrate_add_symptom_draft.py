@@ -0,0 +1,46 @@
+"""
+Database migration script to add per-turn symptom drafts to chat conversations.
+
+Each chat turn updates a structured OPQRST symptom draft; the final synthesis reads
+it instead of re-reading the raw transcript. symptom_draft_message_count records how
+many messages the draft covers.
+
+Usage:
+    python migrate_add_symptom_draft.py
+"""
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+import sys
+
+
+def migrate():
+    """Add symptom_draft and symptom_draft_message_count to chat_conversations if they don't exist."""
+
+    try:
+        engine = create_engine(settings.DATABASE_URL)
+
+        print("Adding symptom draft columns to chat_conversations...")
+
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS symptom_draft JSON"
+                ))
+                connection.execute(text(
+                    "ALTER TABLE chat_conversations "
+                    "ADD COLUMN IF NOT EXISTS symptom_draft_message_count INTEGER NOT NULL DEFAULT 0"
+                ))
+
+        print("✓ Migration complete!")
+        return True
+
+    except Exception as e:
+        print(f"✗ Migration failed: {str(e)}", file=sys.stderr)
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Pre-generate clinical briefings for the next day's appointments.
+
+Finds scheduled appointments on the target date whose patient has no current
+briefing, submits one synthesis prompt per patient (built with
+build_synthesis_prompt from their latest narrative) as a single Anthropic
+Message Batch, polls until the batch ends, and bulk-inserts the resulting
+briefings. Requests and results use SYNTHESIS_OUTPUT_MODE, like the API, and
+each result is validated against the briefing schema; results that fail are
+counted and skipped (there is no repair call in a batch).
+
+A briefing is "current" if it was created after the patient's EHR was last
+updated and within --max-age-days.
+
+Usage:
+    python pregenerate_briefings.py                      # tomorrow, run once
+    python pregenerate_briefings.py --date 2025-03-14
+    python pregenerate_briefings.py --daily-at 02:00     # run every night
+    python pregenerate_briefings.py --dry-run
+
+Point ANTHROPIC_BASE_URL at fake_anthropic_server.py to run offline.
+"""
+import argparse
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from anthropic import Anthropic
+from sqlalchemy import select, and_, exists
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import engine
+from app.models.patient import Patient, EHRHistory, PatientNarrative, ClinicalBriefing, Appointment
+from app.api.synthesize import build_synthesis_prompt, SYNTHESIS_MODEL
+from app.core.structured import parse_briefing_message, tool_request_params
+
+
+def day_bounds(target: date):
+    """Start and end of a local calendar day, as aware datetimes"""
+    start = datetime.combine(target, datetime.min.time()).astimezone()
+    return start, start + timedelta(days=1)
+
+
+def find_patients_needing_briefings(db: Session, target: date, max_age_days: int) -> list:
+    """Return (patient, ehr, narrative) for scheduled patients on the target date without a current briefing"""
+    start, end = day_bounds(target)
+    max_age_cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+
+    current_briefing = exists().where(
+        and_(
+            ClinicalBriefing.patient_id == Patient.patient_id,
+            ClinicalBriefing.created_at >= EHRHistory.updated_at,
+            ClinicalBriefing.created_at >= max_age_cutoff
+        )
+    )
+
+    # Latest narrative per patient
+    latest_narrative = (
+        select(PatientNarrative.narrative_id)
+        .where(PatientNarrative.patient_id == Patient.patient_id)
+        .order_by(PatientNarrative.created_at.desc())
+        .limit(1)
+        .correlate(Patient)
+        .scalar_subquery()
+    )
+
+    rows = db.execute(
+        select(Patient, EHRHistory, PatientNarrative)
+        .join(EHRHistory, EHRHistory.patient_id == Patient.patient_id)
+        .join(PatientNarrative, PatientNarrative.narrative_id == latest_narrative)
+        .where(
+            Patient.patient_id.in_(
+                select(Appointment.patient_id).where(
+                    and_(
+                        Appointment.appointment_date_time >= start,
+                        Appointment.appointment_date_time < end,
+                        Appointment.appointment_status == "scheduled"
+                    )
+                )
+            ),
+            ~current_briefing
+        )
+    ).all()
+
+    return rows
+
+
+def submit_batch(client: Anthropic, rows: list):
+    """Submit one synthesis request per patient as a single Message Batch"""
+    requests = []
+    for patient, ehr, narrative in rows:
+        params = {
+            "model": SYNTHESIS_MODEL,
+            "max_tokens": 2000,
+            "temperature": 0.3,
+            "messages": [
+                {"role": "user", "content": build_synthesis_prompt(patient, ehr, narrative.narrative_text)}
+            ]
+        }
+        if settings.SYNTHESIS_OUTPUT_MODE == "tool":
+            params = tool_request_params(params)
+        requests.append({"custom_id": patient.patient_id, "params": params})
+    return client.messages.batches.create(requests=requests)
+
+
+def wait_for_batch(client: Anthropic, batch_id: str, poll_interval: float):
+    while True:
+        batch = client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        print(f"   ⏳ {batch.processing_status}: {counts.succeeded} succeeded, "
+              f"{counts.errored} errored, {counts.processing} processing")
+        if batch.processing_status == "ended":
+            return batch
+        time.sleep(poll_interval)
+
+
+def collect_briefings(client: Anthropic, batch_id: str) -> tuple[list, int]:
+    """Turn valid batch results into ClinicalBriefing rows; returns them and the number of failed items"""
+    briefings = []
+    failed = 0
+    for item in client.messages.batches.results(batch_id):
+        if item.result.type != "succeeded":
+            print(f"   ⚠️  {item.custom_id}: {item.result.type}")
+            failed += 1
+            continue
+
+        try:
+            briefing_data = parse_briefing_message(item.result.message, settings.SYNTHESIS_OUTPUT_MODE)
+            briefings.append(ClinicalBriefing(
+                briefing_id=f"BRIEF-{uuid.uuid4().hex[:10].upper()}",
+                patient_id=item.custom_id,
+                ai_summary=briefing_data["ai_summary"],
+                key_insights_flags=briefing_data["key_insights_flags"],
+                equity_and_context_flags=briefing_data.get("equity_and_context_flags", []),
+                reported_symptoms_structured=briefing_data["reported_symptoms_structured"],
+                relevant_history_surfaced=briefing_data["relevant_history_surfaced"]
+            ))
+        except ValueError as e:
+            print(f"   ⚠️  {item.custom_id}: unusable response ({str(e)[:200]})")
+            failed += 1
+
+    return briefings, failed
+
+
+def pregenerate(target: date, max_age_days: int, poll_interval: float, dry_run: bool = False):
+    print(f"🌙 Pre-generating briefings for appointments on {target.isoformat()}...")
+
+    db = Session(engine)
+    try:
+        rows = find_patients_needing_briefings(db, target, max_age_days)
+        print(f"   • {len(rows)} patients need a briefing")
+        if not rows or dry_run:
+            return
+
+        client = Anthropic(api_key=settings.ANTHROPIC_API_KEY, base_url=settings.ANTHROPIC_BASE_URL)
+        batch = submit_batch(client, rows)
+        print(f"📦 Submitted batch {batch.id}")
+
+        wait_for_batch(client, batch.id, poll_interval)
+        briefings, failed = collect_briefings(client, batch.id)
+
+        db.add_all(briefings)
+        db.commit()
+        print(f"✅ Inserted {len(briefings)} briefings")
+        if failed:
+            print(f"⚠️  {failed} of {len(rows)} requests failed; they will be retried on the next run")
+
+    except Exception as e:
+        print(f"❌ Pre-generation failed: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def seconds_until(daily_at: str) -> float:
+    hour, minute = (int(part) for part in daily_at.split(":"))
+    now = datetime.now()
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate briefings for upcoming appointments")
+    parser.add_argument("--date", type=date.fromisoformat, help="Appointment date (default: tomorrow)")
+    parser.add_argument("--max-age-days", type=int, default=30)
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--daily-at", help="Run every day at HH:MM local time instead of once")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which patients need briefings")
+    args = parser.parse_args()
+
+    if not args.daily_at:
+        pregenerate(args.date or date.today() + timedelta(days=1), args.max_age_days, args.poll_interval, args.dry_run)
+        return
+
+    while True:
+        wait = seconds_until(args.daily_at)
+        print(f"💤 Next run in {wait / 3600:.1f}h")
+        time.sleep(wait)
+        try:
+            pregenerate(date.today() + timedelta(days=1), args.max_age_days, args.poll_interval, args.dry_run)
+        except Exception:
+            # Keep the scheduler alive; tomorrow's run will pick up anything missed
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Replay recorded LLM traffic and compare runs for performance regressions.
+
+With LLM_RECORDING_DIR set, the API and the briefing worker append every Anthropic
+call (sampled by LLM_RECORDING_SAMPLE_RATE) to gzip JSONL files in that directory:
+call site, priority, timings, token usage, response shape and whether structured
+output was valid JSON. Patient text is replaced by same-length filler; static
+prompts are stored once under prompts/ and referenced by name.
+
+`run` re-sends the recorded requests through the LLM scheduler, keeping their
+inter-arrival times divided by --speed, and records the results in the same format
+in --out. Point it at the real API to measure a model, prompt or scheduler change,
+or at fake_anthropic_server.py (--base-url) to exercise the app side without cost.
+`compare` reports latency, token usage, cache hits and JSON validity per call site
+for a baseline and a candidate, and exits non-zero when the candidate regresses
+beyond the given thresholds.
+
+Note that replayed requests carry filler text, so response content (and output
+token counts) reflect the filler, not real patients; compare replays with replays.
+
+Usage:
+    python replay_llm_traffic.py run recordings/ --speed 10 --out replays/baseline
+    python replay_llm_traffic.py run recordings/ --speed 10 --current-prompts --out replays/new-prompts
+    python replay_llm_traffic.py run recordings/ --speed 100 --base-url http://localhost:8090 --out replays/fake
+    python replay_llm_traffic.py compare replays/baseline replays/new-prompts --max-p95-increase 20 --max-json-drop 2
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core import recording
+from app.core.recording import read_records, load_recorded_prompt, current_prompt_text
+from app.core.scheduler import llm_scheduler
+# Register the current static prompts
+import app.api.chat  # noqa: F401
+import app.core.equity_knowledge  # noqa: F401
+
+from benchmark_concurrency import percentile
+
+
+def recording_files(paths: list) -> list:
+    files = []
+    for path in map(Path, paths):
+        files += sorted(path.glob("*.jsonl.gz")) if path.is_dir() else [path]
+    return files
+
+
+def load(paths: list) -> list:
+    """Records from files or recording directories, each tagged with its prompts directory"""
+    records = []
+    for path in recording_files(paths):
+        for record in read_records([path]):
+            record["_dir"] = path.parent
+            records.append(record)
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def restore_content(blocks: list, directory: Path, current_prompts: bool) -> list:
+    restored = []
+    for block in blocks:
+        block = dict(block)
+        if block["type"] == "thinking":
+            # Redacted thinking no longer matches its signature
+            continue
+        if "prompt" in block:
+            text = current_prompt_text(block["prompt"]) if current_prompts else None
+            block["text"] = text or load_recorded_prompt(directory, block)
+            del block["prompt"], block["sha256"]
+        elif block["type"] == "tool_result" and isinstance(block.get("content"), list):
+            block["content"] = restore_content(block["content"], directory, current_prompts)
+        restored.append(block)
+    return restored
+
+
+def replay_params(record: dict, current_prompts: bool, model: str = None) -> dict:
+    """Messages API parameters for a recorded request"""
+    params = dict(record["request"])
+    if params.get("system"):
+        params["system"] = restore_content(params["system"], record["_dir"], current_prompts)
+    params["messages"] = [
+        {"role": message["role"], "content": restore_content(message["content"], record["_dir"], current_prompts)}
+        for message in params["messages"]
+    ]
+    if model:
+        params["model"] = model
+    return params
+
+
+async def replay_one(record: dict, params: dict, outcomes: dict):
+    try:
+        if record["stream"]:
+            async with llm_scheduler.stream(record["call_site"], record["priority"], **params) as stream:
+                async for _ in stream:
+                    pass
+        else:
+            await llm_scheduler.create(record["call_site"], record["priority"], **params)
+        outcomes["ok"] += 1
+    except HTTPException as e:
+        outcomes[f"http_{e.status_code}"] += 1
+    except Exception as e:
+        outcomes[type(e).__name__] += 1
+
+
+async def run(args):
+    records = [
+        record for record in load(args.recordings)
+        if record["response"] is not None and (not args.call_site or record["call_site"] in args.call_site)
+    ][:args.limit]
+    if not records:
+        sys.exit("✗ No successful calls to replay")
+
+    recording.llm_recorder.directory = Path(args.out)
+    recording.llm_recorder.sample_rate = 1.0
+    # Replayed calls are not production traffic; keep them out of the llm_calls table
+    settings.LLM_TELEMETRY_ENABLED = False
+
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"🔁 Replaying {len(records)} calls recorded over {span:.0f}s at {args.speed}x "
+          f"(about {span / args.speed:.0f}s) against {settings.ANTHROPIC_BASE_URL or 'the Anthropic API'}")
+
+    outcomes = defaultdict(int)
+    tasks = []
+    started = time.perf_counter()
+    for record in records:
+        delay = (record["ts"] - records[0]["ts"]) / args.speed - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        params = replay_params(record, args.current_prompts, args.model)
+        tasks.append(asyncio.create_task(replay_one(record, params, outcomes)))
+    await asyncio.gather(*tasks)
+
+    recording.llm_recorder.flush()
+    print(f"✓ Done in {time.perf_counter() - started:.1f}s: {dict(outcomes)}")
+    print(f"  Results in {args.out}; compare with: python replay_llm_traffic.py compare BASELINE {args.out}")
+
+
+def summarize(records: list) -> dict:
+    """Per-call-site latency, token, cache and JSON-validity figures"""
+    by_site = defaultdict(list)
+    for record in records:
+        by_site[record["call_site"]].append(record)
+        by_site["(all)"].append(record)
+
+    summary = {}
+    for site, site_records in sorted(by_site.items()):
+        done = [record for record in site_records if record["response"] is not None]
+        latencies = [record["latency_ms"] for record in done]
+        first_events = [record["first_event_ms"] for record in done if record["first_event_ms"] is not None]
+        usage = [record["response"]["usage"] for record in done]
+        prompt_tokens = sum(u["input_tokens"] + u["cache_read_input_tokens"] + u["cache_creation_input_tokens"] for u in usage)
+        validity = [record["response"]["valid_json"] for record in done if record["response"]["valid_json"] is not None]
+        summary[site] = {
+            "calls": len(site_records),
+            "error_pct": 100 * (len(site_records) - len(done)) / len(site_records),
+            "p50_ms": percentile(latencies, 50) if latencies else None,
+            "p95_ms": percentile(latencies, 95) if latencies else None,
+            "first_event_p50_ms": percentile(first_events, 50) if first_events else None,
+            "queue_p95_ms": percentile([record["queue_ms"] for record in site_records], 95),
+            "input_tokens": prompt_tokens / len(done) if done else None,
+            "output_tokens": sum(u["output_tokens"] for u in usage) / len(done) if done else None,
+            "cache_read_pct": 100 * sum(u["cache_read_input_tokens"] for u in usage) / prompt_tokens if prompt_tokens else None,
+            "valid_json_pct": 100 * sum(validity) / len(validity) if validity else None
+        }
+    return summary
+
+
+def format_value(value, delta=None) -> str:
+    if value is None:
+        return "-"
+    text = f"{value:.1f}"
+    if delta is not None:
+        text += f" ({delta:+.1f})"
+    return text
+
+
+def compare(args) -> int:
+    baseline = summarize(load([args.baseline]))
+    candidate = summarize(load([args.candidate]))
+    metrics = ["calls", "error_pct", "p50_ms", "p95_ms", "first_event_p50_ms", "queue_p95_ms",
+               "input_tokens", "output_tokens", "cache_read_pct", "valid_json_pct"]
+
+    print(f"{'call site':<28} {'metric':<20} {'baseline':>12} {'candidate':>22}")
+    failures = []
+    for site in sorted(set(baseline) | set(candidate)):
+        before, after = baseline.get(site, {}), candidate.get(site, {})
+        for metric in metrics:
+            old, new = before.get(metric), after.get(metric)
+            delta = new - old if old is not None and new is not None else None
+            print(f"{site:<28} {metric:<20} {format_value(old):>12} {format_value(new, delta):>22}")
+
+        old_p95, new_p95 = before.get("p95_ms"), after.get("p95_ms")
+        if args.max_p95_increase is not None and old_p95 and new_p95 and new_p95 > old_p95 * (1 + args.max_p95_increase / 100):
+            failures.append(f"{site}: p95 latency {old_p95:.0f}ms -> {new_p95:.0f}ms")
+        old_valid, new_valid = before.get("valid_json_pct"), after.get("valid_json_pct")
+        if args.max_json_drop is not None and old_valid is not None and new_valid is not None and old_valid - new_valid > args.max_json_drop:
+            failures.append(f"{site}: valid JSON {old_valid:.1f}% -> {new_valid:.1f}%")
+        print()
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"baseline": baseline, "candidate": candidate}, f, indent=2)
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded LLM traffic and compare runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Re-send recorded calls and record the results")
+    run_parser.add_argument("recordings", nargs="+", help="Recording files or directories")
+    run_parser.add_argument("--out", required=True, help="Directory for the replay's records")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="Time compression, e.g. 1, 10 or 100")
+    run_parser.add_argument("--current-prompts", action="store_true", help="Send this build's static prompts instead of the recorded ones")
+    run_parser.add_argument("--model", help="Send every call to this model instead of the recorded one")
+    run_parser.add_argument("--call-site", action="append", help="Only replay these call sites (repeatable)")
+    run_parser.add_argument("--limit", type=int, help="Replay at most this many calls")
+    run_parser.add_argument("--base-url", help="Anthropic-compatible upstream, e.g. fake_anthropic_server.py")
+
+    compare_parser = commands.add_parser("compare", help="Compare a candidate run against a baseline")
+    compare_parser.add_argument("baseline", help="Recording or replay file or directory")
+    compare_parser.add_argument("candidate", help="Recording or replay file or directory")
+    compare_parser.add_argument("--max-p95-increase", type=float, help="Fail if any call site's p95 latency grows by more than this percentage")
+    compare_parser.add_argument("--max-json-drop", type=float, help="Fail if any call site's valid JSON rate drops by more than this many points")
+    compare_parser.add_argument("--json-out", help="Write both summaries to this file")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.base_url:
+            settings.ANTHROPIC_BASE_URL = args.base_url
+        asyncio.run(run(args))
+    elif args.command == "compare":
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
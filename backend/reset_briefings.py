@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Reset briefings and chat conversations while keeping patient data intact.
+Reset briefings, briefing jobs and chat conversations while keeping patient data intact.
 Run this script to clear all briefings and conversations from the database.
 """
 import sys
@@ -11,11 +11,11 @@ sys.path.append(str(Path(__file__).parent))
 
 from sqlalchemy.orm import Session
 from app.db.database import engine
-from app.models.patient import ClinicalBriefing, ChatConversation
+from app.models.patient import ClinicalBriefing, ChatConversation, ConversationMessage, BriefingJob
 
 
 def reset_briefings():
-    """Delete all briefings and conversations from the database"""
+    """Delete all briefings, briefing jobs and conversations from the database"""
     
     print("🔄 Resetting briefings and conversations...")
     print("   (Patient data, EHR records, and narratives will remain intact)")
@@ -26,23 +26,30 @@ def reset_briefings():
     try:
         # Count before deletion
         briefing_count = db.query(ClinicalBriefing).count()
+        job_count = db.query(BriefingJob).count()
         conversation_count = db.query(ChatConversation).count()
         
         print(f"📊 Found:")
         print(f"   • {briefing_count} briefings")
+        print(f"   • {job_count} briefing jobs")
         print(f"   • {conversation_count} conversations")
         print()
         
+        # Delete briefing jobs first: they reference both briefings and conversations
+        db.query(BriefingJob).delete()
+        
         # Delete all briefings
         db.query(ClinicalBriefing).delete()
         
-        # Delete all conversations
+        # Delete all conversations and their messages
+        db.query(ConversationMessage).delete()
         db.query(ChatConversation).delete()
         
         db.commit()
         
         print("✅ Successfully deleted:")
         print(f"   • {briefing_count} briefings")
+        print(f"   • {job_count} briefing jobs")
         print(f"   • {conversation_count} conversations")
         print()
         print("🎉 Reset complete!")
@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Point the app at a throwaway SQLite database before anything imports app.core.config
+_database = Path(tempfile.mkdtemp()) / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_database}"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_database}"
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio  # noqa: E402
+import datetime  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app.db.database import Base, SessionLocal, engine, async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.patient import ChatConversation, EHRHistory, Patient  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A sync session on freshly created tables"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def intake(db):
+    """An open intake conversation for a patient with an EHR; returns its conversation_id"""
+    db.add(Patient(
+        patient_id="PAT-0001",
+        full_name="Amara Okafor",
+        date_of_birth=datetime.date(1980, 1, 1),
+        gender_identity="woman",
+        race="Black",
+        address_zip_code="10001"
+    ))
+    db.add(EHRHistory(id="EHR-0001", patient_id="PAT-0001", problem_list=[], medication_list=[], recent_labs=[]))
+    db.add(ChatConversation(conversation_id="CONVO-0001", patient_id="PAT-0001", is_complete=False, legacy_messages=[]))
+    db.commit()
+    return "CONVO-0001"
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def checked_out_connections():
+    """The API engine's pooled connections currently in use, as a one-item list kept up to date"""
+    in_use = [0]
+
+    def checkout(dbapi_connection, record, proxy):
+        in_use[0] += 1
+
+    def checkin(dbapi_connection, record):
+        in_use[0] -= 1
+
+    event.listen(async_engine.sync_engine, "checkout", checkout)
+    event.listen(async_engine.sync_engine, "checkin", checkin)
+    yield in_use
+    event.remove(async_engine.sync_engine, "checkout", checkout)
+    event.remove(async_engine.sync_engine, "checkin", checkin)
+
+
+@pytest.fixture
+def run_async():
+    """Run a coroutine on a fresh event loop, closing pooled async connections afterwards"""
+    def run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,74 @@
+import pytest
+
+from app.core import cache
+from app.core.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic for cache expiry; advance with clock[0] += seconds"""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    memory = TTLCache(max_entries=10, ttl_seconds=60)
+    memory.set("a", "value", 5)
+
+    clock[0] += 59
+    assert memory.get("a") == "value"
+
+    clock[0] += 2
+    assert memory.get("a") is None
+    assert len(memory) == 0 and memory.bytes_held == 0
+
+
+def test_replacing_a_key_restarts_its_ttl(clock):
+    memory = TTLCache(max_entries=10, ttl_seconds=60)
+    memory.set("a", "old", 5)
+    clock[0] += 50
+    memory.set("a", "new", 7)
+    clock[0] += 50
+
+    assert memory.get("a") == "new"
+    assert len(memory) == 1 and memory.bytes_held == 7
+
+
+def test_evicts_least_recently_used_over_max_entries(clock):
+    memory = TTLCache(max_entries=3, ttl_seconds=60)
+    for key, size in (("a", 1), ("b", 10), ("c", 100)):
+        memory.set(key, key, size)
+
+    # Reading "a" makes "b" the least recently used
+    assert memory.get("a") == "a"
+    memory.set("d", "d", 1000)
+
+    assert memory.get("b") is None
+    assert [memory.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+    assert len(memory) == 3 and memory.bytes_held == 1101
+
+
+def test_discard(clock):
+    memory = TTLCache(max_entries=10, ttl_seconds=60)
+    memory.set("a", "a", 3)
+    memory.set("b", "b", 4)
+
+    memory.discard("a")
+    memory.discard("missing")
+
+    assert memory.get("a") is None and memory.get("b") == "b"
+    assert memory.bytes_held == 4
+
+
+def test_discard_where_removes_only_matching_entries(clock):
+    memory = TTLCache(max_entries=10, ttl_seconds=60)
+    memory.set("x1", {"patient_id": "PAT-1"}, 10)
+    memory.set("x2", {"patient_id": "PAT-2"}, 20)
+    memory.set("x3", {"patient_id": "PAT-1"}, 30)
+
+    memory.discard_where(lambda entry: entry["patient_id"] == "PAT-1")
+
+    assert memory.get("x1") is None and memory.get("x3") is None
+    assert memory.get("x2") == {"patient_id": "PAT-2"}
+    assert len(memory) == 1 and memory.bytes_held == 20
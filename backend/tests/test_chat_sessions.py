@@ -0,0 +1,102 @@
+import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.api.chat import load_chat_session
+from app.core.cache import chat_sessions
+from app.core.conversations import append_messages
+from app.db.database import AsyncSessionLocal
+from app.models.patient import ChatConversation, Patient
+
+GREETING = {"role": "ai", "content": "Hello! What brings you in today?"}
+TURN = [
+    {"role": "user", "content": "I've had a headache for three days."},
+    {"role": "ai", "content": "Does anything make it better or worse?"}
+]
+
+
+@pytest.fixture
+def sessions(intake, run_async):
+    """Loads the intake conversation the way a chat turn does; returns (session, outcome) per load"""
+    chat_sessions.memory.discard(intake)
+
+    async def seed():
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(ChatConversation, intake)
+            await append_messages(db, conversation, [GREETING])
+            await db.commit()
+
+    async def load():
+        before = chat_sessions.hits, chat_sessions.partial_hits
+        async with AsyncSessionLocal() as db:
+            _, session = await load_chat_session(db, intake)
+        hits, partial_hits = chat_sessions.hits, chat_sessions.partial_hits
+        outcome = "miss" if hits == before[0] else "partial" if partial_hits > before[1] else "hit"
+        return session, outcome
+
+    run_async(seed())
+    yield lambda: run_async(load())
+    chat_sessions.memory.discard(intake)
+
+
+def test_cached_session_is_reused(sessions):
+    first, outcome = sessions()
+    assert outcome == "miss" and first["messages"] == [GREETING]
+
+    second, outcome = sessions()
+    assert outcome == "hit" and second is first
+
+
+def test_turn_saved_by_another_worker_is_loaded(sessions, intake, run_async):
+    cached, _ = sessions()
+
+    # Another worker commits a turn; this worker's cache never hears about it
+    async def other_worker_turn():
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(ChatConversation, intake)
+            await append_messages(db, conversation, TURN)
+            await db.commit()
+
+    run_async(other_worker_turn())
+    assert chat_sessions.memory.get(intake) is cached
+
+    session, outcome = sessions()
+    assert outcome == "partial"
+    assert session["messages"] == [GREETING] + TURN
+    assert session["message_count"] == 3
+
+
+def test_record_changed_by_another_worker_rebuilds_session(sessions, run_async):
+    cached, _ = sessions()
+
+    # A bulk UPDATE fires no mapper events, like a change made through another worker
+    async def other_worker_edit():
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Patient)
+                .where(Patient.patient_id == "PAT-0001")
+                .values(full_name="Amara N. Okafor", updated_at=datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc))
+            )
+            await db.commit()
+
+    run_async(other_worker_edit())
+    stale = chat_sessions.stale
+
+    session, outcome = sessions()
+    assert outcome == "miss" and chat_sessions.stale == stale + 1
+    assert session is not cached
+    assert "Amara N. Okafor" in session["system_prompt"][1]["text"]
+
+
+def test_discard_drops_only_that_conversation(sessions, intake):
+    cached, _ = sessions()
+    other = chat_sessions.put("CONVO-OTHER", "PAT-0001", cached["stamp"], cached["system_prompt"], [GREETING], 1)
+
+    chat_sessions.discard(intake)
+    assert chat_sessions.memory.get(intake) is None
+    assert chat_sessions.memory.get("CONVO-OTHER") is other
+    chat_sessions.discard("CONVO-OTHER")
+
+    _, outcome = sessions()
+    assert outcome == "miss"
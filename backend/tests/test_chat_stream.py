@@ -0,0 +1,58 @@
+import pytest
+
+from app.api import chat
+
+
+@pytest.fixture
+def streamed_turn(client, monkeypatch):
+    """Stream a turn that ends with the given events, returning the conversations after_chat_turn ran for"""
+    class Conversation:
+        conversation_id = "conv-1"
+        history_summary = None
+        summarized_message_count = 0
+
+    async def load_chat_session(db, conversation_id):
+        return Conversation(), {"system_prompt": "", "messages": []}
+
+    ran = []
+
+    async def after_chat_turn(conversation_id):
+        ran.append(conversation_id)
+
+    monkeypatch.setattr(chat, "load_chat_session", load_chat_session)
+    monkeypatch.setattr(chat, "after_chat_turn", after_chat_turn)
+
+    def stream(*events):
+        async def chat_turn_events(*args):
+            for event in events:
+                yield event
+        monkeypatch.setattr(chat, "chat_turn_events", chat_turn_events)
+        response = client.post("/api/chat/continue/stream", json={"conversation_id": "conv-1", "user_message": "Hi"})
+        assert response.status_code == 200
+        return ran
+    return stream
+
+
+def test_background_work_follows_an_open_turn(streamed_turn):
+    assert streamed_turn(("text", {"delta": "Hello"}), ("done", {"is_complete": False})) == ["conv-1"]
+
+
+def test_no_background_work_after_the_final_turn(streamed_turn):
+    assert streamed_turn(("done", {"is_complete": True})) == []
+
+
+def test_no_background_work_after_a_failed_turn(streamed_turn):
+    assert streamed_turn(("error", {"detail": "The model is unavailable"})) == []
+
+
+def test_stream_does_not_hold_a_connection_while_generating(client, intake, checked_out_connections, monkeypatch):
+    in_use_while_generating = []
+
+    async def chat_turn_events(*args):
+        in_use_while_generating.append(checked_out_connections[0])
+        yield "done", {"is_complete": True}
+
+    monkeypatch.setattr(chat, "chat_turn_events", chat_turn_events)
+    response = client.post("/api/chat/continue/stream", json={"conversation_id": intake, "user_message": "Hi"})
+    assert response.status_code == 200
+    assert in_use_while_generating == [0]
@@ -0,0 +1,79 @@
+import pytest
+
+from app.core import history
+from app.core.config import settings
+from app.core.conversations import append_messages
+from app.core.history import fold_boundary, history_window, refresh_conversation_summary
+from app.db.database import AsyncSessionLocal
+from app.models.patient import ChatConversation
+
+
+def intake_messages(turns: int, words: int = 40) -> list:
+    """The greeting, then `turns` patient messages each followed by the assistant's reply"""
+    messages = [{"role": "ai", "content": "Hello! What brings you in today?"}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Patient answer {turn}. " + "detail " * words})
+        messages.append({"role": "ai", "content": f"Assistant question {turn + 1}? " + "context " * words})
+    return messages
+
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_TOKEN_BUDGET", 200)
+    monkeypatch.setattr(settings, "CHAT_HISTORY_KEEP_MESSAGES", 6)
+
+
+def test_short_conversation_is_sent_unchanged(small_budget):
+    messages = intake_messages(2, words=5)
+    assert fold_boundary(messages, 0) == 0
+    assert history_window(messages, 0) == messages
+
+
+@pytest.mark.parametrize("keep", [3, 4, 5, 6])
+def test_window_keeps_whole_exchanges(small_budget, monkeypatch, keep):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_KEEP_MESSAGES", keep)
+    for messages in (intake_messages(8), intake_messages(8) + [{"role": "user", "content": "One more thing."}]):
+        boundary = fold_boundary(messages, 0)
+        window = history_window(messages, boundary)
+
+        assert 0 < boundary and len(window) >= keep
+        # Starts at a patient message, and everything folded ends with the reply to the one before it
+        assert window[0]["role"] == "user"
+        assert messages[boundary - 1]["role"] == "ai"
+
+
+def test_no_refold_below_the_existing_summary(small_budget):
+    messages = intake_messages(8)
+    boundary = fold_boundary(messages, 0)
+    assert fold_boundary(messages, boundary) == boundary
+
+
+def test_summary_covers_exactly_the_folded_messages(db, intake, small_budget, run_async, monkeypatch):
+    summarized = []
+
+    async def summarize_history(previous_summary, new_messages):
+        summarized.append(new_messages)
+        return f"summary of {len(summarized)} folds"
+
+    monkeypatch.setattr(history, "summarize_history", summarize_history)
+    messages = intake_messages(10)
+
+    async def add_and_refresh(new_messages):
+        async with AsyncSessionLocal() as session:
+            conversation = await session.get(ChatConversation, intake)
+            await append_messages(session, conversation, new_messages)
+            await session.commit()
+        await refresh_conversation_summary(intake)
+        async with AsyncSessionLocal() as session:
+            conversation = await session.get(ChatConversation, intake)
+            return conversation.summarized_message_count, conversation.history_summary
+
+    first_count, _ = run_async(add_and_refresh(messages[:13]))
+    second_count, summary = run_async(add_and_refresh(messages[13:]))
+
+    # The folds are consecutive, never overlap, and the window sent verbatim picks up exactly where they stop
+    assert summarized[0] == messages[:first_count]
+    assert summarized[1] == messages[first_count:second_count]
+    assert history_window(messages, second_count) == messages[second_count:]
+    assert history_window(messages, second_count)[0]["role"] == "user"
+    assert summary == "summary of 2 folds"
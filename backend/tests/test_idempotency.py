@@ -0,0 +1,68 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.core import idempotency
+from app.core.config import settings
+from app.models.patient import IdempotencyKey
+
+ENDPOINT = "synthesize"
+KEY = "retry-key"
+REQUEST_HASH = idempotency.request_fingerprint({"patient_id": "PAT-0001"})
+# Any in-progress claim is already past its lease, so a duplicate takes the key over
+EXPIRED_AT_ONCE = {"lease_seconds": 1e-6, "wait_seconds": 1.0}
+
+
+def test_a_taken_over_claim_cannot_release_or_complete_the_key(db, run_async):
+    async def scenario():
+        original, _ = await idempotency._claim(ENDPOINT, KEY, REQUEST_HASH, **EXPIRED_AT_ONCE)
+        await asyncio.sleep(0.01)
+        duplicate, _ = await idempotency._claim(ENDPOINT, KEY, REQUEST_HASH, **EXPIRED_AT_ONCE)
+        assert duplicate != original
+
+        # The original finishes late: neither freeing nor storing may touch the new owner's claim
+        await idempotency._release(ENDPOINT, KEY, original)
+        await idempotency._complete(ENDPOINT, KEY, original, 200, {"from": "original"})
+
+        await idempotency._complete(ENDPOINT, KEY, duplicate, 200, {"from": "duplicate"})
+        return await idempotency._claim(ENDPOINT, KEY, REQUEST_HASH, **EXPIRED_AT_ONCE)
+
+    locked_at, stored = run_async(scenario())
+    assert locked_at is None
+    assert stored.response_body == {"from": "duplicate"}
+
+
+class Reply(BaseModel):
+    reply: str
+
+
+@pytest.mark.parametrize("endpoint, budget, taken_over", [
+    ("chat/continue", settings.llm_call_budget_seconds, True),
+    ("synthesize", settings.synthesis_budget_seconds, False),
+])
+def test_lease_follows_the_endpoint_budget(db, run_async, monkeypatch, endpoint, budget, taken_over):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0.01)
+    # A claim left by a worker that crashed 15 minutes ago: past a chat turn's budget, within a synthesis's
+    db.add(IdempotencyKey(
+        endpoint=endpoint,
+        key=KEY,
+        request_hash=REQUEST_HASH,
+        status=idempotency.STATUS_IN_PROGRESS,
+        locked_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=15),
+        expires_at=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    ))
+    db.commit()
+
+    async def handler():
+        return Reply(reply="retried")
+
+    call = idempotency.run_idempotent(endpoint, KEY, {"patient_id": "PAT-0001"}, handler, Reply, budget_seconds=budget)
+    if taken_over:
+        assert run_async(call) == Reply(reply="retried")
+    else:
+        with pytest.raises(HTTPException) as conflict:
+            run_async(call)
+        assert conflict.value.status_code == 409
@@ -0,0 +1,114 @@
+import asyncio
+import datetime
+
+import pytest
+
+from app.api import briefing_jobs
+from app.core import jobs
+from app.core.config import settings
+from app.core.jobs import LeaseLost, claim_next_job, mark_job_succeeded, run_with_lease
+from app.db.database import AsyncSessionLocal
+from app.models.patient import BriefingJob
+
+
+@pytest.fixture
+def queued_job(db):
+    db.add(BriefingJob(
+        job_id="JOB-TEST",
+        patient_id="PAT-0001",
+        conversation_id="CONV-0001",
+        status="queued",
+        attempts=0,
+        max_attempts=3,
+        run_after=datetime.datetime(2020, 1, 1)
+    ))
+    db.commit()
+    return "JOB-TEST"
+
+
+@pytest.fixture
+def fast_heartbeat(monkeypatch):
+    monkeypatch.setattr(settings, "BRIEFING_JOB_HEARTBEAT_SECONDS", 0.05)
+
+
+def test_heartbeat_renews_lease_while_job_runs(db, queued_job, fast_heartbeat, run_async, monkeypatch):
+    renewals = []
+    renew = jobs.renew_job_lease
+
+    async def counting_renew(job_id, worker_id):
+        renewed = await renew(job_id, worker_id)
+        renewals.append(renewed)
+        return renewed
+
+    monkeypatch.setattr(jobs, "renew_job_lease", counting_renew)
+
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            job = await claim_next_job(session, "worker-a")
+            result = await run_with_lease(job.job_id, "worker-a", asyncio.sleep(0.3, result="BRIEF-1"))
+            assert await mark_job_succeeded(session, job, "worker-a", result)
+
+    run_async(scenario())
+    assert len(renewals) >= 2 and all(renewals)
+    db.expire_all()
+    job = db.get(BriefingJob, queued_job)
+    assert job.status == "succeeded"
+    assert job.briefing_id == "BRIEF-1"
+    assert job.locked_by is None
+
+
+def test_reclaimed_job_is_cancelled_and_not_completed(db, queued_job, fast_heartbeat, run_async):
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            job = await claim_next_job(session, "worker-a")
+            # Another worker takes the job over, as after an expired lease
+            db.query(BriefingJob).filter_by(job_id=job.job_id).update({"locked_by": "worker-b"})
+            db.commit()
+            with pytest.raises(LeaseLost):
+                await run_with_lease(job.job_id, "worker-a", work())
+            assert not await mark_job_succeeded(session, job, "worker-a", "BRIEF-STALE")
+
+    run_async(scenario())
+    assert cancelled == [True]
+    db.expire_all()
+    job = db.get(BriefingJob, queued_job)
+    assert job.status == "running"
+    assert job.locked_by == "worker-b"
+    assert job.briefing_id is None
+
+
+def test_job_event_stream_does_not_hold_a_connection(client, queued_job, checked_out_connections, monkeypatch):
+    in_use_while_streaming = []
+
+    async def job_events(job_id):
+        in_use_while_streaming.append(checked_out_connections[0])
+        yield "failed", {"job_id": job_id}
+
+    monkeypatch.setattr(briefing_jobs, "job_events", job_events)
+    response = client.get(f"/api/briefing-jobs/{queued_job}/events")
+    assert response.status_code == 200
+    assert in_use_while_streaming == [0]
+
+
+def test_job_events_end_with_failed_when_the_job_is_deleted(db, queued_job, run_async, monkeypatch):
+    monkeypatch.setattr(settings, "BRIEFING_JOB_POLL_INTERVAL", 0.01)
+
+    async def watch():
+        events = []
+        async for event, payload in briefing_jobs.job_events(queued_job):
+            events.append((event, payload and payload["status"]))
+            if event == "status":
+                db.query(BriefingJob).filter_by(job_id=queued_job).delete()
+                db.commit()
+        return events
+
+    assert run_async(watch()) == [("status", "queued"), (None, None), ("failed", "deleted")]
@@ -0,0 +1,99 @@
+import base64
+import datetime
+
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor
+from app.models.patient import Appointment, Patient
+
+MIDNIGHT = datetime.datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def patients(db):
+    """Nine patients; ids run against creation order, and groups of three share a created_at"""
+    for index in range(9):
+        db.add(Patient(
+            patient_id=f"PAT-{8 - index:04}",
+            full_name=f"Patient {index}",
+            date_of_birth=datetime.date(1980, 1, 1),
+            gender_identity="woman",
+            race="Black" if index % 2 else "Asian",
+            address_zip_code="10001",
+            created_at=MIDNIGHT + datetime.timedelta(minutes=index // 3)
+        ))
+    db.commit()
+    return db.query(Patient).order_by(Patient.created_at, Patient.patient_id).all()
+
+
+@pytest.fixture
+def appointments(db, patients):
+    """Ten appointments in pairs at the same time, alternating scheduled and completed"""
+    for index in range(10):
+        db.add(Appointment(
+            appointment_id=f"APT-{9 - index:04}",
+            patient_id=patients[index % len(patients)].patient_id,
+            appointment_date_time=MIDNIGHT + datetime.timedelta(hours=index // 2),
+            appointment_status="scheduled" if index % 2 else "completed"
+        ))
+    db.commit()
+    return db.query(Appointment).order_by(Appointment.appointment_date_time, Appointment.appointment_id).all()
+
+
+def walk(client, path: str, id_field: str, **params) -> list:
+    """Follow next_cursor from the first page to the last, returning every item id in order"""
+    ids = []
+    cursor = None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= params["limit"]
+        ids += [item[id_field] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_cursor_round_trip():
+    at = datetime.datetime(2026, 3, 14, 9, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(at, "PAT-0001")) == (at, "PAT-0001")
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 9, 10])
+def test_patient_pages_cover_every_row_once_in_order(client, patients, limit):
+    # Ties on created_at straddle page boundaries; the patient_id tiebreak keeps them stable
+    assert walk(client, "/api/patients", "patient_id", limit=limit) == [patient.patient_id for patient in patients]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4])
+def test_appointment_pages_cover_every_row_once_in_order(client, appointments, limit):
+    expected = [appointment.appointment_id for appointment in appointments]
+    assert walk(client, "/api/appointments", "appointment_id", limit=limit) == expected
+
+
+def test_filters_apply_on_every_page(client, patients, appointments):
+    black_patients = [patient.patient_id for patient in patients if patient.race == "Black"]
+    assert walk(client, "/api/patients", "patient_id", limit=2, race="Black") == black_patients
+
+    scheduled = [appointment.appointment_id for appointment in appointments if appointment.appointment_status == "scheduled"]
+    assert walk(client, "/api/appointments", "appointment_id", limit=2, status="scheduled") == scheduled
+
+
+def encoded(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    encoded(b"\xff\xfe garbage"),
+    encoded(b'{"created_at": "2026-01-01"}'),
+    encoded(b'["yesterday", "PAT-0001"]'),
+    encoded(b'[null, "PAT-0001"]'),
+    encoded(b'["2026-01-01T00:00:00", "PAT-0001", "extra"]'),
+])
+@pytest.mark.parametrize("path", ["/api/patients", "/api/appointments"])
+def test_invalid_cursors_are_rejected(client, db, path, cursor):
+    response = client.get(path, params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
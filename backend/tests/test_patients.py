@@ -0,0 +1,63 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.db.database import async_engine
+from app.models.patient import Patient, ClinicalBriefing
+
+
+def seed_patients(db, count: int, start: int = 0):
+    for index in range(start, start + count):
+        patient_id = f"PAT-{index:04}"
+        db.add(Patient(
+            patient_id=patient_id,
+            full_name=f"Patient {index}",
+            date_of_birth=datetime.date(1980, 1, 1),
+            gender_identity="woman",
+            race="Black",
+            address_zip_code="10001",
+            created_at=datetime.datetime(2026, 1, 1) + datetime.timedelta(minutes=index)
+        ))
+        for version in range(2):
+            db.add(ClinicalBriefing(
+                briefing_id=f"BRIEF-{index:04}-{version}",
+                patient_id=patient_id,
+                ai_summary="summary",
+                key_insights_flags=[],
+                reported_symptoms_structured=[],
+                relevant_history_surfaced=[]
+            ))
+    db.commit()
+
+
+@pytest.fixture
+def select_counter():
+    """Counts SELECT statements sent by the API's async engine"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+
+def test_patient_list_query_count_does_not_grow_with_patients(client, db, select_counter):
+    counts = {}
+    seeded = 0
+    for total in (5, 50):
+        seed_patients(db, total - seeded, start=seeded)
+        seeded = total
+
+        select_counter.clear()
+        response = client.get("/api/patients", params={"limit": 100})
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert len(items) == total
+        assert all(item["briefing_status"] == "Briefing Ready" for item in items)
+        counts[total] = len(select_counter)
+
+    assert counts[5] == counts[50], f"GET /patients issued {counts} SELECTs for 5 vs 50 patients"
@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import anthropic
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.core import scheduler
+from app.core.config import settings
+from app.core.scheduler import LLMScheduler
+
+PARAMS = {"model": "claude-3-5-haiku-20241022", "max_tokens": 100, "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def status_error(status_code: int, retry_after: str = None) -> anthropic.APIStatusError:
+    """The exception the SDK raises for an API reply with this status"""
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = httpx.Response(status_code, request=request, headers=headers)
+    body = {"type": "error", "error": {"type": "api_error", "message": "upstream error"}}
+    return anthropic.AsyncAnthropic(api_key="test-key")._make_status_error("upstream error", body=body, response=response)
+
+
+class FakeClient:
+    """Fails with each queued error in turn, then answers"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.messages = self
+
+    def with_options(self, **options):
+        return self
+
+    async def create(self, **params):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(content=[], usage=SimpleNamespace(input_tokens=10, output_tokens=5))
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """A fresh scheduler with no real backoff sleeps, and a way to script the upstream replies"""
+    monkeypatch.setattr(settings, "LLM_TELEMETRY_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_MAX_ATTEMPTS", 4)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURE_THRESHOLD", 3)
+    # Rate limits pause the model's budget for real, so keep that short
+    monkeypatch.setattr(settings, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    delays = []
+    sleep = asyncio.sleep
+
+    async def no_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(scheduler.asyncio, "sleep", no_sleep)
+
+    def make(*errors):
+        client = FakeClient(errors)
+        monkeypatch.setattr(scheduler, "get_anthropic_client", lambda: client)
+        return LLMScheduler(), client, delays
+    return make
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 529])
+def test_retryable_replies_are_retried(llm, status_code):
+    llm_scheduler, client, delays = llm(status_error(status_code))
+    message = asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert message.usage.output_tokens == 5
+    assert client.calls == 2
+    assert llm_scheduler.stats["retries"] == 1
+    assert len(delays) == 1
+
+
+def test_overload_is_a_breaker_failure(llm):
+    llm_scheduler, client, _ = llm(status_error(529), status_error(529))
+    llm_scheduler.breaker.record_success = lambda: None  # Keep the count the retries left behind
+    asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert llm_scheduler.stats["overloaded"] == 2
+    assert llm_scheduler.breaker.failures == 2
+
+
+def test_backoff_honours_retry_after(llm):
+    llm_scheduler, _, delays = llm(status_error(529, retry_after="7"))
+    asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert delays == [7.0]
+
+
+def test_backoff_grows_but_stays_capped(llm, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKOFF_MAX_SECONDS", 3.0)
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(settings, "LLM_BACKOFF_BASE_SECONDS", 1.0)
+    llm_scheduler, _, _ = llm()
+    error = status_error(500)
+    assert [llm_scheduler._backoff(attempt, error) for attempt in range(4)] == [1.0, 2.0, 3.0, 3.0]
+
+
+def test_sustained_overload_opens_the_breaker_and_fails_fast(llm):
+    llm_scheduler, client, _ = llm(*[status_error(529) for _ in range(10)])
+    with pytest.raises(HTTPException) as failed:
+        asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert failed.value.status_code == 503
+    assert client.calls == 3
+    assert llm_scheduler.breaker.state == "open"
+
+    # While open, calls are rejected without reaching the API
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert rejected.value.status_code == 503
+    assert "Retry-After" in rejected.value.headers
+    assert client.calls == 3
+
+
+def test_rate_limits_do_not_open_the_breaker(llm):
+    llm_scheduler, client, _ = llm(*[status_error(429) for _ in range(10)])
+    with pytest.raises(HTTPException) as failed:
+        asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert failed.value.status_code == 503
+    assert client.calls == 4
+    assert llm_scheduler.breaker.state == "closed"
+    assert llm_scheduler.stats["rate_limited"] == 4
+
+
+def test_request_errors_are_not_retried(llm):
+    llm_scheduler, client, _ = llm(status_error(400))
+    with pytest.raises(anthropic.BadRequestError):
+        asyncio.run(llm_scheduler.create("test", **PARAMS))
+    assert client.calls == 1
+    assert llm_scheduler.breaker.failures == 0
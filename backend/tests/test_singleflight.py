@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.api import synthesize
+from app.core import singleflight
+from app.core.singleflight import SingleFlight
+from app.db.database import AsyncSessionLocal
+from app.schemas.patient import SynthesizeRequest
+
+BRIEFING = {
+    "ai_summary": "Dry cough since starting lisinopril.",
+    "key_insights_flags": [],
+    "reported_symptoms_structured": [{"symptom": "cough", "quality": "dry"}],
+    "relevant_history_surfaced": []
+}
+
+
+@pytest.fixture
+def synthesis(intake, monkeypatch):
+    """Run concurrent identical syntheses against a scripted model; returns (run, model calls, flights)"""
+    flights = SingleFlight(max_connections=2)
+    monkeypatch.setattr(synthesize, "synthesis_flights", flights)
+    calls = []
+
+    def run(narrative: str, count: int, fail_first: bool = False):
+        async def generate_briefing_content(*args, **kwargs):
+            calls.append(narrative)
+            await asyncio.sleep(0.05)  # Long enough for every request to arrive while it runs
+            if fail_first and len(calls) == 1:
+                raise HTTPException(status_code=503, detail="AI service is busy. Please try again shortly.")
+            return BRIEFING
+
+        monkeypatch.setattr(synthesize, "generate_briefing_content", generate_briefing_content)
+
+        async def one_request():
+            async with AsyncSessionLocal() as db:
+                request = SynthesizeRequest(patient_id="PAT-0001", narrative=narrative)
+                return (await synthesize.generate_clinical_briefing(request, None, db)).briefing_id
+
+        async def all_requests():
+            # Open the pool's first connection alone: concurrent first connects deadlock in SQLAlchemy's
+            # first-connect hook, and the app always connects once at startup anyway
+            async with AsyncSessionLocal() as db:
+                await db.execute(text("SELECT 1"))
+            return await asyncio.gather(*(one_request() for _ in range(count)), return_exceptions=True)
+
+        return all_requests()
+    return run, calls, flights
+
+
+def test_identical_requests_share_one_generation(synthesis, run_async):
+    run, calls, flights = synthesis
+    results = run_async(run("Dry cough for two weeks.", 5))
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1 and results[0].startswith("BRIEF-")
+    assert flights.stats["leaders"] == 1
+    assert flights.stats["coalesced_local"] == 4
+
+
+def test_failed_leader_does_not_fail_its_followers(synthesis, run_async):
+    run, calls, flights = synthesis
+    results = run_async(run("Dry cough for three weeks.", 5, fail_first=True))
+
+    # The leader's caller gets its error; the others retry once under a new leader and share its result
+    failed = [result for result in results if isinstance(result, HTTPException)]
+    briefings = {result for result in results if isinstance(result, str)}
+    assert len(failed) == 1 and failed[0].status_code == 503
+    assert len(briefings) == 1
+    assert len(calls) == 2
+    assert flights.stats["retried_after_leader_failure"] == 4
+
+
+class FakeAdvisoryLocks:
+    """Stands in for Postgres advisory locks, tracking how many connections are open at once"""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self):
+        self.held = {}
+        self.open = 0
+        self.most_open = 0
+
+    async def connect(self):
+        self.open += 1
+        self.most_open = max(self.most_open, self.open)
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def execution_options(self, **options):
+        return self
+
+    async def scalar(self, statement, parameters):
+        lock_id = parameters["id"]
+        if "unlock" in str(statement):
+            return self.engine.held.pop(lock_id, None) is self
+        if lock_id in self.engine.held:
+            return False
+        self.engine.held[lock_id] = self
+        return True
+
+    async def invalidate(self):
+        self.engine.held = {key: owner for key, owner in self.engine.held.items() if owner is not self}
+
+    async def close(self):
+        self.engine.open -= 1
+
+
+def test_lock_connections_are_capped(monkeypatch):
+    engine = FakeAdvisoryLocks()
+    monkeypatch.setattr(singleflight, "async_engine", engine)
+    flights = SingleFlight(max_connections=2)
+
+    async def produce_for(key):
+        await asyncio.sleep(0.05)
+        return key
+
+    async def lookup():
+        return None
+
+    async def main():
+        keys = [f"{index:016x}" for index in range(5)]
+        return await asyncio.gather(*(flights.run(key, lambda key=key: produce_for(key), lookup) for key in keys))
+
+    results = asyncio.run(main())
+
+    assert results == [f"{index:016x}" for index in range(5)]
+    assert engine.most_open == 2
+    assert flights.stats["lock_skipped"] == 3
+    assert engine.open == 0 and not engine.held
+    assert flights.metrics()["lock_connections"] == 0
+
+
+def test_lock_is_dropped_with_its_connection_when_unlock_fails(monkeypatch):
+    engine = FakeAdvisoryLocks()
+    monkeypatch.setattr(singleflight, "async_engine", engine)
+    flights = SingleFlight(max_connections=2)
+
+    scalar = FakeConnection.scalar
+
+    async def failing_unlock(self, statement, parameters):
+        if "unlock" in str(statement):
+            raise ConnectionError("connection lost")
+        return await scalar(self, statement, parameters)
+
+    async def main():
+        monkeypatch.setattr(FakeConnection, "scalar", failing_unlock)
+        with pytest.raises(ConnectionError):
+            async with flights._worker_lock("00000000000000ff"):
+                pass
+
+    asyncio.run(main())
+
+    assert not engine.held
+    assert flights.stats["lock_connections_invalidated"] == 1
+    assert flights.connections_in_use == 0
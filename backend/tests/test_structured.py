@@ -0,0 +1,125 @@
+import copy
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import structured
+from app.core.config import settings
+from app.core.scheduler import PRIORITY_INTERACTIVE
+from app.schemas.patient import RecommendationDetail
+
+RECOMMENDATION = {
+    "background_context": "Ramadan fasting runs from Fajr to Maghrib.",
+    "approach": "I'd like to plan your medications around your fast.",
+    "explore_questions": ["Are you fasting this month? [Dosing times may need to move]"],
+    "integrate_actions": ["Move once-daily doses to Iftar"],
+    "avoid": ["Assuming every Muslim patient fasts"]
+}
+
+BRIEFING = {
+    "ai_summary": "Cough since starting lisinopril.",
+    "key_insights_flags": [
+        {"type": "Medication Side Effect", "flag": "Cough may be linked to Lisinopril", "reasoning": "ACE inhibitor cough", "severity": "Medium"}
+    ],
+    "equity_and_context_flags": [
+        {"type": "Cultural Context", "flag": "Muslim Patient - Ramadan", "reasoning": "Patient is fasting", "recommendation": RECOMMENDATION}
+    ],
+    "reported_symptoms_structured": [{"symptom": "cough", "quality": "dry"}],
+    "relevant_history_surfaced": ["Lisinopril 10mg started 2026-01"]
+}
+
+USAGE = SimpleNamespace(input_tokens=10, output_tokens=5, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+
+
+def text_message(payload: dict):
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=json.dumps(payload))], usage=USAGE)
+
+
+def tool_message(payload: dict):
+    block = SimpleNamespace(type="tool_use", id="toolu_1", name=structured.BRIEFING_TOOL_NAME, input=payload)
+    return SimpleNamespace(content=[block], usage=USAGE)
+
+
+def generate(monkeypatch, run_async, mode: str, message):
+    monkeypatch.setattr(settings, "SYNTHESIS_OUTPUT_MODE", mode)
+
+    async def create(call_site, priority, prompt_version, **params):
+        return message
+
+    monkeypatch.setattr(structured.llm_scheduler, "create", create)
+    return run_async(structured.generate_briefing_content(
+        "narrative_synthesis", "test", PRIORITY_INTERACTIVE, {"model": "test", "max_tokens": 100, "messages": []}
+    ))
+
+
+@pytest.mark.parametrize("mode, build", [("json", text_message), ("tool", tool_message)])
+def test_briefing_round_trips_recommendations(monkeypatch, run_async, mode, build):
+    result = generate(monkeypatch, run_async, mode, build(BRIEFING))
+
+    assert result == BRIEFING
+
+
+def test_json_mode_accepts_legacy_recommendation_names(monkeypatch, run_async):
+    legacy = copy.deepcopy(BRIEFING)
+    recommendation = legacy["equity_and_context_flags"][0]["recommendation"]
+    recommendation["background"] = recommendation.pop("background_context")
+    recommendation["explore"] = recommendation.pop("explore_questions")
+    recommendation["integrate"] = recommendation.pop("integrate_actions")
+
+    result = generate(monkeypatch, run_async, "json", text_message(legacy))
+
+    assert result["equity_and_context_flags"][0]["recommendation"] == RECOMMENDATION
+
+
+def test_output_mode_overrides_json_setting(monkeypatch, run_async):
+    monkeypatch.setattr(settings, "SYNTHESIS_OUTPUT_MODE", "json")
+    sent = []
+
+    async def create(call_site, priority, prompt_version, **params):
+        sent.append(params)
+        return tool_message(RECOMMENDATION)
+
+    monkeypatch.setattr(structured.llm_scheduler, "create", create)
+    result = run_async(structured.generate_briefing_content(
+        "equity_knowledge_refresh", "test", PRIORITY_INTERACTIVE, {"model": "test", "max_tokens": 100, "messages": []},
+        RecommendationDetail, output_mode="tool"
+    ))
+
+    assert result == RECOMMENDATION
+    assert sent[0]["tool_choice"]["type"] == "tool"
+
+
+def test_parse_briefing_message_strips_fences_and_validates():
+    fenced = SimpleNamespace(content=[SimpleNamespace(type="text", text=f"```json\n{json.dumps(BRIEFING)}\n```")])
+    assert structured.parse_briefing_message(fenced, "json") == BRIEFING
+    assert structured.parse_briefing_message(tool_message(BRIEFING), "tool") == BRIEFING
+
+    incomplete = {key: value for key, value in BRIEFING.items() if key != "ai_summary"}
+    for message, mode in [
+        (text_message(incomplete), "json"),
+        (SimpleNamespace(content=[SimpleNamespace(type="text", text="Here is the briefing: {")]), "json"),
+        (SimpleNamespace(content=[]), "json"),
+        (text_message(BRIEFING), "tool"),
+    ]:
+        with pytest.raises(ValueError):
+            structured.parse_briefing_message(message, mode)
+
+
+@pytest.mark.parametrize("mode, message", [
+    ("json", SimpleNamespace(content=[], usage=USAGE, stop_reason="max_tokens")),
+    ("json", SimpleNamespace(content=[SimpleNamespace(type="thinking", thinking="...")], usage=USAGE, stop_reason="end_turn")),
+    ("json", SimpleNamespace(content=[SimpleNamespace(type="text", text='{"ai_summary": "Cou')], usage=USAGE, stop_reason="max_tokens")),
+    ("tool", SimpleNamespace(content=[], usage=USAGE, stop_reason="max_tokens")),
+])
+def test_unusable_replies_are_counted_and_return_500(monkeypatch, run_async, mode, message):
+    structured.parse_stats.clear()
+
+    with pytest.raises(HTTPException) as failed:
+        generate(monkeypatch, run_async, mode, message)
+
+    assert failed.value.status_code == 500
+    stats = structured.parse_stats[("narrative_synthesis", mode)]
+    assert stats["parse_failures"] == stats["unrecoverable"] == 1
+    assert stats["truncated"] == (message.stop_reason == "max_tokens")
@@ -14,6 +14,8 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
   const [error, setError] = useState(null);
   const messagesEndRef = useRef(null);
   const thinkingAnimationRef = useRef(null);
+  const socketRef = useRef(null);
+  const turnHandlersRef = useRef({});
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -25,6 +27,7 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
 
   useEffect(() => {
     initializeChat();
+    return () => socketRef.current?.close();
   }, []);
 
   // Progressive thinking display when expanded
@@ -66,6 +69,11 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
       const response = await chatApi.startChat(patient.patient_id);
       setConversationId(response.conversation_id);
       setMessages([response.initial_message]);
+      // One persistent connection for the rest of the intake; the greeting is message 0
+      socketRef.current = chatApi.openChatSocket(response.conversation_id, 0, {
+        onThinking: (delta) => turnHandlersRef.current.onThinking?.(delta),
+        onText: (delta) => turnHandlersRef.current.onText?.(delta),
+      });
       setError(null);
     } catch (err) {
       console.error('Failed to start chat:', err);
@@ -93,7 +101,23 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
     setIsLoading(true);
 
     try {
-      const response = await chatApi.continueChat(conversationId, userMessage.content);
+      let streamedThinking = '';
+      let streamedText = '';
+
+      turnHandlersRef.current = {
+        onThinking: (delta) => {
+          streamedThinking += delta;
+          setThinkingSteps(streamedThinking.split('\n').filter(line => line.trim()));
+        },
+        onText: (delta) => {
+          // Show the reply as it is generated, replacing the placeholder on the first chunk
+          const isFirstChunk = streamedText === '';
+          streamedText += delta;
+          const partialMessage = { role: 'ai', content: streamedText, isStreaming: true };
+          setMessages(prev => (isFirstChunk ? [...prev, partialMessage] : [...prev.slice(0, -1), partialMessage]));
+        },
+      };
+      const response = await socketRef.current.sendMessage(userMessage.content);
 
       // Store thinking steps for later display
       if (response.thinking && response.thinking.length > 0) {
@@ -107,8 +131,8 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
         setThinkingSteps([]);
       }
 
-      // Add AI response to messages after thinking completes
-      setMessages(prev => [...prev, response.ai_message]);
+      // Replace the streamed message with the final saved one
+      setMessages(prev => (streamedText ? [...prev.slice(0, -1), response.ai_message] : [...prev, response.ai_message]));
 
       // Check if conversation is complete
       if (response.is_complete) {
@@ -121,7 +145,7 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
 
         // Wait a moment, then close
         setTimeout(() => {
-          onComplete(response.briefing_id);
+          onComplete(response.briefing_job_id);
           onClose();
         }, 2000);
       }
@@ -135,8 +159,11 @@ function IntakeChatModal({ patient, onClose, onComplete }) {
       const errorMessage = err.response?.data?.detail || err.message || 'Failed to send message. Please try again.';
       setError(errorMessage);
       
-      // Remove the user message from UI since it failed
-      setMessages(prev => prev.slice(0, -1));
+      // Remove the user message (and any partial reply) from UI since it failed
+      setMessages(prev => {
+        const withoutPartial = prev[prev.length - 1]?.isStreaming ? prev.slice(0, -1) : prev;
+        return withoutPartial.slice(0, -1);
+      });
     } finally {
       setIsLoading(false);
     }
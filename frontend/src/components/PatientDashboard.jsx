@@ -1,12 +1,17 @@
 import React, { useState, useEffect } from 'react';
-import { patientsApi, appointmentsApi } from '../services/api';
+import { patientsApi, appointmentsApi, briefingJobsApi } from '../services/api';
 import NarrativeModal from './NarrativeModal';
 import IntakeChatModal from './IntakeChatModal';
 import BriefingView from './BriefingView';
 import MedicalHistoryModal from './MedicalHistoryModal';
 
+// Patients fetched per "Load more" click
+const PAGE_SIZE = 50;
+
 const PatientDashboard = () => {
   const [patients, setPatients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedPatient, setSelectedPatient] = useState(null);
@@ -19,6 +24,7 @@ const PatientDashboard = () => {
   const [sortConfig, setSortConfig] = useState({ key: null, direction: 'asc' });
   const [compactMode, setCompactMode] = useState(true);
   const [nextAppointment, setNextAppointment] = useState(null);
+  const [nextAppointmentPatient, setNextAppointmentPatient] = useState(null);
   const [appointmentLoading, setAppointmentLoading] = useState(true);
   const [patientAppointments, setPatientAppointments] = useState({}); // Map of patient_id -> appointments
 
@@ -27,19 +33,14 @@ const PatientDashboard = () => {
     loadNextAppointment();
   }, []);
 
-  useEffect(() => {
-    // Load appointments for all patients when patients are loaded
-    if (patients.length > 0) {
-      loadPatientAppointments();
-    }
-  }, [patients]);
-
   const loadPatients = async () => {
     try {
       setLoading(true);
-      const data = await patientsApi.getAll();
-      setPatients(data);
+      const page = await patientsApi.getPage({ limit: PAGE_SIZE });
+      setPatients(page.items);
+      setNextCursor(page.next_cursor);
       setError(null);
+      loadPatientAppointments(page.items);
     } catch (err) {
       setError('Failed to load patients. Please ensure the backend server is running.');
       console.error('Error loading patients:', err);
@@ -48,24 +49,54 @@ const PatientDashboard = () => {
     }
   };
 
+  const loadMorePatients = async () => {
+    try {
+      setLoadingMore(true);
+      const page = await patientsApi.getPage({ limit: PAGE_SIZE, cursor: nextCursor });
+      setPatients(prev => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+      loadPatientAppointments(page.items);
+    } catch (err) {
+      setError('Failed to load more patients.');
+      console.error('Error loading more patients:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Re-read one patient's briefing status instead of reloading every page
+  const refreshPatient = async (patientId) => {
+    try {
+      const updated = await patientsApi.getById(patientId);
+      setPatients(prev => prev.map(p => (p.patient_id === patientId ? updated : p)));
+      setNextAppointmentPatient(prev => (prev?.patient_id === patientId ? updated : prev));
+    } catch (err) {
+      console.error(`Error refreshing patient ${patientId}:`, err);
+    }
+  };
+
   const loadNextAppointment = async () => {
     try {
       setAppointmentLoading(true);
       const appointment = await appointmentsApi.getNextUpcoming();
       setNextAppointment(appointment);
+      // The patient may not be on a loaded page, so fetch them directly
+      setNextAppointmentPatient(appointment ? await patientsApi.getById(appointment.patient_id) : null);
     } catch (err) {
       console.error('Error loading next appointment:', err);
       setNextAppointment(null);
+      setNextAppointmentPatient(null);
     } finally {
       setAppointmentLoading(false);
     }
   };
 
-  const loadPatientAppointments = async () => {
+  // Next upcoming appointment for each patient on a newly loaded page
+  const loadPatientAppointments = async (pagePatients) => {
     try {
       const appointmentsMap = {};
       await Promise.all(
-        patients.map(async (patient) => {
+        pagePatients.map(async (patient) => {
           try {
             const appointments = await appointmentsApi.getByPatient(patient.patient_id, { upcoming_only: true });
             if (appointments && appointments.length > 0) {
@@ -76,7 +107,7 @@ const PatientDashboard = () => {
           }
         })
       );
-      setPatientAppointments(appointmentsMap);
+      setPatientAppointments(prev => ({ ...prev, ...appointmentsMap }));
     } catch (err) {
       console.error('Error loading patient appointments:', err);
     }
@@ -107,14 +138,22 @@ const PatientDashboard = () => {
     }
   };
 
-  const handleChatComplete = (briefingId) => {
-    // Refresh the patient list to update statuses
-    loadPatients();
+  const handleChatComplete = (briefingJobId) => {
+    // Refresh the patient's row to update their status
+    const patientId = selectedPatient.patient_id;
+    refreshPatient(patientId);
+
+    // The briefing is synthesized in the background; refresh again once it is ready
+    if (briefingJobId) {
+      briefingJobsApi.waitForBriefing(briefingJobId)
+        .then(() => refreshPatient(patientId))
+        .catch((err) => console.error('Briefing generation failed:', err));
+    }
   };
 
   const handleBriefingGenerated = () => {
-    // Refresh the patient list to update statuses
-    loadPatients();
+    // Refresh the patient's row to update their status
+    refreshPatient(selectedPatient.patient_id);
     setShowNarrativeModal(false);
   };
 
@@ -264,14 +303,6 @@ const PatientDashboard = () => {
     return `in ${minutes}m`;
   };
 
-  // Get patient info for the next appointment
-  const getNextAppointmentPatient = () => {
-    if (!nextAppointment) return null;
-    return patients.find(p => p.patient_id === nextAppointment.patient_id);
-  };
-
-  const nextAppointmentPatient = getNextAppointmentPatient();
-
   // Get next appointment for a specific patient
   const getPatientNextAppointment = (patientId) => {
     return patientAppointments[patientId] || null;
@@ -375,7 +406,7 @@ const PatientDashboard = () => {
             <div className="quick-facts-grid">
               <div className="quick-fact">
                 <div className="quick-fact-label">Today's Patients</div>
-                <div className="quick-fact-value">{patients.length}</div>
+                <div className="quick-fact-value">{patients.length}{nextCursor ? '+' : ''}</div>
               </div>
               <div className="quick-fact">
                 <div className="quick-fact-label">Pending Intake</div>
@@ -534,6 +565,13 @@ const PatientDashboard = () => {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div style={{ display: 'flex', justifyContent: 'center', padding: '16px' }}>
+              <button className="btn btn-secondary" onClick={loadMorePatients} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : 'Load more patients'}
+              </button>
+            </div>
+          )}
         </>
       )}
 
@@ -1,6 +1,10 @@
 import axios from 'axios';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+const WS_BASE_URL = API_BASE_URL.replace(/^http/, 'ws');
+
+// WebSocket close codes after which reconnecting cannot help (see backend/app/api/chat_ws.py)
+const FINAL_CLOSE_CODES = [1008, 4404, 4409];
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -9,9 +13,31 @@ const api = axios.create({
   },
 });
 
+// POST that is safe to retry: every attempt carries the same Idempotency-Key, so the server
+// replays the first attempt's response instead of running the request (and the model) again
+const postIdempotent = async (url, data, retries = 2) => {
+  const headers = { 'Idempotency-Key': crypto.randomUUID() };
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      const response = await api.post(url, data, { headers });
+      return response.data;
+    } catch (error) {
+      // Only retry when no response arrived (network error or timeout)
+      if (error.response || attempt >= retries) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+    }
+  }
+};
+
 export const patientsApi = {
-  getAll: async () => {
-    const response = await api.get('/patients');
+  // One page of the roster: { items, next_cursor }; pass next_cursor back as `cursor` for the next page
+  getPage: async (params = {}) => {
+    const response = await api.get('/patients', { params });
+    return response.data;
+  },
+
+  getById: async (patientId) => {
+    const response = await api.get(`/patients/${patientId}`);
     return response.data;
   },
 
@@ -31,11 +57,10 @@ export const patientsApi = {
   },
 
   synthesizeBriefing: async (patientId, narrative) => {
-    const response = await api.post('/synthesize', {
+    return postIdempotent('/synthesize', {
       patient_id: patientId,
       narrative: narrative,
     });
-    return response.data;
   },
 };
 
@@ -48,16 +73,173 @@ export const chatApi = {
   },
 
   continueChat: async (conversationId, userMessage) => {
-    const response = await api.post('/chat/continue', {
+    return postIdempotent('/chat/continue', {
       conversation_id: conversationId,
       user_message: userMessage,
     });
+  },
+
+  // Symptom draft (and speculative clinical sections) while the intake is in progress
+  getPartialBriefing: async (conversationId) => {
+    const response = await api.get(`/chat/${conversationId}/partial-briefing`);
     return response.data;
   },
+
+  // Stream the reply over Server-Sent Events; resolves with the final `done` payload
+  continueChatStream: async (conversationId, userMessage, { onThinking, onText } = {}) => {
+    const response = await fetch(`${API_BASE_URL}/chat/continue/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        conversation_id: conversationId,
+        user_message: userMessage,
+      }),
+    });
+
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.detail || `Request failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE messages are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+
+        if (event === 'thinking') onThinking?.(data.delta);
+        else if (event === 'text') onText?.(data.delta);
+        else if (event === 'error') throw new Error(data.detail);
+        else if (event === 'done') return data;
+      }
+    }
+
+    throw new Error('Connection closed before the response finished');
+  },
+
+  // Persistent intake session over a WebSocket (/ws/chat/{id}). Reconnects with backoff and resumes
+  // after the last message it received; sendMessage resolves with the turn's `done` payload
+  openChatSocket: (conversationId, lastSeq, { onThinking, onText, onBriefingReady } = {}) => {
+    let socket = null;
+    let closed = false;
+    let attempts = 0;
+    let turn = null; // { content, replySeq, reply, resolve, reject }
+
+    const send = (frame) => {
+      if (socket?.readyState === WebSocket.OPEN) socket.send(JSON.stringify(frame));
+    };
+
+    // The server replays from ?last_seq= on reconnect, so received seqs are only tracked here
+    const received = (seq) => {
+      lastSeq = Math.max(lastSeq, seq);
+    };
+
+    const finishTurn = (outcome, value) => {
+      const current = turn;
+      turn = null;
+      if (current) (outcome === 'resolve' ? current.resolve : current.reject)(value);
+    };
+
+    const handleFrame = (frame) => {
+      if (frame.type === 'ping') send({ type: 'pong' });
+      else if (frame.type === 'thinking') onThinking?.(frame.delta);
+      else if (frame.type === 'text') onText?.(frame.delta);
+      else if (frame.type === 'done') {
+        received(frame.seq);
+        finishTurn('resolve', frame);
+      } else if (frame.type === 'error') finishTurn('reject', new Error(frame.detail));
+      else if (frame.type === 'message' && frame.seq > lastSeq) {
+        // Replayed after a reconnect, e.g. the reply to a turn the old connection dropped during
+        received(frame.seq);
+        if (turn && frame.seq === turn.replySeq) turn.reply = frame;
+      } else if (frame.type === 'ready' && turn) {
+        if (turn.reply) {
+          finishTurn('resolve', {
+            ai_message: { role: 'ai', content: turn.reply.content },
+            is_complete: frame.is_complete,
+            briefing_job_id: null,
+            thinking: [],
+          });
+        } else if (lastSeq < turn.replySeq - 1) {
+          // The server never saw the message: send it again
+          send({ type: 'message', content: turn.content });
+        }
+      } else if (frame.type === 'briefing_ready') onBriefingReady?.(frame);
+    };
+
+    const connect = () => {
+      const current = new WebSocket(`${WS_BASE_URL}/ws/chat/${conversationId}?last_seq=${lastSeq}`);
+      socket = current;
+      current.onopen = () => { attempts = 0; };
+      current.onmessage = (event) => handleFrame(JSON.parse(event.data));
+      current.onclose = (event) => {
+        if (closed || current !== socket) return;
+        if (FINAL_CLOSE_CODES.includes(event.code)) {
+          finishTurn('reject', new Error(event.reason || 'Chat connection closed'));
+          return;
+        }
+        attempts += 1;
+        setTimeout(connect, Math.min(1000 * 2 ** (attempts - 1), 15000));
+      };
+    };
+
+    connect();
+
+    return {
+      sendMessage: (content) => new Promise((resolve, reject) => {
+        if (turn) {
+          reject(new Error('A reply is still being generated'));
+          return;
+        }
+        turn = { content, replySeq: lastSeq + 2, reply: null, resolve, reject };
+        send({ type: 'message', content });
+      }),
+      close: () => {
+        closed = true;
+        socket?.close();
+      },
+    };
+  },
+};
+
+export const briefingJobsApi = {
+  get: async (jobId) => {
+    const response = await api.get(`/briefing-jobs/${jobId}`);
+    return response.data;
+  },
+
+  // Resolve with the job once its briefing is ready (pushed over Server-Sent Events)
+  waitForBriefing: (jobId) => new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE_URL}/briefing-jobs/${jobId}/events`);
+    source.addEventListener('ready', (event) => {
+      source.close();
+      resolve(JSON.parse(event.data));
+    });
+    source.addEventListener('failed', (event) => {
+      source.close();
+      reject(new Error(JSON.parse(event.data).last_error || 'Briefing generation failed'));
+    });
+    source.onerror = () => {
+      source.close();
+      reject(new Error('Lost connection while waiting for the briefing'));
+    };
+  }),
 };
 
 export const appointmentsApi = {
-  getAll: async (params = {}) => {
+  getPage: async (params = {}) => {
     const response = await api.get('/appointments', { params });
     return response.data;
   },